@@ -0,0 +1,186 @@
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import HEYGEN_QUEUE_WAIT
+from session_store import InMemorySessionStore
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+
+class AdmissionController:
+    """
+    Caps concurrent HeyGen sessions, with a FIFO queue for visitors over the cap.
+
+    acquire() gives the visitor one of `limit` slots or queues it. release()
+    hands a freed slot straight to the first waiter and calls
+    `on_promote(visitor_id)` for it; withdraw() takes a visitor out of the
+    queue. Whenever waiters move up, `on_positions` is called with
+    (visitor_id, position) pairs. Callbacks run outside the store update. At
+    most `max_waiting` visitors are queued; a limit of 0 admits everyone.
+
+    Slots and the queue are one value in `store`, changed with modify(), so
+    every worker sharing the store shares the cap; the worker that frees a
+    slot promotes the waiter. The counters in stats() are per process.
+    """
+
+    def __init__(self, limit, store=None, on_promote=None, on_positions=None, max_waiting=1000,
+                 namespace='heygen_admission'):
+        self.limit = limit
+        self.store = store if store is not None else InMemorySessionStore()
+        self.on_promote = on_promote
+        self.on_positions = on_positions
+        self.max_waiting = max_waiting
+        self.namespace = namespace
+
+        self.admitted = 0
+        self.queued = 0
+        self.promoted = 0
+        self.abandoned = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, visitor_id, queue=True):
+        """
+        Take a slot for the visitor.
+
+        Returns 0 when the visitor holds a slot, its 1-based queue position
+        when it has to wait, or None when it was not queued because the
+        queue is full or `queue` is false.
+        """
+        if not self.limit:
+            return 0
+
+        def take(state):
+            holders, waiting = state['holders'], state['waiting']
+            if visitor_id in holders:
+                return 0, None
+            if visitor_id in waiting:
+                return _position(waiting, visitor_id), None
+            # Nobody overtakes the queue
+            if len(holders) < self.limit and not waiting:
+                holders.add(visitor_id)
+                return 0, 'admitted'
+            if not queue:
+                return None, None
+            if len(waiting) >= self.max_waiting:
+                return None, 'rejected'
+            waiting[visitor_id] = time.time()
+            return len(waiting), 'queued'
+
+        position, counter = self._update(take)
+        if counter:
+            self._count(counter)
+        return position
+
+    def position(self, visitor_id):
+        """The visitor's 1-based queue position, 0 if it holds a slot, None if neither"""
+        state = self._state()
+        if visitor_id in state['holders']:
+            return 0
+        return _position(state['waiting'], visitor_id)
+
+    def release(self, visitor_id):
+        """Free the visitor's slot, if it has one, and promote the first waiter"""
+        def free(state):
+            holders, waiting = state['holders'], state['waiting']
+            if visitor_id not in holders:
+                return None, None, []
+            holders.discard(visitor_id)
+            if not waiting or len(holders) >= self.limit:
+                return None, None, []
+            promoted, queued_at = waiting.popitem(last=False)
+            holders.add(promoted)
+            return promoted, queued_at, _positions(waiting)
+
+        if not self.limit:
+            return
+        promoted, queued_at, positions = self._update(free)
+        if promoted:
+            self._count('promoted')
+            waited = max(0.0, time.time() - queued_at)
+            HEYGEN_QUEUE_WAIT.labels('promoted').observe(waited)
+            log.info("visitor promoted from the heygen queue", visitor_id=promoted, waited=round(waited, 1),
+                     waiting=len(positions))
+            self._notify(promoted, positions)
+
+    def withdraw(self, visitor_id):
+        """Take the visitor out of the queue, e.g. when the chat is stopped while waiting"""
+        def leave(state):
+            waiting = state['waiting']
+            position = _position(waiting, visitor_id)
+            if position is None:
+                return None, []
+            queued_at = waiting.pop(visitor_id)
+            # Only the waiters behind it moved up
+            return queued_at, _positions(waiting)[position - 1:]
+
+        if not self.limit:
+            return
+        queued_at, positions = self._update(leave)
+        if queued_at is None:
+            return
+        self._count('abandoned')
+        HEYGEN_QUEUE_WAIT.labels('abandoned').observe(max(0.0, time.time() - queued_at))
+        self._notify(None, positions)
+
+    def stats(self):
+        """Return admission counters"""
+        state = self._state()
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'active': len(state['holders']),
+                'waiting': len(state['waiting']),
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'promoted': self.promoted,
+                'abandoned': self.abandoned,
+                'rejected': self.rejected
+            }
+
+    def _state(self):
+        return self.store.get(self.namespace, 'state') or _empty_state()
+
+    def _update(self, fn):
+        # fn changes the state in place; shared stores may run it more than once, the last result wins
+        result = []
+
+        def apply(state):
+            result[:] = [fn(state)]
+
+        while self.store.modify(self.namespace, 'state', apply) is None:
+            self.store.add(self.namespace, 'state', _empty_state())
+        return result[0]
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _notify(self, promoted, positions):
+        try:
+            if promoted and self.on_promote:
+                self.on_promote(promoted)
+            if positions and self.on_positions:
+                self.on_positions(positions)
+        except Exception:
+            log.exception("error notifying heygen queue changes")
+
+
+def _empty_state():
+    # holders: visitors with a slot; waiting: visitor_id -> epoch time it was queued, oldest first
+    return {'holders': set(), 'waiting': OrderedDict()}
+
+
+def _position(waiting, visitor_id):
+    if visitor_id not in waiting:
+        return None
+    for position, waiting_id in enumerate(waiting, 1):
+        if waiting_id == visitor_id:
+            return position
+    return None
+
+
+def _positions(waiting):
+    return [(visitor_id, position) for position, visitor_id in enumerate(waiting, 1)]
@@ -1,18 +1,26 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, g, request, jsonify, render_template
+import hmac
 import json
 import uuid
-from datetime import datetime
-import re
+import time
+import signal
+from concurrent.futures import ThreadPoolExecutor, wait
 from flask_socketio import SocketIO, join_room
 import os
 from dotenv import load_dotenv
+from socketio_queue import create_client_manager
 
 # Load variables from .env file
 load_dotenv()
 
+# Queue that carries emits between workers, so a webhook handled anywhere reaches the visitor's socket
+SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE", "memory://")
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv("SECRET_KEY")
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Threading mode: the executors, queues and background workers emit from plain OS threads
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading',
+                    client_manager=create_client_manager(SOCKETIO_MESSAGE_QUEUE))
 
 # WotNot API Configuration
 WOTNOT_BASE_URL = os.getenv("WOTNOT_BASE_URL")
@@ -30,29 +38,267 @@ DEFAULT_VOICE_ID = os.getenv("DEFAULT_VOICE_ID")
 avatar_id = DEFAULT_AVATAR_ID
 voice_id = DEFAULT_VOICE_ID
 
+# Streaming avatar used for chat sessions that don't pick one from /api/avatars
+STREAMING_AVATAR_ID = DEFAULT_AVATAR_ID or "Pedro_CasualLook_public"
+STREAMING_VOICE_ID = DEFAULT_VOICE_ID or "8f389c2237194f80b50fe7632dcc17b8"
+
+# HeyGen streaming token: assumed lifetime when it carries no exp claim, seconds before expiry it is
+# replaced, and how much earlier a background thread replaces it (0 refreshes on demand instead)
+HEYGEN_TOKEN_TTL = float(os.getenv("HEYGEN_TOKEN_TTL", "600"))
+HEYGEN_TOKEN_REFRESH_MARGIN = float(os.getenv("HEYGEN_TOKEN_REFRESH_MARGIN", "60"))
+HEYGEN_TOKEN_REFRESH_AHEAD = float(os.getenv("HEYGEN_TOKEN_REFRESH_AHEAD", "60"))
+
+# Seconds the HeyGen avatar/voice catalog is fresh; after that it is served stale while it refreshes
+AVATAR_CATALOG_TTL = float(os.getenv("AVATAR_CATALOG_TTL", "3600"))
+# Seconds to wait before retrying a failed catalog refresh
+AVATAR_CATALOG_RETRY = float(os.getenv("AVATAR_CATALOG_RETRY", "60"))
+
+# Delay before the greeting is spoken so WebRTC is fully established
+GREETING_DELAY = float(os.getenv("GREETING_DELAY", "1"))
+
+# Concurrent HeyGen sessions opened for visitors by all workers sharing SESSION_STORE_URL; visitors
+# over it wait in a shared FIFO queue. Each worker's pool sessions count towards HeyGen's cap too.
+# 0 is unlimited.
+HEYGEN_SESSION_LIMIT = int(os.getenv("HEYGEN_SESSION_LIMIT", "0"))
+# Visitors beyond this many waiting get a text-only chat
+HEYGEN_QUEUE_MAX = int(os.getenv("HEYGEN_QUEUE_MAX", "1000"))
+
+# Pre-warmed HeyGen session pool
+HEYGEN_POOL_SIZE = int(os.getenv("HEYGEN_POOL_SIZE", "2"))
+HEYGEN_POOL_MAX_AGE = float(os.getenv("HEYGEN_POOL_MAX_AGE", "90"))
+
+# Shared upstream HTTP transport
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+
+# Where chat state lives: memory://, sqlite:///sessions.db or redis://host:6379/0.
+# Running more than one worker needs a shared (sqlite or redis) store.
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "memory://")
+
+# Idle chats are reaped when the browser never called /api/stop-chat
+HEYGEN_IDLE_TTL = float(os.getenv("HEYGEN_IDLE_TTL", "300"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))
+REAPER_INTERVAL = float(os.getenv("REAPER_INTERVAL", "30"))
+# Seconds a chat stopped by a closing page is kept so a reload can resume it, 0 stops it right away
+STOP_GRACE_PERIOD = float(os.getenv("STOP_GRACE_PERIOD", "20"))
+TEARDOWN_WORKERS = int(os.getenv("TEARDOWN_WORKERS", "8"))
+# Seconds a bulk teardown (shutdown or /admin/teardown) waits for HeyGen to confirm the stops
+TEARDOWN_TIMEOUT = float(os.getenv("TEARDOWN_TIMEOUT", "10"))
+# Stop every chat when the worker gets SIGTERM/SIGINT. Off by default with a shared store,
+# where the other workers may still be serving those chats.
+SHUTDOWN_TEARDOWN = os.getenv("SHUTDOWN_TEARDOWN", "1" if SESSION_STORE_URL.startswith("memory") else "0") == "1"
+
+# Messages kept per conversation, older ones are dropped
+MESSAGE_HISTORY_LIMIT = int(os.getenv("MESSAGE_HISTORY_LIMIT", "200"))
+
+# Normalized bot strings kept in memory, greetings and button titles repeat a lot
+TEXT_CACHE_SIZE = int(os.getenv("TEXT_CACHE_SIZE", "1024"))
+
+# Logging
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_BODY_LIMIT = int(os.getenv("LOG_BODY_LIMIT", "512"))
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "10"))
+
+# Webhook event queue
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+# Seconds a webhook event id is remembered, redeliveries within it are acknowledged and skipped
+WEBHOOK_DEDUP_TTL = float(os.getenv("WEBHOOK_DEDUP_TTL", "600"))
+# Seconds a visitor message's client_message_id is remembered, so a resend after a lost ack is skipped
+MESSAGE_DEDUP_TTL = float(os.getenv("MESSAGE_DEDUP_TTL", "300"))
+
+# Bot messages arriving within this many seconds are spoken as one HeyGen task
+SPEECH_COALESCE_WINDOW = float(os.getenv("SPEECH_COALESCE_WINDOW", "0.3"))
+# Split long utterances into sentence chunks of at most this many characters, 0 sends them whole
+SPEECH_CHUNK_MAX_CHARS = int(os.getenv("SPEECH_CHUNK_MAX_CHARS", "0"))
+# Chunks shorter than this are merged with the next sentence
+SPEECH_CHUNK_MIN_CHARS = int(os.getenv("SPEECH_CHUNK_MIN_CHARS", "40"))
+
+# Circuit breakers: open after this many failed or slow calls in a row, probe again after the timeout
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "10"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+
+# Completed chat turns kept for /debug/traces, which is only served when DEBUG_TOKEN is set
+TRACE_HISTORY = int(os.getenv("TRACE_HISTORY", "500"))
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
+# Bearer token for /admin/teardown, which is only served when it is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+from structured_logging import configure_logging, get_logger, register_secret, shutdown_logging
 from wotnot_client import WotNotAPI
 from heygen_client import HeyGenStreamingClient
+from heygen_pool import HeyGenSessionPool, open_heygen_session
+from admission import AdmissionController
+from avatar_catalog import AvatarCatalog
+from token_manager import TokenManager
+from http_transport import HTTPTransport
+from event_queue import KeyedEventQueue
+from webhook_dedup import WebhookDeduplicator, webhook_event_key
+from speech_scheduler import SpeechScheduler
+from session_store import create_session_store
+from session_reaper import SessionReaper
+from message_log import ChatMessage, MessageLog
+from tracing import TurnTracer
+from text_normalizer import TextNormalizer
+from circuit_breaker import CircuitBreaker
+from metrics import CONTENT_TYPE, ERRORS, REGISTRY, START_CHAT_LATENCY, WEBHOOK_TO_EMIT_LATENCY, Gauge, StatsGauge
 
 
-# In-memory storage for conversation threads 
-conversation_threads = {}
+# Records go through a queue to a background writer, nothing on the request path writes to stdout
+configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, body_limit=LOG_BODY_LIMIT, sample_every=LOG_SAMPLE_EVERY)
+for secret in (HEYGEN_API_KEY, WOTNOT_API_KEY, WEBHOOK_TOKEN, BOT_KEY, DEBUG_TOKEN, ADMIN_TOKEN, app.config['SECRET_KEY']):
+    register_secret(secret)
+log = get_logger(__name__)
+
+# Chat state, shared between workers when SESSION_STORE_URL points at a shared store
+session_store = create_session_store(SESSION_STORE_URL)
+# Conversation threads by local visitor ID
+conversation_threads = session_store.namespace('conversation_threads')
 # NEW: Add mapping between WotNot conversation IDs and local visitor IDs
-wotnot_to_local_mapping = {}
+wotnot_to_local_mapping = session_store.namespace('wotnot_to_local_mapping')
 # heygen session 
-heygen_sessions = {} 
+heygen_sessions = session_store.namespace('heygen_sessions')
+# Last activity (epoch seconds) by local visitor ID, used by the idle reaper
+session_activity = session_store.namespace('session_activity')
+# Stop deadlines (epoch seconds) of chats whose page was closed, see STOP_GRACE_PERIOD
+pending_stops = session_store.namespace('pending_stops')
+
+# Caps concurrent HeyGen sessions for every worker sharing the store; a freed slot goes to the first waiter
+admission = AdmissionController(
+    HEYGEN_SESSION_LIMIT,
+    store=session_store,
+    on_promote=lambda visitor_id: startup_executor.submit(start_queued_session, visitor_id),
+    on_positions=lambda positions: emit_queue_positions(positions),
+    max_waiting=HEYGEN_QUEUE_MAX
+)
+
+# Runs the HeyGen half of start_chat next to the WotNot half
+startup_executor = ThreadPoolExecutor(max_workers=int(os.getenv("STARTUP_WORKERS", "16")))
+# Stops HeyGen sessions concurrently when several chats are torn down at once
+teardown_executor = ThreadPoolExecutor(max_workers=TEARDOWN_WORKERS)
+
+
+# Turns bot HTML into the text shown in the chat and the text the avatar speaks
+text_normalizer = TextNormalizer(cache_size=TEXT_CACHE_SIZE)
 
+def store_message(visitor_id, chat_message):
+    """Append a ChatMessage to the visitor's conversation thread"""
+    return conversation_threads.modify(visitor_id, lambda conversation: conversation['messages'].append(chat_message))
 
-def clean_publish_key(key):
-    """Clean publish key by removing special characters, emojis, and whitespace"""
-    key = key.strip()
-    key = re.sub(r'[^a-zA-Z0-9]', '', key)
-    return key
 
-def strip_html_tags(text):
-    """Strip HTML tags from text"""
-    if not text:
-        return ""
-    return re.sub(r'<[^>]+>', '', text).strip()
+# One keep-alive connection pool shared by both upstream clients
+http_transport = HTTPTransport(
+    pool_maxsize=HTTP_POOL_SIZE,
+    connect_timeout=HTTP_CONNECT_TIMEOUT,
+    read_timeout=HTTP_READ_TIMEOUT,
+    max_retries=HTTP_MAX_RETRIES
+)
+
+# Fail fast instead of tying up workers while an upstream is down or slow
+wotnot_breaker = CircuitBreaker('wotnot', failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                                slow_call_seconds=BREAKER_SLOW_CALL_SECONDS, reset_timeout=BREAKER_RESET_TIMEOUT)
+heygen_breaker = CircuitBreaker('heygen', failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                                slow_call_seconds=BREAKER_SLOW_CALL_SECONDS, reset_timeout=BREAKER_RESET_TIMEOUT)
+
+# Initialize HeyGen API client
+heygen_client = HeyGenStreamingClient(api_key=HEYGEN_API_KEY, transport=http_transport, base_url=HEYGEN_BASE_URL,
+                                      breaker=heygen_breaker)
+
+# Correlates the hops of each chat turn, see /debug/traces
+tracer = TurnTracer(history=TRACE_HISTORY)
+
+# Per-visitor speech queue in front of HeyGen's streaming.task
+speech_scheduler = SpeechScheduler(
+    heygen_client,
+    coalesce_window=SPEECH_COALESCE_WINDOW,
+    tracer=tracer,
+    chunk_min_chars=SPEECH_CHUNK_MIN_CHARS,
+    chunk_max_chars=SPEECH_CHUNK_MAX_CHARS
+)
+speech_scheduler.start()
+
+# One cached streaming token instead of a create_token call per chat
+token_manager = TokenManager(
+    heygen_client,
+    fallback_ttl=HEYGEN_TOKEN_TTL,
+    refresh_margin=HEYGEN_TOKEN_REFRESH_MARGIN,
+    refresh_ahead=HEYGEN_TOKEN_REFRESH_AHEAD
+)
+if HEYGEN_API_KEY:
+    token_manager.start()
+
+# Avatars and voices visitors can pick from, so page loads and start_chat don't call HeyGen's catalog
+avatar_catalog = AvatarCatalog(
+    heygen_client,
+    ttl=AVATAR_CATALOG_TTL,
+    retry_interval=AVATAR_CATALOG_RETRY,
+    default_avatar_id=STREAMING_AVATAR_ID,
+    default_voice_id=STREAMING_VOICE_ID
+)
+if HEYGEN_API_KEY:
+    avatar_catalog.start()
+
+# Keep ready HeyGen sessions around so start_chat doesn't wait on session setup
+heygen_pool = None
+if HEYGEN_API_KEY and HEYGEN_POOL_SIZE > 0:
+    heygen_pool = HeyGenSessionPool(
+        heygen_client,
+        STREAMING_AVATAR_ID,
+        STREAMING_VOICE_ID,
+        target_size=HEYGEN_POOL_SIZE,
+        max_age=HEYGEN_POOL_MAX_AGE,
+        token_manager=token_manager
+    )
+    heygen_pool.start()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_latency(response):
+    if request.endpoint == 'start_chat' and 'request_started' in g:
+        outcome = 'ok' if response.status_code < 400 else 'error'
+        START_CHAT_LATENCY.labels(outcome).observe(time.perf_counter() - g.request_started)
+    return response
+
+
+@app.route('/api/avatars')
+def list_avatars():
+    """Avatars and voices for the start screen, from the in-memory catalog"""
+    snapshot = avatar_catalog.get()
+    response = Response(snapshot.body, content_type='application/json')
+    response.set_etag(snapshot.etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+def has_bearer_token(expected):
+    """Check the request's Authorization header in constant time"""
+    token = request.headers.get('Authorization', '').replace('Bearer ', '', 1)
+    return hmac.compare_digest(token.encode(), expected.encode())
+
+
+@app.route('/debug/traces')
+def debug_traces():
+    """Slowest recent chat turns with per-hop timings"""
+    if not DEBUG_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    if not has_bearer_token(DEBUG_TOKEN):
+        return jsonify({'error': 'Invalid token'}), 401
+    limit = min(request.args.get('limit', 20, type=int), TRACE_HISTORY)
+    return jsonify({'turns': tracer.slowest(limit), 'stats': tracer.stats()})
 
 
 # ---------------------------------------------------------------------------------------------------------------------------
@@ -102,12 +348,34 @@ def on_disconnect():
 # DONOT TOUCH-----------------------------------
 #---------------------------------------------------------------------------------------------------------------------------
 
+# The WotNot client created above goes through the shared connection pool and its circuit breaker
+wotnot_client.transport = http_transport
+wotnot_client.breaker = wotnot_breaker
+
+
 @app.route('/api/start-chat', methods=['POST'])
 def start_chat():
     """Initialize a new chat session"""
     try:
+        data = request.get_json(silent=True) or {}
+
+        # A reloaded page presents its previous visitor ID and gets its chat back. With `resume` set it
+        # only wants that chat, so a chat stopped after the grace period is not replaced by a new one
+        if data.get('visitor_id'):
+            resumed = resume_chat(data['visitor_id'])
+            if resumed is not None:
+                return resumed
+        if data.get('resume'):
+            return jsonify({'success': False, 'error': 'Chat not found'}), 404
+
+        avatar_id = data.get('avatar_id') or STREAMING_AVATAR_ID
+        voice_id = data.get('voice_id') or avatar_catalog.default_voice(avatar_id)
+        invalid = avatar_catalog.validate(avatar_id, voice_id)
+        if invalid:
+            return jsonify({'success': False, 'error': invalid}), 400
+
         visitor_id = str(uuid.uuid4()).replace('-', '')  
-        print(f"Starting chat for visitor: {visitor_id}")
+        log.info("starting chat", visitor_id=visitor_id, avatar_id=avatar_id, voice_id=voice_id)
         
         # Stop existing session for same visitor if exists BEFORE starting new one
         if visitor_id in heygen_sessions:
@@ -115,209 +383,385 @@ def start_chat():
             old_session_id = old_session.get('session_id')
             if old_session_id:
                 try:
-                    print(f"Stopping old HeyGen session for visitor: {visitor_id}")
-                    heygen_client_temp = HeyGenStreamingClient(api_key=HEYGEN_API_KEY)
-                    heygen_client_temp.stop_session(old_session_id)
-                    print(f"Old session {old_session_id} stopped successfully")
-                except Exception as e:
-                    print(f"Error stopping old session: {e}")
+                    heygen_client.stop_session(old_session_id)
+                except Exception:
+                    ERRORS.labels('heygen_stop').inc()
+                    log.exception("error stopping old session", visitor_id=visitor_id, session_id=old_session_id)
                 finally:
                     # Clean up old session data
-                    del heygen_sessions[visitor_id]
+                    heygen_sessions.discard(visitor_id)
         
+        # --- HEYGEN SETUP STARTS HERE ---
+        # WotNot and HeyGen setup don't depend on each other, run them concurrently
+        # While HeyGen's breaker is open the chat starts text-only instead of waiting on it
+        heygen_future = None
+        if heygen_breaker.is_open():
+            log.warning("heygen unavailable, starting text-only chat", visitor_id=visitor_id)
+        elif admission.acquire(visitor_id, queue=False) == 0:
+            heygen_future = startup_executor.submit(acquire_heygen_session, avatar_id, voice_id)
+
         # Start conversation with WotNot
         conversation_data = wotnot_client.start_conversation(visitor_id)
-        if not conversation_data:
-            return jsonify({'success': False, 'error': 'Failed to start conversation with WotNot'}), 500
-        
-        thread_id = conversation_data.get('conversation', {}).get('id')
+        thread_id = conversation_data.get('conversation', {}).get('id') if conversation_data else None
         if not thread_id:
-            print(f"No thread_id found in response: {conversation_data}")
+            # Don't leak the HeyGen session started for this visitor
+            if heygen_future is not None:
+                heygen_future.add_done_callback(release_heygen_session)
+                heygen_future.add_done_callback(lambda _: admission.release(visitor_id))
+            ERRORS.labels('start_chat_wotnot').inc()
+            if not conversation_data:
+                return jsonify({'success': False, 'error': 'Failed to start conversation with WotNot'}), 500
+            log.warning("no thread_id in wotnot response", visitor_id=visitor_id, response=conversation_data)
             return jsonify({'success': False, 'error': 'No thread_id received from WotNot'}), 500
         
-        # Create mapping
-        wotnot_to_local_mapping[str(thread_id)] = visitor_id
-        print(f"Created mapping: {thread_id} -> {visitor_id}")
-        
-        conversation_threads[visitor_id] = {
-            'thread_id': thread_id,
-            'visitor_id': visitor_id,
-            'created_at': datetime.now().isoformat(),
-            'messages': []
-        }
-        
         # Extract initial message
         initial_message = None
+        initial_speech = None
         if 'messages' in conversation_data and conversation_data['messages']:
             for msg in conversation_data['messages']:
                 if msg.get('from', {}).get('type') == 'BOT':
                     raw_message = msg.get('data', {}).get('body', '')
-                    initial_message = strip_html_tags(raw_message)
+                    initial_message, initial_speech = text_normalizer.normalize(raw_message)
                     break
+
+        session_info = None
+        if heygen_future is not None:
+            try:
+                session_info = heygen_future.result()
+            except Exception:
+                ERRORS.labels('heygen_start').inc()
+                log.exception("error starting heygen session, continuing text-only", visitor_id=visitor_id)
+                admission.release(visitor_id)
+
+        # Create mapping
+        wotnot_to_local_mapping[str(thread_id)] = visitor_id
         
-        if initial_message:
-            conversation_threads[visitor_id]['messages'].append({
-                'type': 'bot',
-                'message': initial_message,
-                'timestamp': datetime.now().isoformat()
-            })
-        
-        print(f"Chat started successfully for visitor: {visitor_id}")
-        
-        # --- HEYGEN SETUP STARTS HERE ---
-        heygen_client = HeyGenStreamingClient(api_key=HEYGEN_API_KEY)
-        print(f"HEYGEN_API_KEY: {HEYGEN_API_KEY}")
+        conversation = {
+            'thread_id': thread_id,
+            'visitor_id': visitor_id,
+            'created_at': time.time(),
+            'avatar_id': avatar_id,
+            'voice_id': voice_id,
+            'messages': MessageLog(MESSAGE_HISTORY_LIMIT)
+        }
         
-        # Create token
-        token_data = heygen_client.create_token()
-        if not token_data or 'token' not in token_data:
-            raise Exception("Failed to generate HeyGen token")
-        print(f"[create_token] Success: {token_data}")
+        if initial_message:
+            conversation['messages'].append(ChatMessage('bot', initial_message))
 
-        avatar_id = "Pedro_CasualLook_public"
-        voice_id = "8f389c2237194f80b50fe7632dcc17b8"
+        conversation_threads[visitor_id] = conversation
+        session_reaper.touch(visitor_id)
 
-        # Start streaming session
-        session_data = heygen_client.start_streaming_session(avatar_id, voice_id)
-        realtime_endpoint = session_data['data'].get('realtime_endpoint', '')
+        # Over the session cap: chat by text and wait for a slot, now that a promotion can find the conversation
+        queue_position = None
+        if heygen_future is None and not heygen_breaker.is_open():
+            queue_position = wait_for_heygen_slot(visitor_id)
 
-        if not session_data or 'data' not in session_data or 'session_id' not in session_data['data']:
-            raise Exception("Failed to start HeyGen streaming session")
-        
-        print(f"[start_streaming_session] Success: {session_data}")
+        if session_info is None:
+            log.info("chat started", visitor_id=visitor_id, thread_id=thread_id, text_only=True,
+                     queue_position=queue_position)
+            return jsonify({
+                'success': True,
+                'visitor_id': visitor_id,
+                'thread_id': thread_id,
+                'initial_message': initial_message,
+                'last_seq': conversation['messages'].last_seq,
+                'text_only': True,
+                'queue_position': queue_position,
+                'heygen': None
+            })
+
+        log.info("chat started", visitor_id=visitor_id, thread_id=thread_id, session_id=session_info['session_id'])
 
-        session_id = session_data['data']['session_id']
-        url = session_data['data'].get('url', '')
-        access_token = session_data['data'].get('access_token', '')
+        session_id = session_info['session_id']
 
         # Store new session
-        heygen_sessions[visitor_id] = {
-            'session_id': session_id,
-            'token': access_token,
-            'url': url,
-            'avatar_id': avatar_id,
-            'voice_id': voice_id,
-            'started_at': datetime.now().isoformat(),
-            'webrtc_started': False,
-            'session_ready': False,
-            'realtime_endpoint': realtime_endpoint
-        }
+        heygen_sessions[visitor_id] = session_info
 
-        # Start WebRTC connection
-        try:
-            start_response = heygen_client.start_webrtc(session_id)
-            print(f"[start_webrtc] Response: {start_response}")
-            
-            if start_response and start_response.get('code') == 100:
-                heygen_sessions[visitor_id]['webrtc_started'] = True
-                heygen_sessions[visitor_id]['session_ready'] = True
-                print(f"WebRTC started successfully for session: {session_id}")
-            else:
-                print(f"WebRTC start failed: {start_response}")
-                
-        except Exception as e:
-            print(f"Error starting WebRTC: {e}")
-            # Don't fail the entire request, just log the error
-            heygen_sessions[visitor_id]['webrtc_started'] = False
-            heygen_sessions[visitor_id]['session_ready'] = False
-
-        # Send initial message only if session is ready
-        if initial_message and heygen_sessions[visitor_id].get('session_ready', False):
-            try:
-                # Add a small delay to ensure WebRTC is fully established
-                import time
-                time.sleep(1)
-                
-                task_response = heygen_client.send_text_task(session_id, initial_message)
-                print(f"[send_text_task] Initial message response: {task_response}")
-                
-                if task_response and task_response.get('code') == 100:
-                    print(f"Initial message sent successfully: {initial_message}")
-                else:
-                    print(f"Initial message send failed: {task_response}")
-                    
-            except Exception as e:
-                print(f"Error sending initial message: {e}")
+        # Speak the greeting after the response is returned, once WebRTC had time to settle
+        if initial_speech and session_info.get('session_ready', False):
+            speech_scheduler.submit(visitor_id, session_id, initial_speech, delay=GREETING_DELAY)
         
         return jsonify({
             'success': True,
             'visitor_id': visitor_id,
             'thread_id': thread_id,
             'initial_message': initial_message,
-            'heygen': {
-                'session_id': session_id,
-                'access_token': access_token,
-                'url': url,
-                'realtime_endpoint': realtime_endpoint,
-                'avatar_id': avatar_id,
-                'voice_id': voice_id,
-                'session_ready': heygen_sessions[visitor_id].get('session_ready', False)
-            }
+            'last_seq': conversation['messages'].last_seq,
+            'text_only': False,
+            'queue_position': None,
+            'heygen': heygen_response(session_info)
         })
 
-    except Exception as e:
-        print(f"Error in start_chat: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        ERRORS.labels('start_chat').inc()
+        log.exception("error in start_chat")
         return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
 
+def resume_chat(visitor_id):
+    """
+    Hand an existing chat back to a reloaded page.
+
+    Cancels a pending grace-period stop and returns the start_chat response
+    with the stored messages, or None if the chat is gone. Only the HeyGen
+    session is set up again, if the reaper stopped it meanwhile.
+    """
+    conversation = conversation_threads.get(visitor_id)
+    if conversation is None:
+        return None
+    session_reaper.cancel_stop(visitor_id)
+    session_reaper.touch(visitor_id)
+
+    session_info = heygen_sessions.get(visitor_id)
+    queue_position = None
+    if session_info is None and not heygen_breaker.is_open():
+        queue_position = admission.position(visitor_id)
+        if queue_position is None and admission.acquire(visitor_id, queue=False) == 0:
+            try:
+                session_info = acquire_heygen_session(conversation.get('avatar_id', STREAMING_AVATAR_ID),
+                                                      conversation.get('voice_id', STREAMING_VOICE_ID))
+                heygen_sessions[visitor_id] = session_info
+            except Exception:
+                ERRORS.labels('heygen_start').inc()
+                log.exception("error restarting heygen session, resuming text-only", visitor_id=visitor_id)
+                admission.release(visitor_id)
+        elif queue_position is None:
+            queue_position = wait_for_heygen_slot(visitor_id)
+
+    log.info("chat resumed", visitor_id=visitor_id, thread_id=conversation['thread_id'],
+             session_id=session_info['session_id'] if session_info else None)
+    return jsonify({
+        'success': True,
+        'visitor_id': visitor_id,
+        'thread_id': conversation['thread_id'],
+        'initial_message': None,
+        'resumed': True,
+        'messages': conversation['messages'].to_list(),
+        'last_seq': conversation['messages'].last_seq,
+        'text_only': session_info is None,
+        'queue_position': queue_position,
+        'heygen': heygen_response(session_info) if session_info else None
+    })
+
+
+def wait_for_heygen_slot(visitor_id):
+    """
+    Queue a visitor for a HeyGen session slot.
+
+    Returns its queue position, or None if the queue is full. When a slot
+    freed up in the meantime the session is opened right away and 0 is
+    returned; the page gets it with the heygen_ready event either way.
+    """
+    queue_position = admission.acquire(visitor_id)
+    if queue_position == 0:
+        startup_executor.submit(start_queued_session, visitor_id)
+    elif queue_position is None:
+        log.warning("heygen queue full, chat stays text-only", visitor_id=visitor_id)
+    else:
+        log.info("heygen at capacity, visitor queued", visitor_id=visitor_id, position=queue_position)
+    return queue_position
+
+
+def start_queued_session(visitor_id):
+    """Open the HeyGen session of a visitor who got a slot while chatting by text"""
+    conversation = conversation_threads.get(visitor_id)
+    if conversation is None:
+        admission.release(visitor_id)
+        return
+    try:
+        session_info = acquire_heygen_session(conversation.get('avatar_id', STREAMING_AVATAR_ID),
+                                              conversation.get('voice_id', STREAMING_VOICE_ID))
+    except Exception:
+        ERRORS.labels('heygen_start').inc()
+        log.exception("error starting queued heygen session, chat stays text-only", visitor_id=visitor_id)
+        admission.release(visitor_id)
+        socketio.emit('heygen_unavailable', {'visitor_id': visitor_id}, room=visitor_id)
+        return
+    heygen_sessions[visitor_id] = session_info
+    if visitor_id not in conversation_threads:
+        # The chat was stopped while the session was opening
+        evict_visitors([visitor_id], heygen_only=True)
+        return
+    log.info("queued heygen session started", visitor_id=visitor_id, session_id=session_info['session_id'])
+    socketio.emit('heygen_ready', {'visitor_id': visitor_id, 'heygen': heygen_response(session_info)},
+                  room=visitor_id)
+
+
+def emit_queue_positions(positions):
+    """Tell waiting visitors their new place in the HeyGen queue"""
+    for visitor_id, position in positions:
+        socketio.emit('heygen_queue', {'visitor_id': visitor_id, 'position': position}, room=visitor_id)
+
+
+@socketio.on('heygen_queue_status')
+def on_heygen_queue_status(data):
+    """
+    Current HeyGen state of a waiting visitor, for pages that joined their
+    room after a queue event was emitted: the session once it is ready,
+    otherwise the queue position (None when not queued).
+    """
+    visitor_id = (data or {}).get('visitor_id')
+    session_info = heygen_sessions.get(visitor_id) if visitor_id else None
+    if session_info:
+        return {'visitor_id': visitor_id, 'heygen': heygen_response(session_info), 'queue_position': None}
+    return {'visitor_id': visitor_id, 'heygen': None,
+            'queue_position': admission.position(visitor_id) if visitor_id else None}
+
+
+def heygen_response(session_info):
+    """The HeyGen part of a start_chat response"""
+    return {
+        'session_id': session_info['session_id'],
+        'access_token': session_info['token'],
+        'url': session_info['url'],
+        'realtime_endpoint': session_info['realtime_endpoint'],
+        'avatar_id': session_info.get('avatar_id'),
+        'voice_id': session_info.get('voice_id'),
+        'session_ready': session_info.get('session_ready', False)
+    }
+
+
+def acquire_heygen_session(avatar_id, voice_id):
+    """Take a pre-warmed HeyGen session, only create one inline when the pool is empty"""
+    session_info = heygen_pool.acquire(avatar_id, voice_id) if heygen_pool else None
+    if session_info is None:
+        session_info = open_heygen_session(heygen_client, avatar_id, voice_id, token_manager=token_manager)
+        log.info("heygen session created inline", session_id=session_info['session_id'])
+    else:
+        log.info("heygen session taken from pool", session_id=session_info['session_id'])
+    return session_info
+
+def release_heygen_session(heygen_future):
+    """Stop the HeyGen session of a chat that failed to start"""
+    if heygen_future.exception() is not None:
+        return
+    session_id = heygen_future.result()['session_id']
+    try:
+        heygen_client.stop_session(session_id)
+        log.info("stopped unused heygen session", session_id=session_id)
+    except Exception:
+        ERRORS.labels('heygen_stop').inc()
+        log.exception("error stopping unused heygen session", session_id=session_id)
+
+
+@app.route('/api/history/<visitor_id>')
+def conversation_history(visitor_id):
+    """
+    Messages stored after the `since` sequence number, for clients catching
+    up after a reconnect. `truncated` is true when some of them were already
+    dropped from the conversation's history.
+    """
+    conversation = conversation_threads.get(visitor_id)
+    if not conversation:
+        return jsonify({'success': False, 'error': 'Conversation not found'}), 404
+    # The page syncs right after it rejoins its room, so it is still open
+    session_reaper.cancel_stop(visitor_id)
+    since = request.args.get('since', 0, type=int)
+    messages, truncated = conversation['messages'].since(since)
+    return jsonify({
+        'success': True,
+        'visitor_id': visitor_id,
+        'messages': [message.to_dict() for message in messages],
+        'last_seq': conversation['messages'].last_seq,
+        'truncated': truncated
+    })
+
+
 @app.route('/api/send-message', methods=['POST'])
 def send_message():
     """Send user message and get bot response"""
+    body, status = forward_visitor_message(request.get_json(silent=True))
+    return jsonify(body), status
+
+
+@socketio.on('send_message')
+def on_send_message(data):
+    """Socket.IO variant of /api/send-message, the result is returned as the event's ack"""
+    body, status = forward_visitor_message(data)
+    body['status'] = status
+    return body
+
+
+def forward_visitor_message(data):
+    """
+    Store a visitor message and forward it to WotNot.
+
+    Shared by the HTTP route and the Socket.IO event. Returns the response
+    body and HTTP status; bot responses come later via the webhook. A
+    message whose `client_message_id` was already received is acknowledged
+    without being sent again.
+    """
+    dedup_key = None
     try:
-        data = request.get_json()
+        data = data if isinstance(data, dict) else {}
         visitor_id = data.get('visitor_id')
         message = data.get('message')
+        client_message_id = data.get('client_message_id')
         
         if not visitor_id or not message:
-            return jsonify({
+            return {
                 'success': False,
                 'error': 'Missing visitor_id or message'
-            }), 400
+            }, 400
         
         conversation = conversation_threads.get(visitor_id)
         if not conversation:
-            return jsonify({
+            return {
                 'success': False,
                 'error': 'Conversation not found'
-            }), 404
+            }, 404
         
+        if client_message_id:
+            dedup_key = f"{visitor_id}:{client_message_id}"
+            if not message_dedup.first_seen(dedup_key):
+                # Resent after a lost ack, the first attempt delivers it
+                log.info("duplicate visitor message skipped", visitor_id=visitor_id,
+                         client_message_id=client_message_id)
+                return {
+                    'success': True,
+                    'message': 'Message already received',
+                    'duplicate': True
+                }, 200
+
         thread_id = conversation['thread_id']
+        # A page that is still sending was not closed after all
+        session_reaper.cancel_stop(visitor_id)
+        session_reaper.touch(visitor_id)
+        tracer.start_turn(visitor_id, thread_id)
         
         # Store user message
-        conversation['messages'].append({
-            'type': 'user',
-            'message': message,
-            'timestamp': datetime.now().isoformat()
-        })
+        with tracer.span(visitor_id, 'server.store_message'):
+            store_message(visitor_id, ChatMessage('user', message))
         
-        print(f"Sending message for visitor {visitor_id}: {message}")
+        log.debug("sending message", visitor_id=visitor_id, thread_id=thread_id)
         
         # Send message to WotNot
-        response_data = wotnot_client.send_visitor_message(thread_id, message, visitor_id)
+        with tracer.span(visitor_id, 'wotnot.send_visitor_message'):
+            response_data = wotnot_client.send_visitor_message(thread_id, message, visitor_id)
         
         if not response_data:
-            return jsonify({
+            if dedup_key:
+                message_dedup.forget(dedup_key)
+            return {
                 'success': False,
                 'error': 'Failed to send message to WotNot'
-            }), 500
+            }, 500
         
-        # Bot responses will come via webhook
-        return jsonify({
+        return {
             'success': True,
             'message': 'Message sent successfully',
             'message_id': response_data.get('id') or response_data.get('message_id')
-        })
+        }, 200
         
-    except Exception as e:
-        print(f"Error in send_message: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({
+    except Exception:
+        ERRORS.labels('send_message').inc()
+        log.exception("error in send_message")
+        if dedup_key:
+            message_dedup.forget(dedup_key)
+        return {
             'success': False,
             'error': 'Internal server error'
-        }), 500
+        }, 500
 
 
 @app.route('/api/stop-chat', methods=['POST'])
@@ -338,41 +782,106 @@ def stop_chat():
         
         if not visitor_id:
             return jsonify({"success": False, "error": "Missing visitor_id"}), 400
+
+        # A closing page only asks for a stop, the chat is kept for a reload to resume
+        if data.get("grace") and STOP_GRACE_PERIOD > 0 and visitor_id in conversation_threads:
+            session_reaper.stop_at(visitor_id, time.time() + STOP_GRACE_PERIOD)
+            log.info("chat stop deferred", visitor_id=visitor_id, grace_period=STOP_GRACE_PERIOD)
+            return jsonify({"success": True, "message": "Chat session will stop unless resumed"})
         
-        # Stop HeyGen session if exists
-        if visitor_id in heygen_sessions:
-            session_info = heygen_sessions[visitor_id]
-            session_id = session_info.get('session_id')
-            
-            if session_id:
-                try:
-                    heygen_client = HeyGenStreamingClient(api_key=HEYGEN_API_KEY)
-                    stop_response = heygen_client.stop_session(session_id)
-                    print(f"[stop_session] Response: {stop_response}")
-                    print(f"Stopped HeyGen session for visitor: {visitor_id}")
-                except Exception as e:
-                    print(f"Error stopping HeyGen session: {e}")
-                finally:
-                    # Always clean up the session data
-                    del heygen_sessions[visitor_id]
-        
-        # Clean up conversation threads
-        if visitor_id in conversation_threads:
-            thread_id = conversation_threads[visitor_id].get('thread_id')
-            del conversation_threads[visitor_id]
-            
-            # Clean up mapping
-            if thread_id and str(thread_id) in wotnot_to_local_mapping:
-                del wotnot_to_local_mapping[str(thread_id)]
+        # Stop HeyGen session and clean up conversation threads and mapping
+        evict_visitors([visitor_id])
+        log.info("chat stopped", visitor_id=visitor_id)
         
         return jsonify({"success": True, "message": "Chat session stopped successfully"})
     
-    except Exception as e:
-        print(f"Error in stop_chat: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        ERRORS.labels('stop_chat').inc()
+        log.exception("error in stop_chat")
         return jsonify({"success": False, "error": "Server error"}), 500
 
+def evict_visitors(visitor_ids, heygen_only=False, timeout=None):
+    """
+    Tear down the state of several visitors at once.
+
+    Stops their HeyGen sessions concurrently on the teardown pool, waiting at
+    most `timeout` seconds for HeyGen, and unless heygen_only is set removes
+    their conversation threads, WotNot mappings and activity records. Returns
+    how many HeyGen sessions were removed and confirmed stopped, how many
+    stops were still pending at the deadline, and how many conversations
+    were removed.
+    """
+    conversations = 0
+    if not heygen_only:
+        # Conversations go first: a queued session stored after this sees the chat is gone and stops itself
+        for visitor_id in visitor_ids:
+            tracer.forget(visitor_id)
+            # Only here, the idle reaper's heygen_only evictions leave waiting visitors their place
+            admission.withdraw(visitor_id)
+            conversation = conversation_threads.get(visitor_id)
+            session_activity.discard(visitor_id)
+            pending_stops.discard(visitor_id)
+            if conversation and conversation_threads.discard(visitor_id):
+                conversations += 1
+                thread_id = conversation.get('thread_id')
+                if thread_id:
+                    wotnot_to_local_mapping.discard(str(thread_id))
+
+    session_ids = {}
+    for visitor_id in visitor_ids:
+        speech_scheduler.cancel(visitor_id)
+        session_info = heygen_sessions.get(visitor_id)
+        # Always clean up the session data, even if stopping it fails below
+        if session_info and heygen_sessions.discard(visitor_id) and session_info.get('session_id'):
+            session_ids[session_info['session_id']] = visitor_id
+
+    stops = {teardown_executor.submit(stop_heygen_session, session_id): session_id for session_id in session_ids}
+    for stop, session_id in stops.items():
+        # HeyGen counts the session against the cap until it is stopped
+        stop.add_done_callback(lambda _, visitor_id=session_ids[session_id]: admission.release(visitor_id))
+    done, unfinished = wait(stops, timeout=timeout)
+    stopped = 0
+    for stop in done:
+        if stop.result():
+            stopped += 1
+        else:
+            ERRORS.labels('heygen_stop').inc()
+            log.warning("heygen session stop failed", session_id=stops[stop])
+    if unfinished:
+        # They keep running on the teardown pool, the deadline only bounds how long the caller waits
+        log.warning("heygen session stops still pending at the deadline", pending=len(unfinished))
+
+    return {'heygen_sessions': len(session_ids), 'heygen_stopped': stopped, 'heygen_pending': len(unfinished),
+            'conversations': conversations}
+
+def teardown_all(timeout=TEARDOWN_TIMEOUT):
+    """Stop every chat in the session store, returning evict_visitors() counts and the time taken"""
+    started = time.perf_counter()
+    visitor_ids = set(conversation_threads) | set(heygen_sessions) | set(session_activity) | set(pending_stops)
+    counts = evict_visitors(list(visitor_ids), timeout=timeout)
+    counts['visitors'] = len(visitor_ids)
+    counts['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    log.info("all chats torn down", **counts)
+    return counts
+
+def stop_heygen_session(session_id):
+    """Stop one HeyGen session, never raising"""
+    try:
+        return heygen_client.stop_session(session_id)
+    except Exception:
+        log.exception("error stopping heygen session", session_id=session_id)
+        return None
+
+@app.route('/admin/teardown', methods=['POST'])
+def admin_teardown():
+    """Stop every chat and its HeyGen session, e.g. before a deploy"""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    if not has_bearer_token(ADMIN_TOKEN):
+        return jsonify({'error': 'Invalid token'}), 401
+    counts = teardown_all(min(request.args.get('timeout', TEARDOWN_TIMEOUT, type=float), TEARDOWN_TIMEOUT))
+    return jsonify({'success': True, **counts})
+
 @app.route('/webhook/wotnot', methods=['POST'])
 def wotnot_webhook():
     """Handle incoming WotNot webhook events"""
@@ -388,25 +897,42 @@ def wotnot_webhook():
         
         # Handle webhook verification request
         if data and 'token' in data and not data.get('events'):
-            print("Webhook verification request received")
+            log.info("webhook verification request received")
             return jsonify({'token': data['token']}), 200
         
         # Validate webhook token
         if token != WEBHOOK_TOKEN:
-            print(f"Invalid webhook token received: {token}")
+            ERRORS.labels('webhook_auth').inc()
+            log.warning("invalid webhook token received")
             return jsonify({'error': 'Invalid token'}), 401
         
-        # Process events
+        # Queue events and acknowledge right away, workers do the processing
         if data and 'events' in data:
+            dropped = 0
             for event_data in data['events']:
-                handle_wotnot_event(event_data)
+                # WotNot redelivers events it thinks failed, process each one once
+                event_key = webhook_event_key(event_data)
+                if not webhook_dedup.first_seen(event_key):
+                    log.debug("duplicate webhook event skipped", event_key=event_key)
+                    continue
+                conversation_key = str(event_data.get('conversation', {}).get('key'))
+                # Receipt time, for the webhook-to-emit latency metric
+                event_data['_received_at'] = time.perf_counter()
+                if not webhook_queue.submit(conversation_key, event_data):
+                    # Not processed, so the retry must not count as a duplicate
+                    webhook_dedup.forget(event_key)
+                    dropped += 1
+            if dropped:
+                # Ask WotNot to retry later instead of queueing without limit
+                ERRORS.labels('webhook_queue_full').inc(dropped)
+                log.warning("webhook queue full", dropped=dropped)
+                return jsonify({'error': 'Event queue full'}), 503
         
         return jsonify({'status': 'success'}), 200
         
-    except Exception as e:
-        print(f"Error handling webhook: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        ERRORS.labels('webhook').inc()
+        log.exception("error handling webhook")
         return jsonify({'error': 'Internal server error'}), 500
 
 def handle_wotnot_event(event_data):
@@ -415,20 +941,20 @@ def handle_wotnot_event(event_data):
         event = event_data.get('event', {})
         event_type = event.get('type')
         
-        print(f"Processing event type: {event_type}")
+        log.debug("webhook event", event_type=event_type)
         
         if event_type == 'message':
             handle_message_event(event_data)
         elif event_type == 'conversation_create':
             handle_conversation_creation_event(event_data)
         
-    except Exception as e:
-        print(f"Error processing event: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        ERRORS.labels('webhook_event').inc()
+        log.exception("error processing event")
 
 def handle_message_event(event_data):
     """Handle message exchange events with HeyGen integration"""
+    handled_at = time.perf_counter()
     try:
         event = event_data.get('event', {})
         payload = event.get('payload', {})
@@ -441,134 +967,111 @@ def handle_message_event(event_data):
         message_text = message.get('text', '')
         message_type = message_by.get('type', '')
         
-        print(f"Message event - Conversation: {conversation_key}, Type: {message_type}, Text: {message_text}")
+        log.info("message event", conversation_key=conversation_key, message_by=message_type, text=message_text)
         
         # Get local visitor ID from mapping
         local_visitor_id = wotnot_to_local_mapping.get(conversation_key)
         
         if local_visitor_id and local_visitor_id in conversation_threads:
+            session_reaper.touch(local_visitor_id)
             
             # Skip visitor messages
             if message_type == 'visitor':
-                print(f"Skipping visitor message for conversation {conversation_key}")
                 return
            
             # Process bot messages
             if message_type == 'bot':
-                clean_text = None
-                message_data = None
+                if '_received_at' in event_data:
+                    tracer.record_wait(local_visitor_id, 'wotnot.bot_reply', event_data['_received_at'])
+                tracer.record_wait(local_visitor_id, 'server.webhook_queue', handled_at)
+
+                speech_text = None
+                chat_message = None
                 
                 # Handle text messages
                 if message.get('type') == 'text':
-                    clean_text = strip_html_tags(message_text)
-                    if clean_text and clean_text.strip():
-                        message_data = {
-                            'type': 'bot',
-                            'message': clean_text,
-                            'timestamp': datetime.now().isoformat(),
-                            'source': 'webhook'
-                        }
-                        print(f"Bot text message processed for conversation {local_visitor_id}")
+                    display_text, speech_text = text_normalizer.normalize(message_text)
+                    if display_text:
+                        chat_message = ChatMessage('bot', display_text, source='webhook')
                 
                 # Handle button messages
                 elif message.get('type') == 'button':
                     button_payload = message.get('payload', {})
-                    title = strip_html_tags(button_payload.get('title', ''))
+                    title, speech_text = text_normalizer.normalize(button_payload.get('title', ''))
                     buttons = button_payload.get('buttons', [])
                     
-                    if title and title.strip():
-                        clean_text = title  # Use title as the text to send to HeyGen
-                        message_data = {
-                            'type': 'bot',
-                            'message': title,
-                            'timestamp': datetime.now().isoformat(),
-                            'source': 'webhook',
-                            'buttons': [{'title': btn.get('title', ''), 'type': btn.get('type', '')} for btn in buttons]
-                        }
-                        print(f"Bot button message processed for conversation {local_visitor_id}")
+                    if title:
+                        # The title is what the avatar speaks
+                        chat_message = ChatMessage(
+                            'bot', title, source='webhook',
+                            buttons=[(btn.get('title', ''), btn.get('type', '')) for btn in buttons]
+                        )
                 
                 # If we have valid message data, store it and process
-                if message_data and clean_text:
+                if chat_message:
                     # Store message in conversation thread
-                    conversation_threads[local_visitor_id]['messages'].append(message_data)
+                    with tracer.span(local_visitor_id, 'server.store_message'):
+                        store_message(local_visitor_id, chat_message)
                     
-                    # Send to HeyGen avatar if session exists and is ready
-                    if local_visitor_id in heygen_sessions:
-                        send_message_to_heygen(local_visitor_id, clean_text)
+                    # Send to HeyGen avatar if session exists and there is something to say
+                    if speech_text and local_visitor_id in heygen_sessions:
+                        with tracer.span(local_visitor_id, 'server.send_message_to_heygen'):
+                            send_message_to_heygen(local_visitor_id, speech_text)
                     
                     # Emit to frontend via SocketIO
-                    socketio.emit('new_message', {
-                        'visitor_id': local_visitor_id,
-                        'message': message_data
-                    }, room=local_visitor_id)
+                    with tracer.span(local_visitor_id, 'server.socket_emit'):
+                        socketio.emit('new_message', {
+                            'visitor_id': local_visitor_id,
+                            'message': chat_message.to_dict()
+                        }, room=local_visitor_id)
+                    tracer.finish_turn(local_visitor_id)
+                    if '_received_at' in event_data:
+                        WEBHOOK_TO_EMIT_LATENCY.observe(time.perf_counter() - event_data['_received_at'])
                     
                 else:
-                    print("Message is empty after cleaning or processing")
+                    log.debug("bot message empty after cleaning", conversation_key=conversation_key)
                     
         else:
-            print(f"No local conversation found for thread_id: {conversation_key}")
-            print(f"Available mappings: {wotnot_to_local_mapping}")
+            ERRORS.labels('unknown_conversation').inc()
+            log.warning("no local conversation found", conversation_key=conversation_key)
             
-    except Exception as e:
-        print(f"Error handling message event: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        ERRORS.labels('message_event').inc()
+        log.exception("error handling message event")
 
 def send_message_to_heygen(visitor_id, message_text):
-    """Send message to HeyGen avatar"""
+    """Queue a message for the visitor's HeyGen avatar"""
     try:
         session_info = heygen_sessions[visitor_id]
         session_id = session_info.get('session_id')
         
         if not session_id:
-            print(f"No HeyGen session_id found for visitor: {visitor_id}")
+            log.warning("no heygen session_id found", visitor_id=visitor_id)
             return
         
-        heygen_client = HeyGenStreamingClient(api_key=HEYGEN_API_KEY)
-        
         # Check if session is ready
-        if session_info.get('session_ready', False):
-            # Session is ready, send the message directly
-            task_response = heygen_client.send_text_task(session_id, message_text)
-            print(f"HeyGen task response status: {task_response.get('code') if task_response else 'None'}")
-            print(f"HeyGen task response: {task_response}")
-            
-            if not (task_response and task_response.get('code') == 100):
-                print(f"HeyGen task failed: {task_response}")
-                
-        else:
+        if not session_info.get('session_ready', False):
             # Session not ready, try to start WebRTC first
-            print(f"HeyGen session not ready for visitor: {visitor_id}")
-            
-            if not session_info.get('webrtc_started', False):
-                # Start WebRTC
-                start_response = heygen_client.start_webrtc(session_id)
-                print(f"[start_webrtc] Status: {start_response.get('code') if start_response else 'None'}")
-                print(f"[start_webrtc] Response: {start_response}")
-                
-                if start_response and start_response.get('code') == 100:
-                    # WebRTC started successfully
-                    heygen_sessions[visitor_id]['webrtc_started'] = True
-                    heygen_sessions[visitor_id]['session_ready'] = True
-                    print(f"HeyGen WebRTC started successfully for visitor: {visitor_id}")
-                    
-                    # Now send the message
-                    task_response = heygen_client.send_text_task(session_id, message_text)
-                    print(f"HeyGen task response status: {task_response.get('code') if task_response else 'None'}")
-                    print(f"HeyGen task response: {task_response}")
-                    
-                    if not (task_response and task_response.get('code') == 100):
-                        print(f"HeyGen task failed after WebRTC start: {task_response}")
-                        
-                else:
-                    print(f"Failed to start WebRTC: {start_response}")
-            else:
-                print(f"WebRTC already started but session not ready for visitor: {visitor_id}")
+            if session_info.get('webrtc_started', False):
+                log.warning("webrtc started but heygen session not ready", visitor_id=visitor_id)
+                return
+
+            start_response = heygen_client.start_webrtc(session_id)
+            if not (start_response and start_response.get('code') == 100):
+                ERRORS.labels('webrtc_start').inc()
+                log.warning("webrtc start failed", visitor_id=visitor_id, response=start_response)
+                return
+
+            # WebRTC started successfully
+            heygen_sessions.modify(visitor_id, lambda info: info.update(webrtc_started=True, session_ready=True))
+            log.info("webrtc started", visitor_id=visitor_id, session_id=session_id)
+
+        # The scheduler merges bursts and waits for the avatar to finish speaking
+        speech_scheduler.submit(visitor_id, session_id, message_text)
                 
-    except Exception as e:
-        print(f"Error sending message to HeyGen avatar: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        ERRORS.labels('heygen_speech').inc()
+        log.exception("error sending message to heygen avatar", visitor_id=visitor_id)
 
 def handle_conversation_creation_event(event_data):
     """Handle conversation creation events"""
@@ -579,12 +1082,93 @@ def handle_conversation_creation_event(event_data):
         conversation_key = str(conversation.get('key'))
         visitor_key = visitor.get('key')
         
-        print(f"New conversation created: {conversation_key} for visitor: {visitor_key}")
+        log.info("conversation created", conversation_key=conversation_key, visitor_key=visitor_key)
         
-    except Exception as e:
-        print(f"Error handling conversation creation event: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        ERRORS.labels('conversation_create').inc()
+        log.exception("error handling conversation creation event")
+
+# Stops HeyGen sessions and evicts chats that went idle without /api/stop-chat
+session_reaper = SessionReaper(
+    session_activity,
+    evict_visitors,
+    conversation_ttl=SESSION_IDLE_TTL,
+    heygen_ttl=HEYGEN_IDLE_TTL,
+    interval=REAPER_INTERVAL,
+    gauges=lambda: {'live_conversations': len(conversation_threads), 'live_heygen_sessions': len(heygen_sessions)},
+    deadlines=pending_stops
+)
+session_reaper.start()
+
+# Webhook events are handled off the request thread, in order per conversation
+webhook_queue = KeyedEventQueue(
+    handle_wotnot_event,
+    workers=WEBHOOK_WORKERS,
+    maxsize=WEBHOOK_QUEUE_SIZE,
+    name='webhook'
+)
+webhook_queue.start()
+# Event keys seen recently, in the session store so every worker shares them
+webhook_dedup = WebhookDeduplicator(session_store, ttl=WEBHOOK_DEDUP_TTL)
+# Visitor messages by client_message_id, the page resends over HTTP when a socket ack times out
+message_dedup = WebhookDeduplicator(session_store, ttl=MESSAGE_DEDUP_TTL, namespace='visitor_messages_seen')
+
+# Read at scrape time, nothing is recorded on the request path for these
+Gauge('aivatar_conversation_threads', 'Conversations in conversation_threads', fn=lambda: len(conversation_threads))
+Gauge('aivatar_heygen_sessions', 'HeyGen sessions in heygen_sessions', fn=lambda: len(heygen_sessions))
+Gauge('aivatar_heygen_queue_depth', 'Visitors waiting for a HeyGen session slot',
+      fn=lambda: admission.stats()['waiting'])
+StatsGauge('aivatar_webhook_queue', 'Webhook event queue counters', fn=webhook_queue.stats)
+StatsGauge('aivatar_webhook_dedup', 'Webhook event dedup counters and hit rate', fn=webhook_dedup.stats)
+StatsGauge('aivatar_message_dedup', 'Visitor message dedup counters and hit rate', fn=message_dedup.stats)
+StatsGauge('aivatar_speech_scheduler', 'Speech scheduler counters', fn=speech_scheduler.stats)
+StatsGauge('aivatar_session_reaper', 'Session reaper counters', fn=session_reaper.stats)
+StatsGauge('aivatar_wotnot_breaker', 'WotNot circuit breaker (state 0 closed, 1 half-open, 2 open)',
+           fn=wotnot_breaker.stats)
+StatsGauge('aivatar_heygen_breaker', 'HeyGen circuit breaker (state 0 closed, 1 half-open, 2 open)',
+           fn=heygen_breaker.stats)
+StatsGauge('aivatar_heygen_token', 'HeyGen token cache counters', fn=token_manager.stats)
+StatsGauge('aivatar_avatar_catalog', 'Avatar catalog size, age and refreshes', fn=avatar_catalog.stats)
+StatsGauge('aivatar_heygen_admission', 'HeyGen session slots and waiting queue counters', fn=admission.stats)
+StatsGauge('aivatar_text_cache', 'Text normalizer cache counters', fn=text_normalizer.stats)
+if heygen_pool:
+    StatsGauge('aivatar_heygen_pool', 'Pre-warmed HeyGen session pool counters', fn=heygen_pool.stats)
+
+
+_shutdown_started = False
+_previous_signal_handlers = {}
+
+def shutdown():
+    """Stop the background workers and the pre-warmed pool, then every chat if SHUTDOWN_TEARDOWN is on"""
+    global _shutdown_started
+    if _shutdown_started:
+        return
+    _shutdown_started = True
+    log.info("shutting down", teardown=SHUTDOWN_TEARDOWN)
+    session_reaper.stop()
+    token_manager.stop()
+    if heygen_pool:
+        heygen_pool.stop()
+    if SHUTDOWN_TEARDOWN:
+        teardown_all()
+
+def on_exit_signal(signum, frame):
+    # Runs before interpreter shutdown, while the teardown pool still accepts work
+    shutdown()
+    previous = _previous_signal_handlers.get(signum)
+    if callable(previous):
+        previous(signum, frame)
+    elif previous == signal.SIG_DFL:
+        shutdown_logging()
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+# Chained in front of the server's own handlers (gunicorn installs its worker handlers before loading the app)
+try:
+    for exit_signal in (signal.SIGTERM, signal.SIGINT):
+        _previous_signal_handlers[exit_signal] = signal.signal(exit_signal, on_exit_signal)
+except ValueError:
+    log.warning("not imported in the main thread, no shutdown hook installed")
 
 if __name__ == '__main__':
     socketio.run(app, debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+CatalogSnapshot = namedtuple('CatalogSnapshot', ['avatar_ids', 'voice_ids', 'default_voices', 'body', 'etag',
+                                                 'fetched_at'])
+
+
+class AvatarCatalog:
+    """
+    HeyGen streaming avatars and voices, cached in memory.
+
+    get() answers from memory. A snapshot older than `ttl` seconds is still
+    served while one background thread refreshes it (stale-while-revalidate);
+    a failed refresh keeps the old snapshot and is retried after
+    `retry_interval`. Only a get() before the first successful load waits on
+    HeyGen. The configured default avatar and voice are always accepted.
+    """
+
+    def __init__(self, heygen_client, ttl=3600, retry_interval=60, default_avatar_id=None, default_voice_id=None):
+        self.heygen_client = heygen_client
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.default_avatar_id = default_avatar_id
+        self.default_voice_id = default_voice_id
+
+        self.refreshes = 0
+        self.failures = 0
+
+        self._empty = self._build([], [], fetched_at=0.0)
+        self._snapshot = None
+        self._refreshing = False
+        self._next_attempt = 0.0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def start(self):
+        """Load the catalog in the background"""
+        self._refresh_in_background(time.monotonic())
+
+    def get(self):
+        """Return the current CatalogSnapshot, refreshing it in the background when stale"""
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is None:
+            with self._load_lock:
+                if self._snapshot is None and now >= self._next_attempt:
+                    self.refresh()
+            return self._snapshot or self._empty
+        if now - snapshot.fetched_at >= self.ttl:
+            self._refresh_in_background(now)
+        return snapshot
+
+    def validate(self, avatar_id, voice_id):
+        """Return None if the avatar and voice can be used, otherwise the reason; never calls HeyGen"""
+        snapshot = self._snapshot or self._empty
+        if avatar_id != self.default_avatar_id and avatar_id not in snapshot.avatar_ids:
+            return f"Unknown avatar: {avatar_id}"
+        if voice_id != self.default_voice_id and voice_id not in snapshot.voice_ids:
+            return f"Unknown voice: {voice_id}"
+        return None
+
+    def default_voice(self, avatar_id):
+        """
+        The configured default voice for the default avatar (the pair the
+        session pool is warmed with), else the avatar's own voice from the
+        catalog, else the configured default
+        """
+        if avatar_id == self.default_avatar_id:
+            return self.default_voice_id
+        snapshot = self._snapshot or self._empty
+        return snapshot.default_voices.get(avatar_id) or self.default_voice_id
+
+    def refresh(self):
+        """Fetch the catalog from HeyGen, keeping the current one if that fails"""
+        avatars_response = self.heygen_client.list_streaming_avatars()
+        voices_response = self.heygen_client.list_voices()
+        now = time.monotonic()
+        if not avatars_response or not voices_response:
+            with self._lock:
+                self.failures += 1
+                self._next_attempt = now + self.retry_interval
+            log.warning("avatar catalog refresh failed", stale=self._snapshot is not None)
+            return self._snapshot
+
+        avatars = [
+            {
+                'avatar_id': avatar['avatar_id'],
+                'name': avatar.get('pose_name') or avatar['avatar_id'],
+                'preview_url': avatar.get('normal_preview'),
+                'default_voice': avatar.get('default_voice')
+            }
+            for avatar in avatars_response.get('data') or []
+            if avatar.get('avatar_id') and avatar.get('status', 'ACTIVE') == 'ACTIVE'
+        ]
+        voices = [
+            {
+                'voice_id': voice['voice_id'],
+                'name': voice.get('name') or voice['voice_id'],
+                'language': voice.get('language'),
+                'gender': voice.get('gender'),
+                'preview_url': voice.get('preview_audio')
+            }
+            for voice in (voices_response.get('data') or {}).get('voices') or []
+            if voice.get('voice_id')
+        ]
+        snapshot = self._build(avatars, voices, fetched_at=now)
+        with self._lock:
+            self._snapshot = snapshot
+            self.refreshes += 1
+        log.info("avatar catalog refreshed", avatars=len(avatars), voices=len(voices), etag=snapshot.etag)
+        return snapshot
+
+    def stats(self):
+        """Return catalog counters"""
+        snapshot = self._snapshot
+        return {
+            'avatars': len(snapshot.avatar_ids) if snapshot else 0,
+            'voices': len(snapshot.voice_ids) if snapshot else 0,
+            'age_seconds': time.monotonic() - snapshot.fetched_at if snapshot else -1,
+            'refreshes': self.refreshes,
+            'failures': self.failures
+        }
+
+    def _build(self, avatars, voices, fetched_at):
+        # The response body and its ETag are built once per refresh, not per request
+        body = json.dumps({
+            'avatars': avatars,
+            'voices': voices,
+            'default_avatar_id': self.default_avatar_id,
+            'default_voice_id': self.default_voice_id
+        }, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        return CatalogSnapshot(
+            avatar_ids=frozenset(avatar['avatar_id'] for avatar in avatars),
+            voice_ids=frozenset(voice['voice_id'] for voice in voices),
+            default_voices={avatar['avatar_id']: avatar['default_voice'] for avatar in avatars
+                            if avatar['default_voice']},
+            body=body,
+            etag=hashlib.sha1(body).hexdigest()[:20],
+            fetched_at=fetched_at
+        )
+
+    def _refresh_in_background(self, now):
+        with self._lock:
+            if self._refreshing or now < self._next_attempt:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, name='avatar-catalog-refresh', daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            with self._load_lock:
+                self.refresh()
+        except Exception:
+            log.exception("error refreshing avatar catalog")
+        finally:
+            with self._lock:
+                self._refreshing = False
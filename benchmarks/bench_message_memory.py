@@ -0,0 +1,85 @@
+"""
+Memory benchmark for per-conversation message storage.
+
+Builds N concurrent conversations the way the app stores them, once with the
+old dict-per-message list (ISO timestamp strings, button dicts) and once with
+ChatMessage records in a capped MessageLog, and reports bytes per conversation.
+
+    python benchmarks/bench_message_memory.py --conversations 10000 --messages 40
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_log import ChatMessage, MessageLog
+
+BOT_TEXTS = ["Hi! How can I help you today?", "Sure, here is what I found.", "Please choose an option"]
+BUTTONS = [{'title': 'Pricing', 'type': 'postback'}, {'title': 'Support', 'type': 'postback'},
+           {'title': 'Talk to sales', 'type': 'postback'}]
+
+
+def old_conversation(visitor_id, message_count):
+    messages = []
+    for index in range(message_count):
+        if index % 2 == 0:
+            messages.append({'type': 'user', 'message': f"question {index}",
+                             'timestamp': datetime.now().isoformat()})
+        elif index % 6 == 5:
+            messages.append({'type': 'bot', 'message': BOT_TEXTS[2], 'timestamp': datetime.now().isoformat(),
+                             'source': 'webhook',
+                             'buttons': [{'title': b['title'], 'type': b['type']} for b in BUTTONS]})
+        else:
+            messages.append({'type': 'bot', 'message': BOT_TEXTS[index % 2], 'timestamp': datetime.now().isoformat(),
+                             'source': 'webhook'})
+    return {'thread_id': visitor_id, 'visitor_id': visitor_id, 'created_at': datetime.now().isoformat(),
+            'messages': messages}
+
+
+def new_conversation(visitor_id, message_count, capacity):
+    messages = MessageLog(capacity)
+    for index in range(message_count):
+        if index % 2 == 0:
+            messages.append(ChatMessage('user', f"question {index}"))
+        elif index % 6 == 5:
+            messages.append(ChatMessage('bot', BOT_TEXTS[2], source='webhook',
+                                        buttons=[(b['title'], b['type']) for b in BUTTONS]))
+        else:
+            messages.append(ChatMessage('bot', BOT_TEXTS[index % 2], source='webhook'))
+    return {'thread_id': visitor_id, 'visitor_id': visitor_id, 'created_at': time.time(), 'messages': messages}
+
+
+def measure(build, conversations):
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    threads = {}
+    for index in range(conversations):
+        visitor_id = f"{index:032x}"
+        threads[visitor_id] = build(visitor_id)
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return used / conversations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--conversations', type=int, default=10000)
+    parser.add_argument('--messages', type=int, default=40)
+    parser.add_argument('--capacity', type=int, default=200, help="MessageLog cap (MESSAGE_HISTORY_LIMIT)")
+    args = parser.parse_args()
+
+    before = measure(lambda vid: old_conversation(vid, args.messages), args.conversations)
+    after = measure(lambda vid: new_conversation(vid, args.messages, args.capacity), args.conversations)
+
+    print(f"{args.conversations} conversations x {args.messages} messages (cap {args.capacity})")
+    print(f"before: {before:10.0f} bytes/conversation  {before * args.conversations / 2 ** 20:8.1f} MiB total")
+    print(f"after:  {after:10.0f} bytes/conversation  {after * args.conversations / 2 ** 20:8.1f} MiB total")
+    print(f"saved:  {(1 - after / before) * 100:9.1f} %")
+
+
+if __name__ == '__main__':
+    main()
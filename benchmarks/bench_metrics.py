@@ -0,0 +1,50 @@
+"""
+Benchmark the per-observation cost of recording metrics.
+
+Times what the clients do on every upstream call (label lookup plus
+histogram observe), a counter increment, and a full /metrics render.
+
+    python benchmarks/bench_metrics.py --operations 200000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Counter, Histogram, Registry
+
+
+def time_per_op(fn, operations):
+    started = time.perf_counter()
+    for index in range(operations):
+        fn(index)
+    return (time.perf_counter() - started) / operations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--operations', type=int, default=200000)
+    args = parser.parse_args()
+
+    registry = Registry()
+    latency = Histogram('bench_seconds', 'Benchmark latency', ('upstream', 'endpoint'), registry=registry)
+    errors = Counter('bench_errors_total', 'Benchmark errors', ('type',), registry=registry)
+    endpoints = ['streaming.create_token', 'streaming.new', 'streaming.start', 'streaming.task', 'streaming.stop']
+
+    observe_us = time_per_op(
+        lambda index: latency.labels('heygen', endpoints[index % 5]).observe((index % 1000) / 1000.0),
+        args.operations)
+    inc_us = time_per_op(lambda index: errors.labels('bench').inc(), args.operations)
+
+    started = time.perf_counter()
+    body = registry.render()
+    render_ms = (time.perf_counter() - started) * 1e3
+
+    print(f"histogram observe {observe_us:6.2f} us   counter inc {inc_us:6.2f} us   "
+          f"render {render_ms:6.2f} ms ({len(body)} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark the session-store get/put/delete path used on every webhook.
+
+Times the lookup handle_message_event does (WotNot key -> visitor ID ->
+conversation) plus put/delete, for the plain dicts the app used before and
+for each SessionStore backend. Conversations hold a full MessageLog, so a
+membership check that loads the value shows up. Set REDIS_URL to include
+Redis; its keys are removed afterwards.
+
+    python benchmarks/bench_session_store.py --sessions 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_log import ChatMessage, MessageLog
+from session_store import InMemorySessionStore, RedisSessionStore, SQLiteSessionStore
+
+
+def populate(mapping, conversations, sessions, messages):
+    log = MessageLog(messages)
+    for index in range(messages):
+        log.append(ChatMessage('bot' if index % 2 else 'user', f"Message number {index} of the conversation"))
+    for index in range(sessions):
+        visitor_id = f"visitor{index:08d}"
+        mapping[str(index)] = visitor_id
+        conversations[visitor_id] = {'thread_id': index, 'visitor_id': visitor_id, 'messages': log}
+
+
+def time_per_op(fn, operations):
+    started = time.perf_counter()
+    for index in range(operations):
+        fn(index)
+    return (time.perf_counter() - started) / operations * 1e6
+
+
+def bench(name, mapping, conversations, sessions, messages, operations):
+    populate(mapping, conversations, sessions, messages)
+
+    def lookup(index):
+        visitor_id = mapping.get(str(index % sessions))
+        assert visitor_id and visitor_id in conversations
+
+    def put(index):
+        mapping[f"bench{index}"] = "visitor"
+
+    def delete(index):
+        del mapping[f"bench{index}"]
+
+    lookup_us = time_per_op(lookup, operations)
+    put_us = time_per_op(put, operations)
+    delete_us = time_per_op(delete, operations)
+    print(f"{name:<12} lookup {lookup_us:9.2f} us   put {put_us:9.2f} us   delete {delete_us:9.2f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=10000)
+    parser.add_argument('--messages', type=int, default=200, help="messages held per conversation")
+    parser.add_argument('--operations', type=int, default=20000)
+    args = parser.parse_args()
+    sizes = (args.sessions, args.messages, args.operations)
+
+    print(f"{args.sessions} live sessions of {args.messages} messages, {args.operations} operations per measurement")
+    bench('dict', {}, {}, *sizes)
+
+    store = InMemorySessionStore()
+    bench('memory', store.namespace('mapping'), store.namespace('conversations'), *sizes)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteSessionStore(os.path.join(directory, 'sessions.db'))
+        bench('sqlite', store.namespace('mapping'), store.namespace('conversations'), *sizes)
+
+    redis_url = os.getenv('REDIS_URL')
+    if redis_url:
+        store = RedisSessionStore(redis_url, prefix='aivatar-bench')
+        try:
+            bench('redis', store.namespace('mapping'), store.namespace('conversations'), *sizes)
+        finally:
+            keys = list(store.client.scan_iter(match=f"{store.prefix}:*", count=1000))
+            for start in range(0, len(keys), 1000):
+                store.client.delete(*keys[start:start + 1000])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark emit-to-delivery latency of Socket.IO emits made in another process.
+
+Runs a Socket.IO server with the client manager for `--queue`, connects a
+client that joins a room, then emits `--messages` events to that room from a
+separate process (the way a webhook handled by another worker does) and
+reports p50/p95/p99 of the time until the client receives them. With
+memory:// there is no queue, so the emits are made inside the server process
+instead; that is the transport-only baseline.
+
+    python benchmarks/bench_socketio_fanout.py --queue sqlite:////tmp/socketio-bench.db
+    python benchmarks/bench_socketio_fanout.py --queue redis://localhost:6379/0
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import socketio
+from flask import Flask
+from flask_socketio import SocketIO, join_room
+from werkzeug.serving import make_server
+
+from socketio_queue import create_client_manager
+
+ROOM = 'bench-visitor'
+
+
+def emit_from(manager, messages, rate):
+    for index in range(messages):
+        manager.emit('bench', {'index': index, 'sent_at': time.time()}, room=ROOM, namespace='/')
+        time.sleep(1.0 / rate)
+
+
+def emitter_process(url, messages, rate):
+    emit_from(create_client_manager(url, write_only=True), messages, rate)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--queue', default='sqlite:////tmp/socketio-bench.db')
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=200.0, help="emits per second")
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    server_socketio = SocketIO(app, client_manager=create_client_manager(args.queue))
+
+    @server_socketio.on('join')
+    def on_join(data):
+        join_room(data['visitor_id'])
+        return True
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    latencies = []
+    received = threading.Event()
+    client = socketio.Client()
+
+    @client.on('bench')
+    def on_bench(data):
+        latencies.append(time.time() - data['sent_at'])
+        if len(latencies) >= args.messages:
+            received.set()
+
+    client.connect(f"http://127.0.0.1:{server.server_port}", transports=['polling'])
+    client.call('join', {'visitor_id': ROOM})
+    # Give the queue listener time to start before the first emit
+    time.sleep(0.5)
+
+    if create_client_manager(args.queue, write_only=True) is None:
+        where = 'server process'
+        emit_from(server_socketio.server.manager, args.messages, args.rate)
+    else:
+        where = 'separate process'
+        emitter = multiprocessing.Process(target=emitter_process, args=(args.queue, args.messages, args.rate))
+        emitter.start()
+        emitter.join()
+    received.wait(10)
+    client.disconnect()
+    server.shutdown()
+
+    print(f"queue {args.queue}, emits from {where}, {args.messages} messages at {args.rate:.0f}/s")
+    print(f"delivered {len(latencies)}/{args.messages}")
+    if latencies:
+        print(f"latency p50 {percentile(latencies, 0.5) * 1000:6.1f} ms   p95 {percentile(latencies, 0.95) * 1000:6.1f} ms"
+              f"   p99 {percentile(latencies, 0.99) * 1000:6.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
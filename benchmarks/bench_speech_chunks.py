@@ -0,0 +1,106 @@
+"""
+Benchmark time to first spoken word with and without speech chunking.
+
+Runs SpeechScheduler with the real HeyGen client against the HeyGen
+simulator, whose streaming.task only answers once the text has been
+"synthesized" at `--synthesis-rate` characters per second. For each chunk
+size it reports when the first task is accepted (the avatar starts
+speaking), when the last one is, and whether the avatar would run out of
+text before a later chunk arrived.
+
+    python benchmarks/bench_speech_chunks.py --runs 10 --chunk-sizes 0,80,160
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from heygen_client import HeyGenStreamingClient
+from simulators import HeyGenSimulator
+from speech_scheduler import SpeechScheduler, chunk_speech
+
+REPLIES = {
+    'short': "Sure, I can help with that. What is your order number?",
+    'long': (
+        "Our premium plan includes unlimited conversations, priority support, custom branding and a dedicated "
+        "account manager who will help you get set up. Pricing starts at 99 dollars per month, billed annually; "
+        "monthly billing is also available at a slightly higher rate. Every plan comes with a 14 day free trial, "
+        "and you can cancel at any time from the billing page without talking to anyone. If you are moving from "
+        "another provider, our team can import your existing conversations and bots for free. Would you like me "
+        "to book a demo with one of our product specialists this week?"
+    ),
+}
+
+
+class RecordingClient(HeyGenStreamingClient):
+    """HeyGen client that timestamps every accepted task"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tasks = []
+        self.expected = 0
+        self.done = threading.Event()
+
+    def send_text_task(self, session_id, text, task_mode="sync", task_type="repeat"):
+        response = super().send_text_task(session_id, text, task_mode=task_mode, task_type=task_type)
+        self.tasks.append((time.perf_counter(), (response.get('data') or {}).get('duration_ms', 0)))
+        if len(self.tasks) >= self.expected:
+            self.done.set()
+        return response
+
+
+def run_once(scheduler, client, session_id, visitor_id, text, expected):
+    client.tasks, client.expected = [], expected
+    client.done.clear()
+    submitted = time.perf_counter()
+    scheduler.submit(visitor_id, session_id, text)
+    client.done.wait(60)
+
+    first_word = client.tasks[0][0] - submitted
+    last_task = client.tasks[-1][0] - submitted
+    # The avatar speaks chunks back to back; a stall is time spent waiting for the next one
+    stall, speaking_until = 0.0, client.tasks[0][0]
+    for accepted, duration_ms in client.tasks:
+        stall += max(0.0, accepted - speaking_until)
+        speaking_until = max(accepted, speaking_until) + duration_ms / 1000.0
+    return first_word, last_task, stall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--chunk-sizes', default='0,80,160', help="SPEECH_CHUNK_MAX_CHARS values, 0 is unchunked")
+    parser.add_argument('--min-chars', type=int, default=40)
+    parser.add_argument('--synthesis-rate', type=float, default=400.0, help="characters HeyGen processes per second")
+    parser.add_argument('--latency', default='fixed:0.1', help="HeyGen round trip")
+    args = parser.parse_args()
+
+    heygen = HeyGenSimulator(latency=args.latency, synthesis_chars_per_second=args.synthesis_rate).start()
+    client = RecordingClient('bench', base_url=heygen.url)
+    session_id = client.start_streaming_session('bench', 'bench')['data']['session_id']
+
+    print(f"{'reply':<6} {'chunking':<10} {'tasks':>5} {'first word':>11} {'last task':>10} {'stall':>8}")
+    for name, text in REPLIES.items():
+        for max_chars in (int(size) for size in args.chunk_sizes.split(',')):
+            scheduler = SpeechScheduler(client, coalesce_window=0, chunk_min_chars=args.min_chars,
+                                        chunk_max_chars=max_chars)
+            scheduler.start()
+            expected = len(chunk_speech(text, args.min_chars, max_chars)) if max_chars else 1
+            results = [run_once(scheduler, client, session_id, f'{name}-{max_chars}-{run}', text, expected)
+                       for run in range(args.runs)]
+            scheduler.stop()
+
+            first_word, last_task, stall = (statistics.median(column) for column in zip(*results))
+            label = str(max_chars) if max_chars else 'off'
+            print(f"{name:<6} {label:<10} {expected:>5} {first_word * 1000:8.0f} ms {last_task * 1000:7.0f} ms "
+                  f"{stall * 1000:5.0f} ms")
+
+    heygen.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark /api/start-chat against stubbed WotNot and HeyGen upstreams.
+
+Compares the measured latency of the concurrent start_chat pipeline with the
+old sequential one (WotNot, then HeyGen, then a 1s sleep before the greeting).
+The HeyGen token is cached, so after the first chat only streaming.new and
+streaming.start are on the path.
+
+    python benchmarks/bench_start_chat.py --iterations 10
+"""
+import argparse
+import itertools
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("BOT_KEY", "benchbot")
+os.environ.setdefault("HEYGEN_POOL_SIZE", "0")
+
+import app as chat_app
+
+
+class StubWotNot:
+    def __init__(self, latency):
+        self.latency = latency
+        self.ids = itertools.count(1)
+
+    def start_conversation(self, visitor_id, initial_message="Hello"):
+        time.sleep(self.latency)
+        return {
+            'conversation': {'id': next(self.ids)},
+            'messages': [{'from': {'type': 'BOT'}, 'data': {'body': '<p>Hi, how can I help?</p>'}}]
+        }
+
+
+def stub_heygen_client(token_latency, new_latency, start_latency):
+    ids = itertools.count(1)
+
+    class StubHeyGen:
+        def __init__(self, api_key=None, **kwargs):
+            pass
+
+        def create_token(self):
+            time.sleep(token_latency)
+            return {'token': 'token'}
+
+        def start_streaming_session(self, avatar_id, voice_id):
+            time.sleep(new_latency)
+            return {'data': {'session_id': f'session-{next(ids)}', 'url': 'wss://stub',
+                             'access_token': 'access', 'realtime_endpoint': 'wss://stub/rt'}}
+
+        def start_webrtc(self, session_id):
+            time.sleep(start_latency)
+            return {'code': 100}
+
+        def send_text_task(self, session_id, text, task_mode="sync", task_type="repeat"):
+            return {'code': 100, 'data': {'duration_ms': 1000}}
+
+        def stop_session(self, session_id):
+            return {'code': 100}
+
+    return StubHeyGen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--wotnot-latency', type=float, default=0.4)
+    parser.add_argument('--token-latency', type=float, default=0.1)
+    parser.add_argument('--new-latency', type=float, default=0.3)
+    parser.add_argument('--start-latency', type=float, default=0.2)
+    args = parser.parse_args()
+
+    chat_app.wotnot_client = StubWotNot(args.wotnot_latency)
+    chat_app.heygen_client = stub_heygen_client(args.token_latency, args.new_latency, args.start_latency)()
+    chat_app.speech_scheduler.heygen_client = chat_app.heygen_client
+    chat_app.token_manager.heygen_client = chat_app.heygen_client
+    client = chat_app.app.test_client()
+
+    samples = []
+    for _ in range(args.iterations):
+        started = time.perf_counter()
+        response = client.post('/api/start-chat')
+        samples.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.get_json()
+
+    heygen_latency = args.token_latency + args.new_latency + args.start_latency
+    sequential = args.wotnot_latency + heygen_latency + 1.0
+    ideal = max(args.wotnot_latency, heygen_latency - args.token_latency)
+    mean = statistics.mean(samples)
+
+    print(f"start_chat iterations:       {args.iterations}")
+    print(f"old sequential pipeline:     {sequential * 1000:8.1f} ms  (WotNot + HeyGen + 1s greeting delay)")
+    print(f"target max(WotNot, HeyGen):  {ideal * 1000:8.1f} ms  (HeyGen without create_token)")
+    print(f"measured mean:               {mean * 1000:8.1f} ms")
+    print(f"measured p50 / max:          {statistics.median(samples) * 1000:8.1f} / {max(samples) * 1000:.1f} ms")
+    print(f"speedup vs sequential:       {sequential / mean:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Microbenchmark the per-message text helpers.
+
+Compares the old strip_html_tags with TextNormalizer on a cold cache (every
+string new) and a warm one (repeated greetings and button titles), and the
+old clean_publish_key with the precompiled one WotNotAPI uses now.
+
+    python benchmarks/bench_text.py --operations 50000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_normalizer import TextNormalizer
+from wotnot_client import WotNotAPI
+
+BOT_MESSAGES = [
+    "<p>Hi there &#128075; I'm <b>Pedro</b>, how can I help you today?</p>",
+    "<p>Here is what I can do:</p><ul><li>Answer <i>pricing</i> questions</li><li>Book a demo 📅</li></ul>",
+    "Check **our docs** at https://example.com/docs/getting-started or [the FAQ](https://example.com/faq).",
+    "<div>Thanks! Our team will reach out within <strong>24&nbsp;hours</strong>.</div><br/>Anything else?",
+    "Would you like to talk to a human?",
+]
+PUBLISH_KEYS = ["  a1B2c3D4e5F6 ", "abc-123_def 456 ✨", "0123456789abcdefABCDEF"]
+
+
+def strip_html_tags_old(text):
+    if not text:
+        return ""
+    return re.sub(r'<[^>]+>', '', text).strip()
+
+
+def clean_publish_key_old(key):
+    key = key.strip()
+    key = re.sub(r'[^a-zA-Z0-9]', '', key)
+    return key
+
+
+def time_per_op(fn, operations):
+    started = time.perf_counter()
+    for index in range(operations):
+        fn(index)
+    return (time.perf_counter() - started) / operations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--operations', type=int, default=50000)
+    args = parser.parse_args()
+    operations = args.operations
+
+    cold = TextNormalizer(cache_size=0)
+    warm = TextNormalizer(cache_size=1024)
+    # Make every string unique so the cold run never repeats one
+    unique = [f"{BOT_MESSAGES[index % len(BOT_MESSAGES)]} #{index}" for index in range(operations)]
+    wotnot = WotNotAPI('bench', 'bench', 'http://wotnot.invalid')
+
+    results = [
+        ('strip_html_tags (old)', time_per_op(lambda i: strip_html_tags_old(BOT_MESSAGES[i % 5]), operations)),
+        ('normalize, cold cache', time_per_op(lambda i: cold.normalize(unique[i]), operations)),
+        ('normalize, warm cache', time_per_op(lambda i: warm.normalize(BOT_MESSAGES[i % 5]), operations)),
+        ('clean_publish_key (old)', time_per_op(lambda i: clean_publish_key_old(PUBLISH_KEYS[i % 3]), operations)),
+        ('clean_publish_key', time_per_op(lambda i: wotnot.clean_publish_key(PUBLISH_KEYS[i % 3]), operations)),
+    ]
+    for name, micros in results:
+        print(f"{name:<26} {micros:8.2f} us")
+    print(f"warm cache {warm.stats()}")
+
+
+if __name__ == '__main__':
+    main()
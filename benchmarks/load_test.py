@@ -0,0 +1,180 @@
+"""
+Load-test the app against the in-process WotNot and HeyGen simulators.
+
+Starts both simulators and the app on local ports, then runs `--users`
+visitor flows, `--concurrency` at a time: start a chat, join its Socket.IO
+room, send `--messages` messages waiting for each bot reply over the
+socket, then stop the chat. Reports throughput and p50/p95/p99 for chat
+start, message send and reply delivery.
+
+    python benchmarks/load_test.py --users 200 --concurrency 50 --messages 3
+"""
+import argparse
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+import socketio
+from werkzeug.serving import make_server
+
+from simulators import HeyGenSimulator, WotNotSimulator
+
+
+class Results:
+    def __init__(self):
+        self.chat_start = []
+        self.reply = []
+        self.send = []
+        self.flows = 0
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, value):
+        with self._lock:
+            getattr(self, name).append(value)
+
+    def flow_done(self):
+        with self._lock:
+            self.flows += 1
+
+    def error(self, kind):
+        with self._lock:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_visitor(base_url, messages, reply_timeout, results, send_over='http'):
+    http = requests.Session()
+    started = time.perf_counter()
+    try:
+        response = http.post(f"{base_url}/api/start-chat", timeout=30)
+    except requests.exceptions.RequestException:
+        results.error('start_chat')
+        return
+    if response.status_code != 200:
+        results.error(f'start_chat_{response.status_code}')
+        return
+    results.add('chat_start', time.perf_counter() - started)
+    visitor_id = response.json()['visitor_id']
+
+    replies = queue.Queue()
+    client = socketio.Client(reconnection=False)
+    client.on('new_message', lambda data: replies.put(time.perf_counter()))
+    try:
+        client.connect(base_url, wait_timeout=10)
+        # call() waits for the server to handle the join, so the room exists before the first reply
+        client.call('join', {'visitor_id': visitor_id}, timeout=10)
+
+        for index in range(messages):
+            payload = {'visitor_id': visitor_id, 'message': f"Load test message {index + 1}"}
+            sent = time.perf_counter()
+            if send_over == 'socket':
+                status = client.call('send_message', payload, timeout=30)['status']
+            else:
+                status = http.post(f"{base_url}/api/send-message", json=payload, timeout=30).status_code
+            results.add('send', time.perf_counter() - sent)
+            if status != 200:
+                results.error(f'send_message_{status}')
+                continue
+            try:
+                results.add('reply', replies.get(timeout=reply_timeout) - sent)
+            except queue.Empty:
+                results.error('reply_timeout')
+    except (socketio.exceptions.SocketIOError, requests.exceptions.RequestException) as e:
+        results.error(type(e).__name__)
+    finally:
+        try:
+            http.post(f"{base_url}/api/stop-chat", json={'visitor_id': visitor_id}, timeout=30)
+        except requests.exceptions.RequestException:
+            results.error('stop_chat')
+        client.disconnect()
+    results.flow_done()
+
+
+def report(name, values, unit=1000.0):
+    if not values:
+        print(f"{name:<16} no samples")
+        return
+    print(f"{name:<16} n={len(values):<6} p50 {percentile(values, 0.5) * unit:8.1f} ms   "
+          f"p95 {percentile(values, 0.95) * unit:8.1f} ms   p99 {percentile(values, 0.99) * unit:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=3)
+    parser.add_argument('--bot-latency', default='lognormal:0.5,0.4', help="WotNot bot reply delay")
+    parser.add_argument('--wotnot-latency', default='lognormal:0.15,0.3')
+    parser.add_argument('--heygen-latency', default='lognormal:0.3,0.4')
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of upstream calls that fail")
+    parser.add_argument('--redelivery-rate', type=float, default=0.0, help="fraction of webhooks WotNot sends twice")
+    parser.add_argument('--pool-size', type=int, default=0, help="HEYGEN_POOL_SIZE for the app")
+    parser.add_argument('--session-limit', type=int, default=0,
+                        help="HEYGEN_SESSION_LIMIT for the app, visitors over it chat by text while queued")
+    parser.add_argument('--reply-timeout', type=float, default=15.0)
+    parser.add_argument('--send-over', choices=('http', 'socket'), default='http',
+                        help="send visitor messages with POST /api/send-message or the send_message socket event")
+    args = parser.parse_args()
+
+    wotnot = WotNotSimulator(bot_latency=args.bot_latency, latency=args.wotnot_latency,
+                             error_rate=args.error_rate, redelivery_rate=args.redelivery_rate, webhook_token='load-test').start()
+    heygen = HeyGenSimulator(latency=args.heygen_latency, error_rate=args.error_rate).start()
+
+    # The app reads its configuration at import time
+    os.environ.update({
+        'WOTNOT_BASE_URL': wotnot.url,
+        'WOTNOT_API_KEY': 'load-test',
+        'BOT_KEY': 'loadtest',
+        'WEBHOOK_TOKEN': 'load-test',
+        'HEYGEN_BASE_URL': heygen.url,
+        'HEYGEN_API_KEY': 'load-test',
+        'HEYGEN_POOL_SIZE': str(args.pool_size),
+        'HEYGEN_SESSION_LIMIT': str(args.session_limit),
+        'HTTP_POOL_SIZE': str(max(20, args.concurrency)),
+    })
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import app as chat_app
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, chat_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='load-test-app', daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    wotnot.webhook_url = f"{base_url}/webhook/wotnot"
+
+    print(f"{args.users} visitors, {args.concurrency} concurrent, {args.messages} messages each")
+    results = Results()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for _ in range(args.users):
+            executor.submit(run_visitor, base_url, args.messages, args.reply_timeout, results, args.send_over)
+    elapsed = time.perf_counter() - started
+
+    print(f"elapsed {elapsed:.1f}s   {results.flows / elapsed:.1f} chats/s   {len(results.reply) / elapsed:.1f} replies/s")
+    report('chat start', results.chat_start)
+    report('message send', results.send)
+    report('reply delivery', results.reply)
+    print(f"errors {results.errors or 'none'}")
+    print(f"heygen simulator {heygen.stats()}")
+    print(f"wotnot simulator {wotnot.stats()}")
+    print(f"webhook dedup {chat_app.webhook_dedup.stats()}")
+    print(f"heygen admission {chat_app.admission.stats()}")
+
+    server.shutdown()
+    wotnot.stop()
+    heygen.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import threading
+import time
+
+import requests
+
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Per-upstream circuit breaker.
+
+    After `failure_threshold` consecutive failed or slow calls (slower than
+    `slow_call_seconds`) the breaker opens and calls are rejected right away
+    with CircuitOpenError. After `reset_timeout` seconds it lets up to
+    `half_open_probes` calls through; a good probe closes it again, a bad
+    one reopens it for another `reset_timeout`.
+    """
+
+    def __init__(self, name, failure_threshold=5, slow_call_seconds=10.0, reset_timeout=30.0, half_open_probes=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+
+        self.state = CLOSED
+        self.rejected = 0
+        self.opened = 0
+
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Admit a call, or raise CircuitOpenError"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._transition(HALF_OPEN)
+                self._probes = 0
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"{self.name} circuit breaker is open")
+
+    def is_open(self):
+        """True while calls would be rejected, without using up a probe"""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self._opened_at < self.reset_timeout
+            return self.state == HALF_OPEN and self._probes >= self.half_open_probes
+
+    def record(self, duration, failed):
+        """Record the outcome of an admitted call"""
+        bad = failed or duration > self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if bad:
+                    self._open()
+                else:
+                    self._failures = 0
+                    self._transition(CLOSED)
+            elif bad:
+                self._failures += 1
+                if self.state == CLOSED and self._failures >= self.failure_threshold:
+                    self._open()
+            else:
+                self._failures = 0
+
+    def stats(self):
+        """Return breaker counters; state is 0 closed, 1 half-open, 2 open"""
+        with self._lock:
+            return {
+                'state': {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}[self.state],
+                'consecutive_failures': self._failures,
+                'opened': self.opened,
+                'rejected': self.rejected
+            }
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self.opened += 1
+        self._transition(OPEN)
+
+    def _transition(self, state):
+        if state != self.state:
+            log.warning("circuit breaker state change", upstream=self.name, old_state=self.state, new_state=state)
+            self.state = state
@@ -0,0 +1,98 @@
+import queue
+import threading
+import zlib
+
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+
+class KeyedEventQueue:
+    """
+    Bounded in-process queue drained by a pool of worker threads.
+
+    Every key is hashed onto one worker, so events that share a key (a WotNot
+    conversation) are handled in the order they were submitted while
+    different keys are handled in parallel. Each worker has its own bounded
+    queue; submit() waits at most `put_timeout` seconds for room and then
+    sheds the event instead of growing without limit.
+    """
+
+    def __init__(self, handler, workers=4, maxsize=1000, put_timeout=0.05, name='event-queue'):
+        self.handler = handler
+        self.put_timeout = put_timeout
+        self.name = name
+
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+
+        shard_size = max(1, maxsize // workers)
+        self._queues = [queue.Queue(maxsize=shard_size) for _ in range(workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads"""
+        if self._threads:
+            return
+        for index, shard in enumerate(self._queues):
+            thread = threading.Thread(target=self._run, args=(shard,), name=f'{self.name}-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Let the workers finish what is queued, then stop them"""
+        for shard in self._queues:
+            shard.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, key, event):
+        """
+        Queue an event for its key.
+
+        Returns True when the event was queued and False when the queue was
+        full and the event was dropped.
+        """
+        shard = self._queues[zlib.crc32(str(key).encode('utf-8')) % len(self._queues)]
+        try:
+            shard.put(event, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def depth(self):
+        """Number of events waiting across all workers"""
+        return sum(shard.qsize() for shard in self._queues)
+
+    def stats(self):
+        """Return queue counters"""
+        with self._lock:
+            return {
+                'depth': self.depth(),
+                'enqueued': self.enqueued,
+                'processed': self.processed,
+                'failed': self.failed,
+                'dropped': self.dropped
+            }
+
+    def _run(self, shard):
+        while True:
+            event = shard.get()
+            if event is None:
+                return
+            try:
+                self.handler(event)
+                with self._lock:
+                    self.processed += 1
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                log.exception("error handling queued event", queue=self.name)
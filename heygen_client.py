@@ -1,9 +1,32 @@
+import logging
+import time
+
 import requests
 
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from http_transport import AsyncHTTPTransport, default_transport
+from metrics import UPSTREAM_ERRORS, UPSTREAM_LATENCY, error_type
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+
+def _endpoint(path):
+    """Metric label for an API path, e.g. /v1/streaming.task -> streaming.task"""
+    return path.rsplit('/', 1)[-1]
+
+
+def _is_upstream_failure(response):
+    """Responses that count against the circuit breaker; other 4xx are our fault, not HeyGen's"""
+    return response.status_code >= 500 or response.status_code == 429
+
+
 class HeyGenStreamingClient:
-    def __init__(self, api_key):
+    def __init__(self, api_key, transport=None, base_url=None, breaker=None):
         self.api_key = api_key
-        self.base_url = "https://api.heygen.com"
+        self.transport = transport or default_transport()
+        self.base_url = base_url or "https://api.heygen.com"
+        self.breaker = breaker or CircuitBreaker('heygen')
         self.headers = {
             "x-api-key": self.api_key,
             "accept": "application/json",
@@ -13,53 +36,23 @@ class HeyGenStreamingClient:
     def create_token(self):
         """Generate a new access token for a HeyGen streaming session.
         This token is required to start a unique streaming session."""
-        url = f"{self.base_url}/v1/streaming.create_token"
-        headers = {
-            "accept": "application/json",
-            "content-type": "application/json",
-            "x-api-key": self.api_key
-        }
-
-        try:
-            response = requests.post(url, json={}, headers=headers)
-            print(f"[create_token] Status: {response.status_code}")
-            print(f"[create_token] Response: {response.text}")
-            response.raise_for_status()
-            json_data = response.json()
-            return json_data.get("data", {})  # <-- FIX
-        except requests.exceptions.RequestException as e:
-            print(f"[create_token] Error: {e}")
-            print(f"[create_token] Response content: {response.text if 'response' in locals() else 'No response'}")
-            return None
+        # Creating a token has no side effects, so it is safe to retry
+        return self._send('create_token', 'POST', '/v1/streaming.create_token', json={},
+                          idempotent=True, unwrap_data=True)
 
     def list_streaming_avatars(self):
         """List available streaming avatars"""
-        url = f"{self.base_url}/v1/streaming/avatar.list"
+        return self._send('list_streaming_avatars', 'GET', '/v1/streaming/avatar.list')
 
-        headers = {
-            "accept": "application/json",
-            "x-api-key": self.api_key
-        }
-
-        try:
-            response = requests.get(url, headers=headers)
-            print(f"[list_streaming_avatars] Status: {response.status_code}")
-            print(f"[list_streaming_avatars] Response: {response.text}")
-
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"[list_streaming_avatars] Error: {e}")
-            print(f"[list_streaming_avatars] Response content: {response.text if 'response' in locals() else 'No response'}")
-            return None
+    def list_voices(self):
+        """List available voices"""
+        return self._send('list_voices', 'GET', '/v2/voices')
 
     def start_streaming_session(self, avatar_id, voice_id):
         """
         Initiate a new streaming session with HeyGen's Interactive Avatar API.
         Returns session_id, websocket URL, access_token, and other metadata.
         """
-        url = f"{self.base_url}/v1/streaming.new"
-
         payload = {
             "avatar_id": avatar_id,
             "voice_id": voice_id,
@@ -76,24 +69,7 @@ class HeyGenStreamingClient:
             },
             "activity_idle_timeout": 120
         }
-
-        headers = {
-            "accept": "application/json",
-            "content-type": "application/json",
-            "x-api-key": self.api_key
-        }
-
-        try:
-            response = requests.post(url, headers=headers, json=payload)
-            print(f"[start_streaming_session] Status: {response.status_code}")
-            print(f"[start_streaming_session] Response: {response.text}")
-
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"[start_streaming_session] Error: {e}")
-            print(f"[start_streaming_session] Response content: {response.text if 'response' in locals() else 'No response'}")
-            return None
+        return self._send('start_streaming_session', 'POST', '/v1/streaming.new', json=payload)
 
     def start_webrtc(self, session_id):
         """
@@ -106,29 +82,10 @@ class HeyGenStreamingClient:
         Returns:
             dict: JSON response from HeyGen API.
         """
-        url = f"{self.base_url}/v1/streaming.start"
-
         payload = {
             "session_id": session_id
         }
-
-        headers = {
-            "accept": "application/json",
-            "content-type": "application/json",
-            "x-api-key": self.api_key
-        }
-
-        try:
-            response = requests.post(url, headers=headers, json=payload)
-            print(f"[start_webrtc] Status: {response.status_code}")
-            print(f"[start_webrtc] Response: {response.text}")
-
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"[start_webrtc] Error: {e}")
-            print(f"[start_webrtc] Response content: {response.text if 'response' in locals() else 'No response'}")
-            return None
+        return self._send('start_webrtc', 'POST', '/v1/streaming.start', json=payload)
 
     def send_text_task(self, session_id, text, task_mode="sync", task_type="repeat"):
         """
@@ -143,24 +100,13 @@ class HeyGenStreamingClient:
         Returns:
         - JSON response with task_id and duration_ms
         """
-        url = f"{self.base_url}/v1/streaming.task"
         payload = {
             "session_id": session_id,
             "text": text,
             "task_mode": task_mode,
             "task_type": task_type
         }
-
-        try:
-            response = requests.post(url, headers=self.headers, json=payload)
-            print(f"HeyGen task response status: {response.status_code}")
-            print(f"HeyGen task response: {response.text}")
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"Error sending text task: {e}")
-            print(f"Response content: {response.text if 'response' in locals() else 'No response'}")
-            return None
+        return self._send('send_text_task', 'POST', '/v1/streaming.task', json=payload)
             
     def stop_session(self, session_id):
         """
@@ -172,18 +118,81 @@ class HeyGenStreamingClient:
         Returns:
         - JSON response containing the status ("success" if stopped successfully).
         """
-        url = f"{self.base_url}/v1/streaming.stop"
         payload = {
             "session_id": session_id
         }
+        # Stopping a session twice is harmless, so it is safe to retry
+        return self._send('stop_session', 'POST', '/v1/streaming.stop', json=payload, idempotent=True)
+
+    def _send(self, operation, method, path, idempotent=None, unwrap_data=False, **kwargs):
+        """Send one API call, returning the decoded JSON or None on failure"""
+        try:
+            self.breaker.allow()
+        except CircuitOpenError as e:
+            return self._handle_error(path, operation, e, None)
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = self.transport.request(method, f"{self.base_url}{path}", headers=self.headers,
+                                              idempotent=idempotent, **kwargs)
+            failed = _is_upstream_failure(response)
+            return self._handle_response(operation, response, unwrap_data)
+        except requests.exceptions.RequestException as e:
+            return self._handle_error(path, operation, e, locals().get('response'))
+        finally:
+            elapsed = time.perf_counter() - started
+            UPSTREAM_LATENCY.labels('heygen', _endpoint(path)).observe(elapsed)
+            self.breaker.record(elapsed, failed)
+
+    def _handle_response(self, operation, response, unwrap_data):
+        log.info("upstream call", upstream="heygen", operation=operation, status=response.status_code)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("upstream response", upstream="heygen", operation=operation, body=response.text)
+        response.raise_for_status()
+        json_data = response.json()
+        if unwrap_data:
+            return json_data.get("data", {})
+        return json_data
+
+    def _handle_error(self, path, operation, error, response):
+        UPSTREAM_ERRORS.labels('heygen', _endpoint(path), error_type(error)).inc()
+        if isinstance(error, CircuitOpenError):
+            # The breaker already logged when it opened
+            return None
+        log.warning("upstream error", upstream="heygen", operation=operation, error=str(error),
+                    body=response.text if response is not None else None)
+        return None
 
+
+class AsyncHeyGenStreamingClient(HeyGenStreamingClient):
+    """
+    asyncio variant of HeyGenStreamingClient.
+
+    Same methods and return shapes, but every method is a coroutine and the
+    calls go through a non-blocking AsyncHTTPTransport.
+    """
+
+    def __init__(self, api_key, transport=None, base_url=None, breaker=None):
+        super().__init__(api_key, transport=transport or AsyncHTTPTransport(), base_url=base_url, breaker=breaker)
+
+    async def close(self):
+        await self.transport.close()
+
+    async def _send(self, operation, method, path, idempotent=None, unwrap_data=False, **kwargs):
+        try:
+            self.breaker.allow()
+        except CircuitOpenError as e:
+            return self._handle_error(path, operation, e, None)
+        started = time.perf_counter()
+        failed = True
         try:
-            response = requests.post(url, headers=self.headers, json=payload)
-            print(f"HeyGen stop session response status: {response.status_code}")
-            print(f"HeyGen stop session response: {response.text}")
-            response.raise_for_status()
-            return response.json()
+            response = await self.transport.request(method, f"{self.base_url}{path}", headers=self.headers,
+                                                    idempotent=idempotent, **kwargs)
+            failed = _is_upstream_failure(response)
+            return self._handle_response(operation, response, unwrap_data)
         except requests.exceptions.RequestException as e:
-            print(f"Error stopping session: {e}")
-            print(f"Response content: {response.text if 'response' in locals() else 'No response'}")
-            return None
\ No newline at end of file
+            return self._handle_error(path, operation, e, locals().get('response'))
+        finally:
+            elapsed = time.perf_counter() - started
+            UPSTREAM_LATENCY.labels('heygen', _endpoint(path)).observe(elapsed)
+            self.breaker.record(elapsed, failed)
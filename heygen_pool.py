@@ -0,0 +1,204 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+
+def open_heygen_session(heygen_client, avatar_id, voice_id, token_manager=None):
+    """
+    Create a ready-to-use HeyGen streaming session.
+
+    Gets a token (cached by `token_manager` when given, else from
+    create_token), then runs start_streaming_session and start_webrtc and
+    returns the session info dict that is stored in heygen_sessions.
+    Raises an Exception if the token or the session could not be created;
+    a failed WebRTC start only leaves the session marked as not ready.
+    """
+    if token_manager is not None:
+        token = token_manager.get()
+    else:
+        token_data = heygen_client.create_token()
+        token = token_data.get('token') if token_data else None
+    if not token:
+        raise Exception("Failed to generate HeyGen token")
+
+    session_data = heygen_client.start_streaming_session(avatar_id, voice_id)
+    if not session_data or 'data' not in session_data or 'session_id' not in session_data['data']:
+        raise Exception("Failed to start HeyGen streaming session")
+
+    session_id = session_data['data']['session_id']
+    session_info = {
+        'session_id': session_id,
+        'token': session_data['data'].get('access_token', ''),
+        'url': session_data['data'].get('url', ''),
+        'avatar_id': avatar_id,
+        'voice_id': voice_id,
+        'started_at': datetime.now().isoformat(),
+        'opened_at': time.time(),
+        'webrtc_started': False,
+        'session_ready': False,
+        'realtime_endpoint': session_data['data'].get('realtime_endpoint', '')
+    }
+
+    try:
+        start_response = heygen_client.start_webrtc(session_id)
+        if start_response and start_response.get('code') == 100:
+            session_info['webrtc_started'] = True
+            session_info['session_ready'] = True
+            log.info("webrtc started", session_id=session_id)
+        else:
+            log.warning("webrtc start failed", session_id=session_id, response=start_response)
+    except Exception:
+        # Don't fail the whole session, it can be started again on first message
+        log.exception("error starting webrtc", session_id=session_id)
+
+    return session_info
+
+
+class HeyGenSessionPool:
+    """
+    Background-maintained pool of pre-warmed HeyGen streaming sessions.
+
+    A maintainer thread keeps `target_size` ready sessions for one
+    avatar/voice pair. Sessions older than `max_age` seconds are stopped and
+    replaced so that none is handed out close to HeyGen's
+    activity_idle_timeout (120s). acquire() is O(1).
+    """
+
+    def __init__(self, heygen_client, avatar_id, voice_id, target_size=2, max_age=90, refill_interval=5,
+                 token_manager=None):
+        self.heygen_client = heygen_client
+        self.token_manager = token_manager
+        self.avatar_id = avatar_id
+        self.voice_id = voice_id
+        self.target_size = target_size
+        self.max_age = max_age
+        self.refill_interval = refill_interval
+
+        self.hits = 0
+        self.misses = 0
+        self.mismatches = 0
+        self.recycled = 0
+        self.failures = 0
+
+        self._sessions = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the maintainer thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='heygen-session-pool', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the maintainer thread and every session still in the pool"""
+        self._stopped.set()
+        self._wakeup.set()
+        with self._lock:
+            sessions = list(self._sessions)
+            self._sessions.clear()
+        for session_info in sessions:
+            self._stop_session(session_info)
+
+    def acquire(self, avatar_id=None, voice_id=None):
+        """
+        Take a ready session out of the pool.
+
+        Returns the session info dict, or None when the pool is empty or was
+        warmed for a different avatar/voice (the caller then creates one inline).
+        """
+        if (avatar_id or self.avatar_id) != self.avatar_id or (voice_id or self.voice_id) != self.voice_id:
+            # Still a cold start for the caller, so it counts as a miss
+            with self._lock:
+                self.misses += 1
+                self.mismatches += 1
+            return None
+
+        expired = []
+        session_info = None
+        now = time.time()
+        with self._lock:
+            while self._sessions:
+                candidate = self._sessions.popleft()
+                if now - candidate['opened_at'] < self.max_age:
+                    session_info = candidate
+                    break
+                expired.append(candidate)
+            if session_info is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        # Let the maintainer refill (and stop the expired ones) off the request path
+        if expired:
+            with self._lock:
+                self._sessions.extendleft(reversed(expired))
+        self._wakeup.set()
+        return session_info
+
+    def stats(self):
+        """Return pool counters"""
+        with self._lock:
+            size = len(self._sessions)
+        return {
+            'size': size,
+            'target_size': self.target_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'mismatches': self.mismatches,
+            'recycled': self.recycled,
+            'failures': self.failures
+        }
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._recycle_expired()
+            self._refill()
+            self._wakeup.wait(self.refill_interval)
+            self._wakeup.clear()
+
+    def _recycle_expired(self):
+        now = time.time()
+        expired = []
+        with self._lock:
+            # Sessions are appended in creation order, so the oldest are on the left
+            while self._sessions and now - self._sessions[0]['opened_at'] >= self.max_age:
+                expired.append(self._sessions.popleft())
+            self.recycled += len(expired)
+        for session_info in expired:
+            self._stop_session(session_info)
+
+    def _refill(self):
+        while not self._stopped.is_set():
+            with self._lock:
+                if len(self._sessions) >= self.target_size:
+                    return
+            try:
+                session_info = open_heygen_session(self.heygen_client, self.avatar_id, self.voice_id,
+                                                   token_manager=self.token_manager)
+            except Exception as e:
+                self.failures += 1
+                log.warning("error warming heygen session", error=str(e))
+                return
+            if not session_info.get('session_ready'):
+                self.failures += 1
+                self._stop_session(session_info)
+                return
+            if self._stopped.is_set():
+                self._stop_session(session_info)
+                return
+            with self._lock:
+                self._sessions.append(session_info)
+
+    def _stop_session(self, session_info):
+        try:
+            self.heygen_client.stop_session(session_info['session_id'])
+        except Exception:
+            log.exception("error stopping pooled heygen session", session_id=session_info['session_id'])
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:  # Only needed by the async clients
+    aiohttp = None
+
+# Methods that are safe to send twice
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+# Upstream statuses worth retrying an idempotent call on
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+
+
+class _RetryPolicy:
+    """Timeout and retry settings shared by the sync and async transports"""
+
+    def __init__(self, connect_timeout, read_timeout, max_retries, backoff_factor, backoff_max):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+
+    def _attempts(self, method, idempotent):
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        return 1 + (self.max_retries if idempotent else 0)
+
+    def _timeouts(self, timeout):
+        if timeout is None:
+            return (self.connect_timeout, self.read_timeout)
+        if not isinstance(timeout, tuple):
+            return (self.connect_timeout, timeout)
+        return timeout
+
+    def _backoff(self, attempt):
+        # Full jitter so retries from many workers don't line up
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * (2 ** attempt)))
+
+
+class HTTPTransport(_RetryPolicy):
+    """
+    Shared keep-alive HTTP transport for the WotNot and HeyGen clients.
+
+    Keeps one requests.Session with a connection pool per host, applies
+    explicit connect/read timeouts to every call and retries idempotent calls
+    with bounded exponential backoff. Non-idempotent calls are sent once.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=20, connect_timeout=3.05, read_timeout=30,
+                 max_retries=2, backoff_factor=0.2, backoff_max=2.0):
+        super().__init__(connect_timeout, read_timeout, max_retries, backoff_factor, backoff_max)
+
+        self.session = requests.Session()
+        # Retries are handled in request() so only idempotent calls are repeated
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, idempotent=None, timeout=None, **kwargs):
+        """
+        Send a request and return the requests.Response.
+
+        Parameters:
+        - idempotent: whether the call may be retried; defaults to True for
+          GET, HEAD, OPTIONS, PUT and DELETE.
+        - timeout: read timeout in seconds, or a (connect, read) tuple.
+
+        Raises requests.exceptions.RequestException like requests does.
+        """
+        method = method.upper()
+        attempts = self._attempts(method, idempotent)
+        timeout = self._timeouts(timeout)
+
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if last_attempt:
+                    raise
+            else:
+                if last_attempt or response.status_code not in RETRY_STATUSES:
+                    return response
+                response.close()
+            time.sleep(self._backoff(attempt))
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncResponse:
+    """Fully read aiohttp response with the parts of the requests.Response API the clients use"""
+
+    def __init__(self, status_code, text, url, reason=''):
+        self.status_code = status_code
+        self.text = text
+        self.url = url
+        self.reason = reason
+
+    def json(self):
+        try:
+            return json.loads(self.text)
+        except json.JSONDecodeError as e:
+            # Same exception requests raises, so the clients catch bad bodies the same way on both transports
+            raise requests.exceptions.JSONDecodeError(e.msg, e.doc, e.pos)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            kind = 'Client' if self.status_code < 500 else 'Server'
+            raise requests.exceptions.HTTPError(
+                f"{self.status_code} {kind} Error: {self.reason} for url: {self.url}", response=self)
+
+
+class AsyncHTTPTransport(_RetryPolicy):
+    """
+    Non-blocking counterpart of HTTPTransport built on aiohttp.
+
+    Same pooling, timeout and retry behaviour. Errors are raised as
+    requests.exceptions so the clients handle both transports the same way.
+    The aiohttp session is created on first use and is bound to that event loop.
+    """
+
+    def __init__(self, pool_size=100, pool_maxsize=20, connect_timeout=3.05, read_timeout=30,
+                 max_retries=2, backoff_factor=0.2, backoff_max=2.0):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is required for the async clients")
+        super().__init__(connect_timeout, read_timeout, max_retries, backoff_factor, backoff_max)
+        self.pool_size = pool_size
+        self.pool_maxsize = pool_maxsize
+        self.session = None
+
+    async def request(self, method, url, idempotent=None, timeout=None, **kwargs):
+        """Send a request and return an AsyncResponse, see HTTPTransport.request()"""
+        method = method.upper()
+        attempts = self._attempts(method, idempotent)
+        connect_timeout, read_timeout = self._timeouts(timeout)
+        client_timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        session = self._get_session()
+
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            try:
+                async with session.request(method, url, timeout=client_timeout, **kwargs) as response:
+                    text = await response.text()
+                    result = AsyncResponse(response.status, text, str(response.url), response.reason or '')
+            except asyncio.TimeoutError as e:
+                if last_attempt:
+                    raise requests.exceptions.Timeout(str(e) or f"Request to {url} timed out")
+            except aiohttp.ClientError as e:
+                if last_attempt:
+                    raise requests.exceptions.ConnectionError(str(e))
+            else:
+                if last_attempt or result.status_code not in RETRY_STATUSES:
+                    return result
+            await asyncio.sleep(self._backoff(attempt))
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _get_session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_maxsize)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+
+_default_transport = None
+
+
+def default_transport():
+    """Return the process-wide transport used by clients created without one"""
+    global _default_transport
+    if _default_transport is None:
+        _default_transport = HTTPTransport()
+    return _default_transport
@@ -0,0 +1,99 @@
+import time
+from datetime import datetime
+
+
+class ChatMessage:
+    """
+    One stored chat message.
+
+    Keeps the epoch timestamp and button (title, type) tuples; the dict shape
+    sent to the browser is only built by to_dict(). `seq` is assigned by the
+    MessageLog the message is appended to.
+    """
+
+    __slots__ = ('type', 'text', 'timestamp', 'source', 'buttons', 'seq')
+
+    def __init__(self, type, text, timestamp=None, source=None, buttons=None):
+        self.type = type
+        self.text = text
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.source = source
+        self.buttons = tuple(buttons) if buttons else None
+        self.seq = None
+
+    def to_dict(self):
+        data = {
+            'seq': self.seq,
+            'type': self.type,
+            'message': self.text,
+            'timestamp': datetime.fromtimestamp(self.timestamp).isoformat()
+        }
+        if self.source:
+            data['source'] = self.source
+        if self.buttons is not None:
+            data['buttons'] = [{'title': title, 'type': button_type} for title, button_type in self.buttons]
+        return data
+
+    def __repr__(self):
+        return f"ChatMessage({self.type!r}, {self.text!r})"
+
+
+class MessageLog:
+    """
+    Array-backed ring buffer holding the last `capacity` messages of a conversation.
+
+    Appending is O(1); once full, the oldest message is overwritten, and a
+    capacity of 0 keeps nothing. Every appended message gets the next
+    sequence number, starting at 1, so the messages held always have
+    consecutive numbers and the position of any of them is computed rather
+    than searched for.
+    """
+
+    __slots__ = ('capacity', '_items', '_start', '_count', 'last_seq')
+
+    def __init__(self, capacity=200):
+        self.capacity = capacity
+        self._items = []
+        self._start = 0
+        self._count = 0
+        self.last_seq = 0
+
+    def append(self, message):
+        """Store a message, numbering it in message.seq"""
+        self.last_seq += 1
+        message.seq = self.last_seq
+        if self._count < self.capacity:
+            self._items.append(message)
+            self._count += 1
+        elif self.capacity > 0:
+            self._items[self._start] = message
+            self._start = (self._start + 1) % self.capacity
+
+    @property
+    def first_seq(self):
+        """Sequence number of the oldest message held, last_seq + 1 when empty"""
+        return self.last_seq - self._count + 1
+
+    def since(self, seq):
+        """
+        Return the messages numbered after `seq`, oldest first, and whether
+        some of them were already overwritten. O(1) to locate, O(k) for k
+        messages returned.
+        """
+        first_seq = self.first_seq
+        offset = max(0, seq - first_seq + 1)
+        items = self._items
+        messages = [items[(self._start + index) % self.capacity] for index in range(offset, self._count)]
+        return messages, seq < first_seq - 1
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        items = self._items
+        for index in range(self._count):
+            yield items[(self._start + index) % self.capacity]
+
+    def to_list(self):
+        """Serialize the messages, oldest first"""
+        return [message.to_dict() for message in self]
@@ -0,0 +1,221 @@
+import threading
+from bisect import bisect_left
+
+# Latency buckets in seconds, from fast cache hits up to slow upstream calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=(), fn=None, registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def labels(self, *values):
+        """Return the child for these label values; keep it around on hot paths"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        if self.fn is not None:
+            lines.append(f"{self.name} {float(self.fn())}")
+            return lines
+        for values, child in list(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _Value:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {self.value}"]
+
+
+class Counter(_Metric):
+    """Monotonic counter, optionally read from a callback at scrape time"""
+
+    type = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, optionally read from a callback at scrape time"""
+
+    type = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+
+class _HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def render(self, name, labelnames, values):
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.bounds, counts):
+            cumulative += bucket_count
+            le = 'le="%s"' % bound
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {count}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {total}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {count}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Latency histogram with fixed buckets"""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry=registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class StatsGauge(_Metric):
+    """
+    Gauge family read from a component's stats() dict at scrape time.
+
+    Rendered as one sample per key, e.g. name{stat="hits"} 12.
+    """
+
+    type = 'gauge'
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for key, value in self.fn().items():
+            if isinstance(value, (int, float)):
+                lines.append(f'{self.name}{{stat="{_escape(key)}"}} {float(value)}')
+        return lines
+
+
+class Registry:
+    """Set of metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics):
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                # A failing callback must not take down the whole scrape
+                continue
+        return '\n'.join(lines) + '\n'
+
+
+def error_type(error):
+    """Short label for an upstream failure: http_<status> or the exception class name"""
+    response = getattr(error, 'response', None)
+    if response is not None:
+        return f"http_{response.status_code}"
+    return type(error).__name__
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REGISTRY = Registry()
+
+# Upstream calls, labelled by upstream and endpoint, e.g. ("heygen", "streaming.task")
+UPSTREAM_LATENCY = Histogram(
+    'aivatar_upstream_request_seconds', 'Latency of WotNot and HeyGen API calls', ('upstream', 'endpoint'))
+UPSTREAM_ERRORS = Counter(
+    'aivatar_upstream_errors_total', 'Failed WotNot and HeyGen API calls by error type',
+    ('upstream', 'endpoint', 'error'))
+
+START_CHAT_LATENCY = Histogram(
+    'aivatar_start_chat_seconds', 'Total time spent in /api/start-chat', ('outcome',))
+WEBHOOK_TO_EMIT_LATENCY = Histogram(
+    'aivatar_webhook_to_emit_seconds', 'Time from receiving a WotNot webhook to emitting the message over Socket.IO')
+SPEECH_FIRST_TASK_LATENCY = Histogram(
+    'aivatar_speech_first_task_seconds', 'Time from dispatching an utterance to HeyGen accepting its first task')
+HEYGEN_QUEUE_WAIT = Histogram(
+    'aivatar_heygen_queue_wait_seconds', 'Time visitors waited for a HeyGen session slot, by how the wait ended',
+    ('outcome',), buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800))
+ERRORS = Counter('aivatar_errors_total', 'Handled errors by type', ('type',))
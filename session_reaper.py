@@ -0,0 +1,145 @@
+import threading
+import time
+
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+
+class SessionReaper:
+    """
+    Background reaper for chats whose browser went away without stopping them.
+
+    Every `interval` seconds it scans the last-activity map. Visitors idle for
+    longer than `heygen_ttl` get their HeyGen session stopped; visitors idle
+    for longer than `conversation_ttl` are evicted completely. The actual
+    teardown is done by the `evict(visitor_ids, heygen_only)` callback, which
+    returns the number of HeyGen sessions and conversations it removed.
+
+    Visitors can also be given a stop deadline (epoch seconds) in the
+    `deadlines` map with stop_at(); they are evicted once it passes unless
+    cancel_stop() is called first. Deadlines are checked every
+    `deadline_interval` seconds.
+    """
+
+    def __init__(self, activity, evict, conversation_ttl=1800, heygen_ttl=300, interval=30, gauges=None,
+                 deadlines=None, deadline_interval=5):
+        self.activity = activity
+        self.evict = evict
+        self.conversation_ttl = conversation_ttl
+        self.heygen_ttl = heygen_ttl
+        self.interval = interval
+        self.gauges = gauges
+        self.deadlines = deadlines if deadlines is not None else {}
+        self.deadline_interval = deadline_interval
+
+        self.sweeps = 0
+        self.evicted_conversations = 0
+        self.evicted_heygen_sessions = 0
+        self.deadline_stops = 0
+        self.last_sweep_seconds = 0.0
+
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the reaper thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='session-reaper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def touch(self, visitor_id):
+        """Record activity for a visitor"""
+        self.activity[visitor_id] = time.time()
+
+    def stop_at(self, visitor_id, deadline):
+        """Evict a visitor at `deadline` unless cancel_stop() is called before"""
+        self.deadlines[visitor_id] = deadline
+
+    def cancel_stop(self, visitor_id):
+        """Drop a visitor's stop deadline, returning True if there was one"""
+        try:
+            del self.deadlines[visitor_id]
+        except KeyError:
+            return False
+        return True
+
+    def sweep_deadlines(self):
+        """Evict the visitors whose stop deadline passed, returning the eviction counts"""
+        now = time.time()
+        due = []
+        for visitor_id in list(self.deadlines):
+            deadline = self.deadlines.get(visitor_id)
+            # Only the worker that removes the deadline evicts, so a visitor is stopped once
+            if deadline is not None and deadline <= now and self.cancel_stop(visitor_id):
+                due.append(visitor_id)
+        if not due:
+            return {'heygen_sessions': 0, 'conversations': 0}
+
+        counts = self.evict(due, heygen_only=False)
+        self.deadline_stops += len(due)
+        self.evicted_heygen_sessions += counts['heygen_sessions']
+        self.evicted_conversations += counts['conversations']
+        log.info("stopped chats after grace period", visitors=len(due), conversations=counts['conversations'],
+                 heygen_sessions=counts['heygen_sessions'])
+        return counts
+
+    def sweep(self):
+        """Evict everything that is past its TTL, returning the eviction counts"""
+        started = time.time()
+        expired = []
+        idle_heygen = []
+        for visitor_id in list(self.activity):
+            last_activity = self.activity.get(visitor_id)
+            if last_activity is None:
+                continue
+            idle = started - last_activity
+            if idle > self.conversation_ttl:
+                expired.append(visitor_id)
+            elif idle > self.heygen_ttl:
+                idle_heygen.append(visitor_id)
+
+        heygen_stopped = 0
+        conversations = 0
+        if idle_heygen:
+            heygen_stopped += self.evict(idle_heygen, heygen_only=True)['heygen_sessions']
+        if expired:
+            counts = self.evict(expired, heygen_only=False)
+            heygen_stopped += counts['heygen_sessions']
+            conversations += counts['conversations']
+
+        self.sweeps += 1
+        self.evicted_heygen_sessions += heygen_stopped
+        self.evicted_conversations += conversations
+        self.last_sweep_seconds = time.time() - started
+        if heygen_stopped or conversations:
+            log.info("reaped idle sessions", conversations=conversations, heygen_sessions=heygen_stopped)
+        return {'heygen_sessions': heygen_stopped, 'conversations': conversations}
+
+    def stats(self):
+        """Return eviction counters and live-session gauges"""
+        stats = {
+            'sweeps': self.sweeps,
+            'evicted_conversations': self.evicted_conversations,
+            'evicted_heygen_sessions': self.evicted_heygen_sessions,
+            'deadline_stops': self.deadline_stops,
+            'pending_stops': len(self.deadlines),
+            'last_sweep_seconds': self.last_sweep_seconds
+        }
+        if self.gauges:
+            stats.update(self.gauges())
+        return stats
+
+    def _run(self):
+        next_sweep = time.monotonic() + self.interval
+        while not self._stopped.wait(min(self.interval, self.deadline_interval)):
+            try:
+                self.sweep_deadlines()
+                if time.monotonic() >= next_sweep:
+                    next_sweep = time.monotonic() + self.interval
+                    self.sweep()
+            except Exception:
+                log.exception("error in session reaper")
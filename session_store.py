@@ -0,0 +1,427 @@
+import itertools
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from urllib.parse import urlparse
+
+try:
+    import redis
+except ImportError:  # Only needed for redis:// session stores
+    redis = None
+
+
+class SessionStore:
+    """
+    Key/value store for chat state, split into namespaces.
+
+    Backends implement get/put/delete/exists/keys/count, add() and modify(). Values
+    handed out by shared backends are copies, so changes to a stored value
+    must be written back with put() or made through modify(), which is atomic
+    per key.
+
+    Expiring keys (add_if_absent/remove_expiring) live apart from the
+    namespaced values and are meant for seen-sets such as webhook dedup.
+    """
+
+    def get(self, namespace, key, default=None):
+        raise NotImplementedError
+
+    def put(self, namespace, key, value):
+        raise NotImplementedError
+
+    def delete(self, namespace, key):
+        """Remove a key, returning True if it existed"""
+        raise NotImplementedError
+
+    def exists(self, namespace, key):
+        """Return True if the key is stored, without loading its value"""
+        raise NotImplementedError
+
+    def keys(self, namespace):
+        raise NotImplementedError
+
+    def count(self, namespace):
+        raise NotImplementedError
+
+    def add(self, namespace, key, value):
+        """Store a value unless the key exists, returning True if it was stored"""
+        raise NotImplementedError
+
+    def modify(self, namespace, key, fn):
+        """
+        Atomically apply fn to a stored value and save the result.
+
+        fn receives the current value and may change it in place or return a
+        replacement. Returns the saved value, or None if the key is missing.
+        """
+        raise NotImplementedError
+
+    def add_if_absent(self, namespace, key, ttl):
+        """
+        Atomically mark a key as present for `ttl` seconds.
+
+        Returns True if the key was added and False if it was already there
+        and not yet expired.
+        """
+        raise NotImplementedError
+
+    def remove_expiring(self, namespace, key):
+        """Forget a key added with add_if_absent()"""
+        raise NotImplementedError
+
+    def namespace(self, name):
+        """Return a dict-like view of one namespace"""
+        return StoreMap(self, name)
+
+
+class StoreMap(MutableMapping):
+    """Dict-like view of one SessionStore namespace"""
+
+    def __init__(self, store, namespace):
+        self.store = store
+        self.namespace = namespace
+
+    def __getitem__(self, key):
+        value = self.store.get(self.namespace, key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.store.put(self.namespace, key, value)
+
+    def __delitem__(self, key):
+        if not self.store.delete(self.namespace, key):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self.store.exists(self.namespace, key)
+
+    def __iter__(self):
+        return iter(self.store.keys(self.namespace))
+
+    def __len__(self):
+        return self.store.count(self.namespace)
+
+    def get(self, key, default=None):
+        return self.store.get(self.namespace, key, default)
+
+    def discard(self, key):
+        """Remove a key if present, returning True if it existed"""
+        return self.store.delete(self.namespace, key)
+
+    def modify(self, key, fn):
+        """See SessionStore.modify()"""
+        return self.store.modify(self.namespace, key, fn)
+
+    def __repr__(self):
+        return f"<StoreMap {self.namespace!r} ({len(self)} keys)>"
+
+
+_MISSING = object()
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Process-local store backed by plain dicts, values are not copied.
+
+    Expiring keys are kept in insertion order, so expired ones are dropped
+    from the front; at most `max_expiring_keys` are kept per namespace.
+    """
+
+    def __init__(self, max_expiring_keys=100000):
+        self.max_expiring_keys = max_expiring_keys
+        self._namespaces = {}
+        self._expiring = {}
+        self._lock = threading.RLock()
+
+    def _data(self, namespace):
+        data = self._namespaces.get(namespace)
+        if data is None:
+            data = self._namespaces.setdefault(namespace, {})
+        return data
+
+    def get(self, namespace, key, default=None):
+        return self._data(namespace).get(key, default)
+
+    def put(self, namespace, key, value):
+        self._data(namespace)[key] = value
+
+    def delete(self, namespace, key):
+        return self._data(namespace).pop(key, _MISSING) is not _MISSING
+
+    def exists(self, namespace, key):
+        return key in self._data(namespace)
+
+    def keys(self, namespace):
+        return list(self._data(namespace))
+
+    def count(self, namespace):
+        return len(self._data(namespace))
+
+    def add(self, namespace, key, value):
+        with self._lock:
+            return self._data(namespace).setdefault(key, value) is value
+
+    def modify(self, namespace, key, fn):
+        with self._lock:
+            data = self._data(namespace)
+            value = data.get(key, _MISSING)
+            if value is _MISSING:
+                return None
+            result = fn(value)
+            if result is not None:
+                data[key] = value = result
+            return value
+
+    def add_if_absent(self, namespace, key, ttl):
+        now = time.monotonic()
+        with self._lock:
+            seen = self._expiring.get(namespace)
+            if seen is None:
+                seen = self._expiring[namespace] = OrderedDict()
+            while seen and next(iter(seen.values())) <= now:
+                seen.popitem(last=False)
+            expires = seen.get(key)
+            if expires is not None and expires > now:
+                return False
+            seen[key] = now + ttl
+            seen.move_to_end(key)
+            # Only a new key makes room, a lookup never drops the key it checks
+            while len(seen) > self.max_expiring_keys:
+                seen.popitem(last=False)
+            return True
+
+    def remove_expiring(self, namespace, key):
+        with self._lock:
+            self._expiring.get(namespace, {}).pop(key, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Store shared by the processes of one host through a SQLite file.
+
+    Mainly a stand-in for Redis in tests and single-host deployments.
+    Values are pickled; every thread gets its own connection. Expired keys
+    are purged every `purge_every` add_if_absent() calls.
+    """
+
+    def __init__(self, path, purge_every=1000):
+        self.path = path
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._calls = itertools.count(1)
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS session_store ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS expiring_keys ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, expires_at REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, namespace, key, default=None):
+        row = self._connection().execute(
+            "SELECT value FROM session_store WHERE namespace = ? AND key = ?", (namespace, str(key))
+        ).fetchone()
+        return pickle.loads(row[0]) if row else default
+
+    def put(self, namespace, key, value):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO session_store (namespace, key, value) VALUES (?, ?, ?)",
+            (namespace, str(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        )
+
+    def delete(self, namespace, key):
+        cursor = self._connection().execute(
+            "DELETE FROM session_store WHERE namespace = ? AND key = ?", (namespace, str(key))
+        )
+        return cursor.rowcount > 0
+
+    def exists(self, namespace, key):
+        return self._connection().execute(
+            "SELECT 1 FROM session_store WHERE namespace = ? AND key = ?", (namespace, str(key))
+        ).fetchone() is not None
+
+    def keys(self, namespace):
+        rows = self._connection().execute("SELECT key FROM session_store WHERE namespace = ?", (namespace,))
+        return [row[0] for row in rows]
+
+    def count(self, namespace):
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM session_store WHERE namespace = ?", (namespace,)
+        ).fetchone()[0]
+
+    def add(self, namespace, key, value):
+        cursor = self._connection().execute(
+            "INSERT OR IGNORE INTO session_store (namespace, key, value) VALUES (?, ?, ?)",
+            (namespace, str(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        )
+        return cursor.rowcount > 0
+
+    def modify(self, namespace, key, fn):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            value = self.get(namespace, key, _MISSING)
+            if value is _MISSING:
+                connection.execute("COMMIT")
+                return None
+            result = fn(value)
+            if result is not None:
+                value = result
+            self.put(namespace, key, value)
+            connection.execute("COMMIT")
+            return value
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def add_if_absent(self, namespace, key, ttl):
+        now = time.time()
+        connection = self._connection()
+        # Inserts a new key or takes over an expired one; a live key is left alone and changes no rows
+        cursor = connection.execute(
+            "INSERT INTO expiring_keys (namespace, key, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET expires_at = excluded.expires_at "
+            "WHERE expiring_keys.expires_at <= ?",
+            (namespace, str(key), now + ttl, now)
+        )
+        if next(self._calls) % self.purge_every == 0:
+            connection.execute("DELETE FROM expiring_keys WHERE expires_at <= ?", (now,))
+        return cursor.rowcount > 0
+
+    def remove_expiring(self, namespace, key):
+        self._connection().execute(
+            "DELETE FROM expiring_keys WHERE namespace = ? AND key = ?", (namespace, str(key))
+        )
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Store shared by every worker and node through Redis.
+
+    Every value is its own Redis key holding the pickled value, and a set
+    per namespace indexes the keys. modify() WATCHes only the key it
+    changes, so updates to different visitors never conflict; a conflicting
+    one is retried with a short backoff, at most `max_retries` times.
+    Expiring keys are plain Redis keys set with NX and EX.
+    """
+
+    def __init__(self, url=None, prefix='aivatar', max_retries=20, client=None):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("The redis package is required for redis:// session stores")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.max_retries = max_retries
+
+    def _value_key(self, namespace, key):
+        return f"{self.prefix}:v:{namespace}:{key}"
+
+    def _index(self, namespace):
+        return f"{self.prefix}:k:{namespace}"
+
+    def get(self, namespace, key, default=None):
+        raw = self.client.get(self._value_key(namespace, key))
+        return pickle.loads(raw) if raw is not None else default
+
+    def put(self, namespace, key, value):
+        with self.client.pipeline() as pipe:
+            pipe.set(self._value_key(namespace, key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+            pipe.sadd(self._index(namespace), str(key))
+            pipe.execute()
+
+    def delete(self, namespace, key):
+        with self.client.pipeline() as pipe:
+            pipe.delete(self._value_key(namespace, key))
+            pipe.srem(self._index(namespace), str(key))
+            deleted, _ = pipe.execute()
+        return deleted > 0
+
+    def exists(self, namespace, key):
+        return self.client.exists(self._value_key(namespace, key)) > 0
+
+    def keys(self, namespace):
+        return [key.decode('utf-8') for key in self.client.smembers(self._index(namespace))]
+
+    def count(self, namespace):
+        return self.client.scard(self._index(namespace))
+
+    def add(self, namespace, key, value):
+        with self.client.pipeline() as pipe:
+            pipe.set(self._value_key(namespace, key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), nx=True)
+            pipe.sadd(self._index(namespace), str(key))
+            added, _ = pipe.execute()
+        return bool(added)
+
+    def modify(self, namespace, key, fn):
+        name = self._value_key(namespace, key)
+        with self.client.pipeline() as pipe:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    pipe.watch(name)
+                    raw = pipe.get(name)
+                    if raw is None:
+                        pipe.unwatch()
+                        return None
+                    value = pickle.loads(raw)
+                    result = fn(value)
+                    if result is not None:
+                        value = result
+                    pipe.multi()
+                    pipe.set(name, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+                    pipe.execute()
+                    return value
+                except redis.WatchError:
+                    if attempt == self.max_retries:
+                        raise
+                    # Another worker changed this key, back off a little before reading it again
+                    time.sleep(random.uniform(0, min(0.05, 0.001 * 2 ** attempt)))
+
+    def _expiring_key(self, namespace, key):
+        return f"{self.prefix}:{namespace}:{key}"
+
+    def add_if_absent(self, namespace, key, ttl):
+        return bool(self.client.set(self._expiring_key(namespace, key), 1, nx=True, ex=max(1, int(ttl))))
+
+    def remove_expiring(self, namespace, key):
+        self.client.delete(self._expiring_key(namespace, key))
+
+
+def create_session_store(url):
+    """
+    Build a session store from a URL:
+
+    - memory://                     process-local dicts (single worker only)
+    - sqlite:///sessions.db         SQLite file shared by the workers of one host
+                                    (relative path; sqlite:////abs/path for absolute)
+    - redis://host:6379/0           Redis shared by every worker and node
+    """
+    scheme = urlparse(url).scheme
+    if scheme in ('', 'memory'):
+        return InMemorySessionStore()
+    if scheme == 'sqlite':
+        path = url[len('sqlite:///'):] if url.startswith('sqlite:///') else url[len('sqlite://'):]
+        return SQLiteSessionStore(path or os.path.join(os.getcwd(), 'sessions.db'))
+    if scheme in ('redis', 'rediss', 'unix'):
+        return RedisSessionStore(url)
+    raise ValueError(f"Unsupported session store URL: {url}")
@@ -0,0 +1,365 @@
+"""
+In-process simulators of the WotNot and HeyGen APIs, for load tests.
+
+Both run a local HTTP server on a background thread, so the real clients,
+transport and connection pool are exercised:
+
+    wotnot = WotNotSimulator(webhook_url='http://127.0.0.1:5000/webhook/wotnot', webhook_token='...')
+    heygen = HeyGenSimulator(latency={'streaming.new': Latency.parse('lognormal:0.8,0.3')})
+    wotnot.start(); heygen.start()
+    # WOTNOT_BASE_URL=wotnot.url HEYGEN_BASE_URL=heygen.url
+
+Run standalone to point a local app at them:
+
+    python simulators.py --webhook-url http://127.0.0.1:5000/webhook/wotnot --webhook-token secret
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+
+class Latency:
+    """
+    Latency distribution in seconds.
+
+    Built from a spec string: "fixed:0.1", "uniform:0.05,0.2" or
+    "lognormal:<median>,<sigma>" (a long right tail, like real upstreams).
+    """
+
+    def __init__(self, kind='fixed', a=0.0, b=0.0):
+        if kind not in ('fixed', 'uniform', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        self.kind = kind
+        self.a = a
+        self.b = b
+
+    @classmethod
+    def parse(cls, spec):
+        if isinstance(spec, Latency):
+            return spec
+        if isinstance(spec, (int, float)):
+            return cls('fixed', float(spec))
+        kind, _, params = str(spec).partition(':')
+        values = [float(value) for value in params.split(',') if value] if params else []
+        return cls(kind, *values)
+
+    def sample(self):
+        if self.kind == 'fixed':
+            return self.a
+        if self.kind == 'uniform':
+            return random.uniform(self.a, self.b)
+        return self.a * math.exp(random.gauss(0, self.b)) if self.a > 0 else 0.0
+
+    def __repr__(self):
+        return f"Latency({self.kind!r}, {self.a}, {self.b})"
+
+
+class _Simulator:
+    """
+    Local HTTP server answering with canned JSON.
+
+    `latency` and `error_rate` are either one value for every endpoint or a
+    dict keyed by endpoint name with a 'default' entry. Failed calls answer
+    `error_status`.
+    """
+
+    name = 'simulator'
+
+    def __init__(self, latency=0.0, error_rate=0.0, error_status=503, host='127.0.0.1', port=0):
+        self.latency = self._per_endpoint(latency, Latency.parse)
+        self.error_rate = self._per_endpoint(error_rate, float)
+        self.error_status = error_status
+        self.host = host
+        self.port = port
+        self.calls = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @staticmethod
+    def _per_endpoint(value, convert):
+        if isinstance(value, dict):
+            converted = {endpoint: convert(entry) for endpoint, entry in value.items()}
+            converted.setdefault('default', convert(0))
+            return converted
+        return {'default': convert(value)}
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self._server.server_address[1]}"
+
+    def start(self):
+        """Start serving on a background thread"""
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                simulator._handle(self, None)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                simulator._handle(self, json.loads(body) if body else {})
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name=f'{self.name}-simulator', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def stats(self):
+        """Calls and injected errors per endpoint"""
+        with self._lock:
+            return {'calls': dict(self.calls), 'errors': dict(self.errors)}
+
+    def _handle(self, handler, payload):
+        endpoint = self._endpoint(handler.path)
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+        time.sleep(self.latency.get(endpoint, self.latency['default']).sample())
+        if random.random() < self.error_rate.get(endpoint, self.error_rate['default']):
+            status, body = self.error_status, {'error': 'simulated failure'}
+            with self._lock:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        else:
+            status, body = self._route(endpoint, handler.command, handler.path, payload or {})
+
+        data = json.dumps(body).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+        if status == 200:
+            self._after_response(endpoint, payload, body)
+
+    def _endpoint(self, path):
+        """Endpoint name used for latency, errors and stats"""
+        return path
+
+    def _route(self, endpoint, method, path, payload):
+        """Return (status, body) for a request"""
+        raise NotImplementedError
+
+    def _after_response(self, endpoint, payload, body):
+        pass
+
+
+class WotNotSimulator(_Simulator):
+    """
+    Simulator of the WotNot endpoints WotNotAPI calls.
+
+    Every visitor message is answered by `replies` bot messages, posted to
+    `webhook_url` as WotNot webhook events after a `bot_latency` delay. A
+    `redelivery_rate` fraction of them is posted twice, like WotNot retrying.
+    """
+
+    name = 'wotnot'
+    _MESSAGES_PATH = re.compile(r'^/conversation/([^/]+)/messages$')
+
+    def __init__(self, webhook_url=None, webhook_token=None, bot_latency=0.5, replies=1,
+                 greeting="Hi, how can I help you today?", webhook_workers=16, redelivery_rate=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.webhook_url = webhook_url
+        self.webhook_token = webhook_token
+        self.bot_latency = Latency.parse(bot_latency)
+        self.replies = replies
+        self.greeting = greeting
+        self.redelivery_rate = redelivery_rate
+        self.webhooks_sent = 0
+        self.webhooks_redelivered = 0
+        self.webhooks_failed = 0
+        self._ids = itertools.count(1)
+        self._session = requests.Session()
+        self._webhooks = ThreadPoolExecutor(max_workers=webhook_workers, thread_name_prefix='wotnot-webhook')
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats.update(webhooks_sent=self.webhooks_sent, webhooks_failed=self.webhooks_failed,
+                         webhooks_redelivered=self.webhooks_redelivered)
+        return stats
+
+    def stop(self):
+        super().stop()
+        self._webhooks.shutdown(wait=False)
+
+    def _endpoint(self, path):
+        return '/conversation/{id}/messages' if self._MESSAGES_PATH.match(path) else path
+
+    def _route(self, endpoint, method, path, payload):
+        if method == 'POST' and endpoint == '/conversations':
+            conversation_id = next(self._ids)
+            return 200, {
+                'conversation': {'id': conversation_id, 'key': str(conversation_id)},
+                'messages': [{'from': {'type': 'BOT'}, 'data': {'body': f'<p>{self.greeting}</p>'}, 'type': 'text'}]
+            }
+        if method == 'POST' and endpoint == '/conversation/{id}/messages':
+            conversation_id = self._MESSAGES_PATH.match(path).group(1)
+            return 200, {'id': uuid.uuid4().hex, 'conversation_id': conversation_id}
+        return 404, {'error': 'not found'}
+
+    def _after_response(self, endpoint, payload, body):
+        if endpoint == '/conversation/{id}/messages' and self.webhook_url:
+            text = payload.get('message', {}).get('data', {}).get('body', '')
+            self._webhooks.submit(self._reply, body['conversation_id'], text)
+
+    def _reply(self, conversation_key, text):
+        time.sleep(self.bot_latency.sample())
+        for index in range(self.replies):
+            event = {
+                'event': {
+                    'id': uuid.uuid4().hex,
+                    'type': 'message',
+                    'payload': {
+                        'message': {'id': uuid.uuid4().hex, 'type': 'text', 'text': f'<p>Reply {index + 1} to: {text}</p>'},
+                        'message_by': {'type': 'bot'}
+                    }
+                },
+                'conversation': {'key': conversation_key}
+            }
+            self._post_event(event)
+            if random.random() < self.redelivery_rate:
+                with self._lock:
+                    self.webhooks_redelivered += 1
+                self._post_event(event)
+
+    def _post_event(self, event):
+        try:
+            response = self._session.post(self.webhook_url, json={'token': self.webhook_token, 'events': [event]},
+                                          timeout=10)
+            response.raise_for_status()
+            with self._lock:
+                self.webhooks_sent += 1
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self.webhooks_failed += 1
+
+
+class HeyGenSimulator(_Simulator):
+    """
+    Simulator of HeyGen's /v1/streaming.* endpoints.
+
+    Tracks open sessions, so tasks for stopped or unknown sessions fail the
+    way the real API does. Tasks report a duration of `words_per_second`.
+    With `synthesis_chars_per_second` set, a task is only accepted after its
+    text has been "synthesized", so longer texts take longer to start.
+    """
+
+    name = 'heygen'
+
+    def __init__(self, words_per_second=2.5, synthesis_chars_per_second=None, **kwargs):
+        super().__init__(**kwargs)
+        self.words_per_second = words_per_second
+        self.synthesis_chars_per_second = synthesis_chars_per_second
+        self.sessions = set()
+        self.max_sessions = 0
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats.update(open_sessions=len(self.sessions), max_sessions=self.max_sessions)
+        return stats
+
+    def _endpoint(self, path):
+        return path.rsplit('/', 1)[-1]
+
+    def _route(self, endpoint, method, path, payload):
+        if endpoint == 'streaming.create_token':
+            return 200, {'data': {'token': uuid.uuid4().hex}}
+        if endpoint == 'avatar.list':
+            return 200, {'code': 100, 'data': [
+                {'avatar_id': 'Pedro_CasualLook_public', 'pose_name': 'Pedro Casual', 'status': 'ACTIVE',
+                 'default_voice': '8f389c2237194f80b50fe7632dcc17b8'},
+                {'avatar_id': 'Anna_public_3_20240108', 'pose_name': 'Anna in Brown T-shirt', 'status': 'ACTIVE'},
+            ]}
+        if endpoint == 'voices':
+            return 200, {'error': None, 'data': {'voices': [
+                {'voice_id': '8f389c2237194f80b50fe7632dcc17b8', 'name': 'Pedro', 'language': 'English', 'gender': 'male'},
+                {'voice_id': '1bd001e7e50f421d891986aad5158bc8', 'name': 'Sara', 'language': 'English', 'gender': 'female'},
+            ]}}
+        if endpoint == 'streaming.new':
+            session_id = uuid.uuid4().hex
+            with self._lock:
+                self.sessions.add(session_id)
+                self.max_sessions = max(self.max_sessions, len(self.sessions))
+            return 200, {'code': 100, 'data': {
+                'session_id': session_id,
+                'access_token': uuid.uuid4().hex,
+                'url': 'wss://simulated.heygen.invalid',
+                'realtime_endpoint': 'wss://simulated.heygen.invalid/realtime'
+            }}
+
+        session_id = payload.get('session_id')
+        with self._lock:
+            known = session_id in self.sessions
+            if endpoint == 'streaming.stop':
+                self.sessions.discard(session_id)
+        if endpoint not in ('streaming.start', 'streaming.task', 'streaming.stop'):
+            return 404, {'error': 'not found'}
+        if not known:
+            return 400, {'code': 400, 'message': 'Session not found'}
+        if endpoint == 'streaming.task':
+            text = payload.get('text', '')
+            if self.synthesis_chars_per_second:
+                time.sleep(len(text) / self.synthesis_chars_per_second)
+            words = len(text.split())
+            return 200, {'code': 100, 'data': {
+                'task_id': uuid.uuid4().hex,
+                'duration_ms': int(words / self.words_per_second * 1000)
+            }}
+        return 200, {'code': 100, 'message': 'success'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the WotNot and HeyGen simulators")
+    parser.add_argument('--wotnot-port', type=int, default=8001)
+    parser.add_argument('--heygen-port', type=int, default=8002)
+    parser.add_argument('--webhook-url', default='http://127.0.0.1:5000/webhook/wotnot')
+    parser.add_argument('--webhook-token', default=None)
+    parser.add_argument('--bot-latency', default='lognormal:0.5,0.4')
+    parser.add_argument('--wotnot-latency', default='lognormal:0.15,0.3')
+    parser.add_argument('--heygen-latency', default='lognormal:0.3,0.4')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--redelivery-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    wotnot = WotNotSimulator(webhook_url=args.webhook_url, webhook_token=args.webhook_token,
+                             bot_latency=args.bot_latency, latency=args.wotnot_latency,
+                             redelivery_rate=args.redelivery_rate,
+                             error_rate=args.error_rate, port=args.wotnot_port).start()
+    heygen = HeyGenSimulator(latency=args.heygen_latency, error_rate=args.error_rate, port=args.heygen_port).start()
+    print(f"WOTNOT_BASE_URL={wotnot.url}")
+    print(f"HEYGEN_BASE_URL={heygen.url}")
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps({'wotnot': wotnot.stats(), 'heygen': heygen.stats()}))
+    except KeyboardInterrupt:
+        wotnot.stop()
+        heygen.stop()
+
+
+if __name__ == '__main__':
+    main()
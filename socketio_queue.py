@@ -0,0 +1,104 @@
+"""
+Message queues that let every worker emit to Socket.IO rooms of every other worker.
+
+A webhook is usually handled by a different worker than the one holding the
+visitor's socket; with a shared queue an emit is published to all workers and
+each delivers it to the clients it has in the room.
+"""
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+import socketio
+
+
+class SQLitePubSubManager(socketio.PubSubManager):
+    """
+    Socket.IO pub/sub through a SQLite file, for tests and single-host setups.
+
+    Messages are appended to a table that every worker polls every
+    `poll_interval` seconds; messages older than `retention` seconds are
+    deleted by the publishers. Use Redis across hosts.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, channel='socketio', write_only=False, logger=None, json=None,
+                 poll_interval=0.01, retention=60, prune_every=500):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.prune_every = prune_every
+        self._published = itertools.count(1)
+        self._local = threading.local()
+        connection = self._connect()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS socketio_messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, payload TEXT NOT NULL, "
+            "created_at REAL NOT NULL)"
+        )
+        connection.close()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _publish(self, data):
+        # Emits come from many request threads, each publishes through its own connection
+        publisher = getattr(self._local, 'connection', None)
+        if publisher is None:
+            publisher = self._local.connection = self._connect()
+        now = time.time()
+        publisher.execute(
+            "INSERT INTO socketio_messages (channel, payload, created_at) VALUES (?, ?, ?)",
+            (self.channel, self.json.dumps(data), now)
+        )
+        if next(self._published) % self.prune_every == 0:
+            publisher.execute("DELETE FROM socketio_messages WHERE created_at < ?", (now - self.retention,))
+
+    def _listen(self):
+        connection = self._connect()
+        # Only messages published after this worker started are delivered
+        cursor = connection.execute("SELECT COALESCE(MAX(id), 0) FROM socketio_messages").fetchone()[0]
+        while True:
+            rows = connection.execute(
+                "SELECT id, payload FROM socketio_messages WHERE id > ? AND channel = ? ORDER BY id",
+                (cursor, self.channel)
+            ).fetchall()
+            for message_id, payload in rows:
+                cursor = message_id
+                yield payload
+            if not rows:
+                time.sleep(self.poll_interval)
+
+
+def create_client_manager(url, channel='aivatar-socketio', write_only=False):
+    """
+    Build the Socket.IO client manager for a message queue URL:
+
+    - memory://                     in-process rooms only (single worker)
+    - sqlite:///socketio.db         SQLite file polled by the workers of one host
+                                    (relative path; sqlite:////abs/path for absolute)
+    - redis://host:6379/0           Redis pub/sub, across hosts (needs the redis package)
+    - amqp://host//                 RabbitMQ through kombu (needs the kombu package)
+
+    Returns None for memory://, which makes the server use its default manager.
+    """
+    scheme = urlparse(url).scheme
+    if scheme in ('', 'memory'):
+        return None
+    if scheme == 'sqlite':
+        path = url[len('sqlite:///'):] if url.startswith('sqlite:///') else url[len('sqlite://'):]
+        return SQLitePubSubManager(path or os.path.join(os.getcwd(), 'socketio.db'), channel=channel,
+                                   write_only=write_only)
+    if scheme in ('redis', 'rediss', 'unix'):
+        return socketio.RedisManager(url, channel=channel, write_only=write_only)
+    if scheme in ('amqp', 'amqps'):
+        return socketio.KombuManager(url, channel=channel, write_only=write_only)
+    raise ValueError(f"Unsupported Socket.IO message queue URL: {url}")
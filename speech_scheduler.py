@@ -0,0 +1,235 @@
+import heapq
+import itertools
+import re
+import threading
+import textwrap
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import SPEECH_FIRST_TASK_LATENCY
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+# Used when HeyGen doesn't return duration_ms for a task
+FALLBACK_WORDS_PER_SECOND = 2.5
+
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+_CLAUSE_BREAK = re.compile(r'(?<=[,;:])\s+')
+
+
+class _VisitorSpeech:
+    __slots__ = ('session_id', 'pending', 'busy_until', 'in_flight', 'scheduled')
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.pending = []
+        self.busy_until = 0.0
+        self.in_flight = False
+        self.scheduled = False
+
+
+class SpeechScheduler:
+    """
+    Per-visitor speech queue in front of HeyGen's streaming.task.
+
+    Bot messages that arrive within `coalesce_window` seconds of each other
+    (or while the avatar is still speaking) are merged into one
+    send_text_task. Tasks are sent in async task mode and the returned
+    duration_ms is used to hold the next utterance until the avatar is done,
+    so no server thread waits on speech. With a `tracer`, each task is
+    recorded as a heygen.streaming.task span of the visitor's turn.
+
+    With `chunk_max_chars` set, an utterance is split into sentence chunks
+    (see chunk_speech) sent back to back, so the avatar starts on the first
+    one while HeyGen is still processing the rest.
+    """
+
+    def __init__(self, heygen_client, coalesce_window=0.3, workers=4, tracer=None,
+                 chunk_min_chars=40, chunk_max_chars=0):
+        self.heygen_client = heygen_client
+        self.coalesce_window = coalesce_window
+        self.tracer = tracer
+        self.chunk_min_chars = chunk_min_chars
+        self.chunk_max_chars = chunk_max_chars
+
+        self.tasks_sent = 0
+        self.messages_coalesced = 0
+        self.utterances_chunked = 0
+        self.failures = 0
+
+        self._visitors = {}
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='speech')
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        """Start the dispatcher thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='speech-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop dispatching; utterances already sent are not recalled"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._executor.shutdown(wait=False)
+
+    def submit(self, visitor_id, session_id, text, delay=0):
+        """
+        Queue text for the visitor's avatar.
+
+        The text is spoken after `delay` seconds at the earliest, merged with
+        any other text queued for the visitor before it is sent.
+        """
+        if not text:
+            return
+        with self._condition:
+            state = self._visitors.get(visitor_id)
+            if state is None:
+                state = self._visitors[visitor_id] = _VisitorSpeech(session_id)
+            state.session_id = session_id
+            if state.pending:
+                self.messages_coalesced += 1
+            state.pending.append(text)
+            if not state.scheduled and not state.in_flight:
+                now = time.time()
+                self._schedule(visitor_id, state, max(now + self.coalesce_window, now + delay, state.busy_until))
+
+    def cancel(self, visitor_id):
+        """Forget everything queued for a visitor"""
+        with self._condition:
+            self._visitors.pop(visitor_id, None)
+
+    def busy_until(self, visitor_id):
+        """Epoch time at which the visitor's avatar is expected to stop speaking"""
+        with self._condition:
+            state = self._visitors.get(visitor_id)
+            return state.busy_until if state else 0.0
+
+    def stats(self):
+        """Return scheduler counters"""
+        with self._condition:
+            return {
+                'visitors': len(self._visitors),
+                'tasks_sent': self.tasks_sent,
+                'messages_coalesced': self.messages_coalesced,
+                'utterances_chunked': self.utterances_chunked,
+                'failures': self.failures
+            }
+
+    def _schedule(self, visitor_id, state, due):
+        state.scheduled = True
+        heapq.heappush(self._heap, (due, next(self._sequence), visitor_id))
+        self._condition.notify()
+
+    def _run(self):
+        with self._condition:
+            while not self._stopped:
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    _, _, visitor_id = heapq.heappop(self._heap)
+                    self._dispatch(visitor_id)
+                timeout = self._heap[0][0] - now if self._heap else None
+                self._condition.wait(timeout)
+
+    def _dispatch(self, visitor_id):
+        state = self._visitors.get(visitor_id)
+        if state is None:
+            return
+        state.scheduled = False
+        if not state.pending or state.in_flight:
+            return
+        text = join_utterances(state.pending)
+        state.pending = []
+        state.in_flight = True
+        self._executor.submit(self._speak, visitor_id, state, text)
+
+    def _speak(self, visitor_id, state, text):
+        chunks = [text] if text else []
+        if text and self.chunk_max_chars:
+            chunks = chunk_speech(text, self.chunk_min_chars, self.chunk_max_chars)
+            if len(chunks) > 1:
+                self.utterances_chunked += 1
+
+        # Whitespace-only text leaves no chunks; nothing is sent and busy_until
+        # stays as it was
+        dispatched = time.perf_counter()
+        speaking_from = None
+        duration = 0.0
+        for chunk in chunks:
+            if speaking_from is not None and self._visitors.get(visitor_id) is not state:
+                break  # Cancelled while the earlier chunks were being sent
+            duration += self._send_task(visitor_id, state, chunk)
+            if speaking_from is None:
+                speaking_from = time.time()
+                SPEECH_FIRST_TASK_LATENCY.observe(time.perf_counter() - dispatched)
+
+        with self._condition:
+            state.in_flight = False
+            if speaking_from is not None:
+                state.busy_until = speaking_from + duration / 1000.0
+            if state.pending and self._visitors.get(visitor_id) is state:
+                self._schedule(visitor_id, state, max(time.time() + self.coalesce_window, state.busy_until))
+
+    def _send_task(self, visitor_id, state, text):
+        """Send one async task, returning how many ms the avatar will speak it"""
+        duration = None
+        started = time.perf_counter()
+        try:
+            task_response = self.heygen_client.send_text_task(state.session_id, text, task_mode="async")
+            if self.tracer is not None:
+                self.tracer.record(visitor_id, 'heygen.streaming.task', started, time.perf_counter())
+            if task_response and task_response.get('code') == 100:
+                duration = (task_response.get('data') or {}).get('duration_ms')
+                self.tasks_sent += 1
+            else:
+                log.warning("heygen task failed", visitor_id=visitor_id, response=task_response)
+                self.failures += 1
+        except Exception:
+            log.exception("error sending message to heygen avatar", visitor_id=visitor_id)
+            self.failures += 1
+
+        if duration is None:
+            duration = len(text.split()) / FALLBACK_WORDS_PER_SECOND * 1000
+        return duration
+
+
+def chunk_speech(text, min_chars=40, max_chars=200):
+    """
+    Split an utterance into chunks for pipelined speech.
+
+    Splits at sentence ends, sentences longer than `max_chars` at clause
+    punctuation and then at spaces. Pieces shorter than `min_chars` are
+    merged with the next one so the avatar doesn't pause after every clause.
+    """
+    pieces = []
+    for sentence in _SENTENCE_BREAK.split(text.strip()):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for clause in _CLAUSE_BREAK.split(sentence):
+            pieces.extend(textwrap.wrap(clause, max_chars, break_long_words=False) or [clause])
+
+    chunks = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) < min_chars and len(chunks[-1]) + 1 + len(piece) <= max_chars:
+            chunks[-1] += ' ' + piece
+        else:
+            chunks.append(piece)
+    return [chunk for chunk in chunks if chunk]
+
+
+def join_utterances(texts):
+    """Merge bot messages into one utterance, ending each one as a sentence"""
+    parts = []
+    for text in texts:
+        text = text.strip()
+        if text and text[-1] not in '.!?':
+            text += '.'
+        parts.append(text)
+    return ' '.join(parts)
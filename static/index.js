@@ -4,6 +4,10 @@ let isConnected = false;
 let visitorId = null;
 let threadId = null;
 let currentVisitorId = null;
+// Sequence number of the last stored message shown, history is fetched after it on reconnect
+let lastSeq = 0;
+// Chatting by text until a HeyGen session slot frees up
+let waitingForHeyGen = false;
 // phase2-heygen
 let heygenSocket = null;
 let heygenWsUrl = null;
@@ -12,6 +16,8 @@ let heygenSessionId = null;
 let heygenAccessToken = null;
 let heygenRoomConnected = false;
 let liveKitRoom = null; // Store room reference
+// Survives reloads of this tab, so the chat can be resumed instead of rebuilt
+const STORED_VISITOR_KEY = 'aivatarVisitorId';
 
 function updateConnectionStatus(status, className) {
     const statusElement = document.getElementById('connection-status');
@@ -30,6 +36,9 @@ function initializeSocket() {
         
         if (visitorId) {
             socket.emit('join', {visitor_id: visitorId});
+            // Messages emitted while the socket was down were not received
+            syncHistory();
+            syncQueueStatus();
         }
     });
     
@@ -42,7 +51,26 @@ function initializeSocket() {
     socket.on('new_message', function(data) {
         console.log('New message received via WebSocket:', data);
         if (data.visitor_id === visitorId || data.visitor_id === currentVisitorId) {
-            displayMessage(data.message, true);
+            showStoredMessage(data.message);
+        }
+    });
+
+    socket.on('heygen_queue', function(data) {
+        if (data.visitor_id === visitorId && waitingForHeyGen) {
+            showQueuePosition(data.position);
+        }
+    });
+
+    socket.on('heygen_ready', function(data) {
+        if (data.visitor_id === visitorId && waitingForHeyGen) {
+            hideQueuePosition();
+            useHeyGenSession(data.heygen);
+        }
+    });
+
+    socket.on('heygen_unavailable', function(data) {
+        if (data.visitor_id === visitorId) {
+            hideQueuePosition();
         }
     });
 
@@ -51,11 +79,105 @@ function initializeSocket() {
     });
 }
 
+// Show a message from the server unless it was already shown
+function showStoredMessage(message, speak = true) {
+    if (message.seq) {
+        if (message.seq <= lastSeq) return;
+        lastSeq = message.seq;
+    }
+    displayMessage(message, message.source === 'webhook', speak);
+}
+
+// Fetch the messages stored after lastSeq
+async function syncHistory() {
+    const syncingVisitorId = visitorId;
+    try {
+        const response = await fetch(`/api/history/${encodeURIComponent(syncingVisitorId)}?since=${lastSeq}`);
+        const data = await response.json();
+        if (!data.success || syncingVisitorId !== visitorId) return;
+        // Visitor messages sent from this page are already shown; missed ones are history, not spoken
+        for (const message of data.messages) {
+            if (message.type === 'user') {
+                lastSeq = Math.max(lastSeq, message.seq);
+            } else {
+                showStoredMessage(message, false);
+            }
+        }
+    } catch (error) {
+        console.error('Error syncing history:', error);
+    }
+}
+
+// Connect to a HeyGen session handed out by start-chat or, after waiting for a slot, heygen_ready
+function useHeyGenSession(heygen) {
+    console.log("HeyGen data received:", heygen);
+
+    // Extract credentials from the correct fields
+    heygenSessionId = heygen.session_id;
+    heygenAccessToken = heygen.access_token;
+
+    // Use 'url' field for LiveKit connection
+    heygenWsUrl = heygen.url;
+
+    // Use 'realtime_endpoint' for WebRTC signaling
+    heygenRealtimeUrl = heygen.realtime_endpoint;
+
+    console.log("HeyGen credentials set:", {
+        sessionId: heygenSessionId ? "Present" : "Missing",
+        accessToken: heygenAccessToken ? "Present" : "Missing",
+        liveKitUrl: heygenWsUrl || "Missing",
+        realtimeUrl: heygenRealtimeUrl || "Missing"
+    });
+
+    // Only initialize if we have the required credentials
+    if (heygenSessionId && heygenAccessToken && heygenWsUrl && heygenRealtimeUrl) {
+        console.log("Initializing HeyGen connections...");
+
+        // Initialize connections with small delay
+        setTimeout(async () => {
+            await initHeyGenWebRTC();
+            await connectToHeyGenLiveKit();
+        }, 500);
+    } else {
+        console.warn("Missing required HeyGen credentials");
+    }
+}
+
+// Show the visitor's place in the queue for a HeyGen session
+function showQueuePosition(position) {
+    const queueElement = document.getElementById('queue-status');
+    waitingForHeyGen = true;
+    queueElement.textContent = position > 0
+        ? `All avatars are busy, you are number ${position} in line. You can chat by text meanwhile.`
+        : 'Your avatar is getting ready...';
+    queueElement.style.display = 'block';
+}
+
+function hideQueuePosition() {
+    waitingForHeyGen = false;
+    document.getElementById('queue-status').style.display = 'none';
+}
+
+// Catch up on queue events emitted before the page joined its room
+function syncQueueStatus() {
+    if (!waitingForHeyGen) return;
+    socket.emit('heygen_queue_status', { visitor_id: visitorId }, function(state) {
+        if (!waitingForHeyGen || !state || state.visitor_id !== visitorId) return;
+        if (state.heygen) {
+            hideQueuePosition();
+            useHeyGenSession(state.heygen);
+        } else if (state.queue_position != null) {
+            showQueuePosition(state.queue_position);
+        }
+    });
+}
+
 // Join the WebSocket room when chat starts
 function joinChatRoom(visitorId) {
     currentVisitorId = visitorId;
     if (socket && isConnected) {
         socket.emit('join', { visitor_id: visitorId });
+        syncQueueStatus();
     }
 }
 
@@ -377,15 +499,54 @@ function enableAudioContext() {
 
 // Replace your startChat function with this corrected version:
 
-async function startChat() {
+// Fill the avatar picker from the server's cached catalog, the browser revalidates it with the ETag
+async function loadAvatars() {
     try {
+        const response = await fetch('/api/avatars');
+        if (!response.ok) {
+            return;
+        }
+        const catalog = await response.json();
+        const select = document.getElementById('avatar-select');
+        if (!select || catalog.avatars.length === 0) {
+            return;
+        }
+        select.innerHTML = '';
+        catalog.avatars.forEach(avatar => {
+            const option = document.createElement('option');
+            option.value = avatar.avatar_id;
+            option.textContent = avatar.name;
+            option.selected = avatar.avatar_id === catalog.default_avatar_id;
+            select.appendChild(option);
+        });
+        select.style.display = '';
+    } catch (error) {
+        console.error('Error loading avatars:', error);
+    }
+}
+
+// With resume set, only take back the chat stored for this tab; never start a new one
+async function startChat(resume = false) {
+    try {
+        const avatarSelect = document.getElementById('avatar-select');
         const response = await fetch('/api/start-chat', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
-            }
+            },
+            body: JSON.stringify({
+                visitor_id: sessionStorage.getItem(STORED_VISITOR_KEY) || undefined,
+                avatar_id: avatarSelect && avatarSelect.value ? avatarSelect.value : undefined,
+                resume: resume || undefined
+            })
         });
 
+        if (resume && response.status === 404) {
+            // Stopped after the grace period; leave the start screen for a fresh chat
+            sessionStorage.removeItem(STORED_VISITOR_KEY);
+            return;
+        }
+
         const data = await response.json();
         console.log("Start chat response:", data);
 
@@ -393,40 +554,13 @@ async function startChat() {
             visitorId = data.visitor_id;
             threadId = data.thread_id;
             currentVisitorId = data.visitor_id;
+            lastSeq = data.last_seq || 0;
+            sessionStorage.setItem(STORED_VISITOR_KEY, visitorId);
 
-            // Check if HeyGen credentials are present and properly formatted
             if (data.heygen && Object.keys(data.heygen).length > 0) {
-                console.log("HeyGen data received:", data.heygen);
-                
-                // Extract credentials from the correct fields
-                heygenSessionId = data.heygen.session_id;
-                heygenAccessToken = data.heygen.access_token;
-                
-                // Use 'url' field for LiveKit connection
-                heygenWsUrl = data.heygen.url;
-                
-                // Use 'realtime_endpoint' for WebRTC signaling
-                heygenRealtimeUrl = data.heygen.realtime_endpoint;
-
-                console.log("HeyGen credentials set:", {
-                    sessionId: heygenSessionId ? "Present" : "Missing",
-                    accessToken: heygenAccessToken ? "Present" : "Missing",
-                    liveKitUrl: heygenWsUrl || "Missing",
-                    realtimeUrl: heygenRealtimeUrl || "Missing"
-                });
-
-                // Only initialize if we have the required credentials
-                if (heygenSessionId && heygenAccessToken && heygenWsUrl && heygenRealtimeUrl) {
-                    console.log("Initializing HeyGen connections...");
-                    
-                    // Initialize connections with small delay
-                    setTimeout(async () => {
-                        await initHeyGenWebRTC();
-                        await connectToHeyGenLiveKit();
-                    }, 500);
-                } else {
-                    console.warn("Missing required HeyGen credentials");
-                }
+                useHeyGenSession(data.heygen);
+            } else if (data.queue_position != null) {
+                showQueuePosition(data.queue_position);
             } else {
                 console.warn("HeyGen credentials not received in response");
                 console.log("Full response data:", data);
@@ -443,7 +577,11 @@ async function startChat() {
 
             joinChatRoom(visitorId);
 
-            if (data.initial_message) {
+            if (data.resumed) {
+                document.getElementById('chat-messages').innerHTML = '';
+                // Already spoken before the reload, so only shown
+                (data.messages || []).forEach(message => displayMessage(message, message.source === 'webhook', false));
+            } else if (data.initial_message) {
                 displayMessage({
                     type: 'bot',
                     message: data.initial_message,
@@ -462,6 +600,46 @@ async function startChat() {
     }
 }
 
+// Longer than the server's WotNot deadline (HTTP_CONNECT_TIMEOUT + HTTP_READ_TIMEOUT, 33 s by
+// default), so the HTTP resend only goes out once the first attempt has finished either way. A
+// failed attempt is forgotten by then and the resend delivers the message instead of being
+// acknowledged as a duplicate.
+const SEND_ACK_TIMEOUT_MS = 45000;
+
+// Send over the open Socket.IO connection and wait for the server's ack; null means use HTTP instead
+async function sendOverSocket(payload) {
+    if (!socket || !isConnected) {
+        return null;
+    }
+    try {
+        return await socket.timeout(SEND_ACK_TIMEOUT_MS).emitWithAck('send_message', payload);
+    } catch (error) {
+        // No ack in time, the message may still have been delivered; the HTTP
+        // resend carries the same client_message_id, so the server skips it then
+        console.warn('Socket send failed, falling back to HTTP:', error);
+        return null;
+    }
+}
+
+// Identifies one send, so the server can drop a resend of the same message
+function newClientMessageId() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+}
+
+async function sendOverHttp(payload) {
+    const response = await fetch('/api/send-message', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(payload)
+    });
+    return await response.json();
+}
+
 async function sendMessage(messageText) {
     const messageInput = document.getElementById('message-input');
     const message = messageText || messageInput.value.trim();
@@ -486,18 +664,12 @@ async function sendMessage(messageText) {
     }
     
     try {
-        const response = await fetch('/api/send-message', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                visitor_id: window.currentVisitorId || visitorId,
-                message: message
-            })
-        });
-        
-        const data = await response.json();
+        const payload = {
+            visitor_id: window.currentVisitorId || visitorId,
+            message: message,
+            client_message_id: newClientMessageId()
+        };
+        const data = await sendOverSocket(payload) || await sendOverHttp(payload);
         
         if (!data.success) {
             alert('Failed to send message: ' + data.error);
@@ -517,7 +689,7 @@ async function sendMessage(messageText) {
 }
 
 // Enhanced display message function to handle buttons
-function displayMessage(message, fromWebhook = false) {
+function displayMessage(message, fromWebhook = false, speak = true) {
     const messagesContainer = document.getElementById('chat-messages');
     const messageDiv = document.createElement('div');
 
@@ -543,17 +715,19 @@ function displayMessage(message, fromWebhook = false) {
     }
 
     messageDiv.innerHTML = `
-        <div class="message-text">${messageText}</div>
+        <div class="message-text"></div>
         ${buttonsHtml}
         <div class="timestamp">${time}</div>
         ${webhookIndicator}
     `;
+    // Message text is plain text (entities already decoded server-side), never HTML
+    messageDiv.querySelector('.message-text').textContent = messageText;
 
     messagesContainer.appendChild(messageDiv);
     messagesContainer.scrollTop = messagesContainer.scrollHeight;
 
     // Only trigger HeyGen for bot messages
-    if (messageType === 'bot') {
+    if (messageType === 'bot' && speak) {
         sendTextToHeyGen(messageText);
     }
 }
@@ -577,7 +751,8 @@ function sendTextToHeyGen(text) {
 // Fixed beforeunload event handler
 window.addEventListener('beforeunload', function (e) {
     if (visitorId) {
-        const data = JSON.stringify({ visitor_id: visitorId });
+        // Only a deferred stop, a reload resumes the chat within the grace period
+        const data = JSON.stringify({ visitor_id: visitorId, grace: true });
         const blob = new Blob([data], { type: 'application/json' });
         navigator.sendBeacon('/api/stop-chat', blob);
     }
@@ -620,6 +795,7 @@ async function stopChat() {
         
         if (data.success) {
             console.log('Chat stopped successfully');
+            sessionStorage.removeItem(STORED_VISITOR_KEY);
             // Reset the UI
             document.getElementById('chat-screen').style.display = 'none';
             document.getElementById('start-screen').style.display = 'flex';
@@ -627,6 +803,8 @@ async function stopChat() {
             // Reset variables
             visitorId = null;
             currentVisitorId = null;
+            lastSeq = 0;
+            hideQueuePosition();
             heygenRoomConnected = false;
             heygenSessionId = null;
             heygenAccessToken = null;
@@ -651,8 +829,16 @@ function handleKeyPress(event) {
     }
 }
 
+// After a reload, pick the chat of this tab back up
+function resumeStoredChat() {
+    if (sessionStorage.getItem(STORED_VISITOR_KEY)) {
+        startChat(true);
+    }
+}
+
 document.addEventListener('DOMContentLoaded', function() {
     console.log("DOM loaded, initializing...");
+    loadAvatars();
     
     // Wait for LiveKit to load properly
     let attempts = 0;
@@ -667,12 +853,14 @@ document.addEventListener('DOMContentLoaded', function() {
                 window.LivekitClient = window.LiveKitClient;
             }
             initializeSocket();
+            resumeStoredChat();
         } else if (attempts < maxAttempts) {
             console.log(`Waiting for LiveKit... attempt ${attempts}`);
             setTimeout(checkLiveKit, 200);
         } else {
             console.error("LiveKit failed to load after all attempts");
             initializeSocket(); // Continue without LiveKit
+            resumeStoredChat();
         }
     };
     
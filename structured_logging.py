@@ -0,0 +1,188 @@
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+import threading
+import time
+
+# Keyword arguments that belong to logging itself rather than to the structured fields
+_LOGGING_KWARGS = frozenset(['exc_info', 'stack_info', 'stacklevel', 'extra'])
+# Field names whose values are never written out
+_SECRET_FIELD = re.compile(r'(api[_-]?key|token|secret|password|authorization)', re.IGNORECASE)
+REDACTED = '[REDACTED]'
+
+_secrets = set()
+_secrets_pattern = None
+_secrets_lock = threading.Lock()
+
+
+def register_secret(value):
+    """Redact this value wherever it shows up in a log line"""
+    global _secrets_pattern
+    if not value or len(value) < 4:
+        return
+    with _secrets_lock:
+        _secrets.add(value)
+        _secrets_pattern = re.compile('|'.join(re.escape(secret) for secret in sorted(_secrets, key=len, reverse=True)))
+
+
+def redact(text):
+    """Replace registered secrets in text"""
+    pattern = _secrets_pattern
+    if pattern is None or not isinstance(text, str):
+        return text
+    return pattern.sub(REDACTED, text)
+
+
+def truncate(text, limit):
+    """Shorten text to limit characters, noting how much was cut"""
+    if not isinstance(text, str) or limit is None or len(text) <= limit:
+        return text
+    return f"{text[:limit]}...[{len(text) - limit} more chars]"
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """
+    Logger taking structured fields as keyword arguments:
+
+        log.info("upstream call", upstream="heygen", operation="streaming.task", status=200)
+
+    The fields are attached to the record and rendered by StructuredFormatter.
+    """
+
+    def __init__(self, logger):
+        super().__init__(logger, {})
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in _LOGGING_KWARGS}
+        if fields:
+            kwargs.setdefault('extra', {})['fields'] = fields
+        return msg, kwargs
+
+
+def get_logger(name):
+    """Return a StructuredLogger for a module"""
+    return StructuredLogger(logging.getLogger(name))
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Render records as one JSON object (or key=value text) per line.
+
+    Secrets are redacted and long string fields are truncated to body_limit.
+    Runs on the listener thread, never on the request path.
+    """
+
+    def __init__(self, fmt='json', body_limit=512):
+        super().__init__()
+        self.fmt = fmt
+        self.body_limit = body_limit
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': redact(record.getMessage())
+        }
+        for key, value in (getattr(record, 'fields', None) or {}).items():
+            if _SECRET_FIELD.search(key):
+                value = REDACTED
+            elif isinstance(value, str):
+                value = truncate(redact(value), self.body_limit)
+            elif not isinstance(value, (int, float, bool, type(None))):
+                value = truncate(redact(str(value)), self.body_limit)
+            entry[key] = value
+        if record.exc_info:
+            entry['exc'] = redact(self.formatException(record.exc_info))
+
+        if self.fmt == 'json':
+            return json.dumps(entry, ensure_ascii=False, default=str)
+        head = f"{entry.pop('ts')} {entry.pop('level'):<7} {entry.pop('logger')}: {entry.pop('msg')}"
+        exc = entry.pop('exc', None)
+        line = ' '.join([head] + [f"{key}={value}" for key, value in entry.items()])
+        return f"{line}\n{exc}" if exc else line
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep one in `every` records for high-volume messages below WARNING.
+
+    Messages are matched on the unformatted log message, so
+    log.info("upstream call", ...) is sampled as one stream.
+    """
+
+    def __init__(self, messages, every=10):
+        super().__init__()
+        self.messages = frozenset(messages)
+        self.every = every
+        self._counts = {}
+
+    def filter(self, record):
+        if self.every <= 1 or record.levelno >= logging.WARNING or record.msg not in self.messages:
+            return True
+        count = self._counts.get(record.msg, 0)
+        self._counts[record.msg] = count + 1
+        return count % self.every == 0
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records (and counts them) instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The listener runs in this process, so formatting is left to its thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# High-volume messages that are sampled at INFO and DEBUG
+SAMPLED_MESSAGES = ('upstream call', 'upstream response', 'webhook event', 'message event')
+
+_listener = None
+
+
+def configure_logging(level='INFO', fmt='json', body_limit=512, sample_every=10, queue_size=10000, stream=None):
+    """
+    Route all logging through a bounded queue drained by a background listener.
+
+    Callers only put records on the queue; formatting, redaction and the
+    write to stdout happen on the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(StructuredFormatter(fmt=fmt, body_limit=body_limit))
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.addFilter(SamplingFilter(SAMPLED_MESSAGES, every=sample_every))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    return handler
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,14 @@
+import pytest
+
+from session_store import InMemorySessionStore, RedisSessionStore, SQLiteSessionStore
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def store(request, tmp_path):
+    """One store of each backend; Redis runs against fakeredis"""
+    if request.param == 'memory':
+        return InMemorySessionStore()
+    if request.param == 'sqlite':
+        return SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+    fakeredis = pytest.importorskip('fakeredis')
+    return RedisSessionStore(client=fakeredis.FakeRedis())
@@ -0,0 +1,145 @@
+import pytest
+
+from admission import AdmissionController
+
+
+class Recorder:
+    def __init__(self):
+        self.promoted = []
+        self.positions = []
+
+    def on_promote(self, visitor_id):
+        self.promoted.append(visitor_id)
+
+    def on_positions(self, positions):
+        self.positions.append(positions)
+
+
+@pytest.fixture
+def recorder():
+    return Recorder()
+
+
+def controller(limit, recorder, store=None, **kwargs):
+    return AdmissionController(limit, store=store, on_promote=recorder.on_promote,
+                               on_positions=recorder.on_positions, **kwargs)
+
+
+def test_admits_up_to_the_limit_then_queues(recorder):
+    admission = controller(2, recorder)
+
+    assert admission.acquire('a') == 0
+    assert admission.acquire('b') == 0
+    assert admission.acquire('c') == 1
+    assert admission.acquire('d') == 2
+    # Asking again keeps the visitor's place
+    assert admission.acquire('a') == 0
+    assert admission.acquire('c') == 1
+
+    assert admission.position('b') == 0
+    assert admission.position('d') == 2
+    assert admission.position('nobody') is None
+    assert admission.stats()['active'] == 2
+    assert admission.stats()['waiting'] == 2
+
+
+def test_acquire_without_queueing(recorder):
+    admission = controller(1, recorder)
+    assert admission.acquire('a', queue=False) == 0
+    assert admission.acquire('b', queue=False) is None
+    assert admission.position('b') is None
+
+
+def test_release_promotes_the_first_waiter(recorder):
+    admission = controller(1, recorder)
+    admission.acquire('a')
+    admission.acquire('b')
+    admission.acquire('c')
+
+    admission.release('a')
+
+    assert recorder.promoted == ['b']
+    assert recorder.positions == [[('c', 1)]]
+    assert admission.position('b') == 0
+    assert admission.position('c') == 1
+    assert admission.stats()['promoted'] == 1
+
+
+def test_release_of_a_visitor_without_a_slot_is_ignored(recorder):
+    admission = controller(1, recorder)
+    admission.acquire('a')
+    admission.acquire('b')
+
+    admission.release('b')
+    admission.release('nobody')
+
+    assert recorder.promoted == []
+    assert admission.position('a') == 0
+    assert admission.position('b') == 1
+
+
+def test_freed_slot_is_not_overtaken(recorder):
+    admission = controller(1, recorder)
+    admission.acquire('a')
+    admission.acquire('b')
+    admission.release('a')
+
+    assert admission.acquire('c') == 1
+    assert recorder.promoted == ['b']
+
+
+def test_withdraw_moves_up_only_the_waiters_behind(recorder):
+    admission = controller(1, recorder)
+    for visitor_id in ('a', 'b', 'c', 'd'):
+        admission.acquire(visitor_id)
+
+    admission.withdraw('c')
+
+    assert recorder.positions == [[('d', 2)]]
+    assert admission.position('d') == 2
+    assert admission.stats()['abandoned'] == 1
+
+    admission.release('a')
+    assert recorder.promoted == ['b']
+
+
+def test_queue_is_bounded(recorder):
+    admission = controller(1, recorder, max_waiting=1)
+    admission.acquire('a')
+    assert admission.acquire('b') == 1
+    assert admission.acquire('c') is None
+    assert admission.stats()['rejected'] == 1
+
+
+def test_zero_limit_admits_everyone(recorder):
+    admission = controller(0, recorder)
+    assert [admission.acquire(visitor_id) for visitor_id in 'abc'] == [0, 0, 0]
+    admission.release('a')
+    assert recorder.promoted == []
+
+
+def test_callback_errors_are_contained():
+    def failing(visitor_id):
+        raise RuntimeError("emit failed")
+
+    admission = AdmissionController(1, on_promote=failing)
+    admission.acquire('a')
+    admission.acquire('b')
+    admission.release('a')
+    assert admission.position('b') == 0
+
+
+def test_workers_sharing_a_store_share_the_cap(store, recorder):
+    first = controller(2, recorder, store=store)
+    second = controller(2, recorder, store=store)
+
+    assert first.acquire('a') == 0
+    assert second.acquire('b') == 0
+    assert second.acquire('c') == 1
+    assert first.acquire('d') == 2
+
+    # A slot freed on one worker goes to the visitor that queued on the other
+    first.release('b')
+    assert recorder.promoted == ['c']
+    assert second.position('c') == 0
+    assert second.position('d') == 1
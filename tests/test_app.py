@@ -0,0 +1,259 @@
+import os
+import uuid
+
+import pytest
+
+os.environ.setdefault('BOT_KEY', 'testbot')
+os.environ.setdefault('HEYGEN_POOL_SIZE', '0')
+
+import app as chat_app  # noqa: E402
+from message_log import MessageLog  # noqa: E402
+
+
+class StubWotNot:
+    def __init__(self, results=()):
+        self.results = list(results)
+        self.sent = []
+
+    def send_visitor_message(self, thread_id, message, visitor_id):
+        self.sent.append((thread_id, message))
+        return self.results.pop(0) if self.results else {'id': f'msg-{len(self.sent)}'}
+
+
+@pytest.fixture
+def client():
+    return chat_app.app.test_client()
+
+
+@pytest.fixture
+def conversation():
+    visitor_id = 'visitor-test'
+    chat_app.conversation_threads[visitor_id] = {'thread_id': 1, 'messages': MessageLog()}
+    yield visitor_id
+    chat_app.conversation_threads.discard(visitor_id)
+
+
+@pytest.fixture
+def wotnot(monkeypatch):
+    stub = StubWotNot()
+    monkeypatch.setattr(chat_app, 'wotnot_client', stub)
+    return stub
+
+
+class StubQueue:
+    def __init__(self, accept=True):
+        self.accept = accept
+        self.events = []
+
+    def submit(self, key, event):
+        if self.accept:
+            self.events.append((key, event['id']))
+        return self.accept
+
+
+@pytest.fixture
+def webhook_queue(monkeypatch):
+    monkeypatch.setattr(chat_app, 'WEBHOOK_TOKEN', 'hook-secret')
+    queue = StubQueue()
+    monkeypatch.setattr(chat_app, 'webhook_queue', queue)
+    return queue
+
+
+def webhook(*event_ids):
+    return {'token': 'hook-secret', 'events': [
+        {'id': event_id, 'conversation': {'key': 'conversation-1'}, 'event': {'type': 'message'}}
+        for event_id in event_ids
+    ]}
+
+
+def send_payload(visitor_id, message='Hi'):
+    return {'visitor_id': visitor_id, 'message': message, 'client_message_id': uuid.uuid4().hex}
+
+
+def bearer(token):
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_debug_traces_needs_the_bearer_header(client, monkeypatch):
+    monkeypatch.setattr(chat_app, 'DEBUG_TOKEN', 'debug-secret')
+
+    assert client.get('/debug/traces').status_code == 401
+    assert client.get('/debug/traces', headers=bearer('wrong')).status_code == 401
+    assert client.get('/debug/traces?token=debug-secret').status_code == 401
+    response = client.get('/debug/traces?limit=5', headers=bearer('debug-secret'))
+    assert response.status_code == 200
+    assert 'turns' in response.get_json()
+
+
+def test_debug_traces_is_hidden_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(chat_app, 'DEBUG_TOKEN', None)
+    assert client.get('/debug/traces', headers=bearer('anything')).status_code == 404
+
+
+def test_admin_teardown_checks_the_token(client, monkeypatch):
+    monkeypatch.setattr(chat_app, 'ADMIN_TOKEN', None)
+    assert client.post('/admin/teardown', headers=bearer('anything')).status_code == 404
+
+    monkeypatch.setattr(chat_app, 'ADMIN_TOKEN', 'admin-secret')
+    assert client.post('/admin/teardown').status_code == 401
+    assert client.post('/admin/teardown', headers=bearer('admin-secrets')).status_code == 401
+    assert client.post('/admin/teardown', headers=bearer('ädmin')).status_code == 401
+
+    response = client.post('/admin/teardown?timeout=1', headers=bearer('admin-secret'))
+    assert response.status_code == 200
+    assert response.get_json()['success'] is True
+
+
+def test_send_message_over_the_socket_is_acked(conversation, wotnot):
+    socket = chat_app.socketio.test_client(chat_app.app)
+    payload = send_payload(conversation)
+
+    ack = socket.emit('send_message', payload, callback=True)
+    assert ack == {'success': True, 'message': 'Message sent successfully', 'message_id': 'msg-1', 'status': 200}
+    assert socket.emit('send_message', {'message': 'Hi'}, callback=True)['status'] == 400
+    socket.disconnect()
+
+
+def test_resend_after_a_late_ack_is_not_sent_twice(client, conversation, wotnot):
+    payload = send_payload(conversation)
+    assert client.post('/api/send-message', json=payload).get_json()['success'] is True
+
+    response = client.post('/api/send-message', json=payload).get_json()
+    assert response['duplicate'] is True
+    assert wotnot.sent == [(1, 'Hi')]
+
+
+def test_resend_after_a_failed_attempt_is_delivered(client, conversation, wotnot):
+    wotnot.results = [None]
+    payload = send_payload(conversation)
+    assert client.post('/api/send-message', json=payload).status_code == 500
+
+    response = client.post('/api/send-message', json=payload).get_json()
+    assert response['success'] is True
+    assert 'duplicate' not in response
+    assert wotnot.sent == [(1, 'Hi'), (1, 'Hi')]
+
+
+def test_resume_hands_the_chat_back(client, conversation, monkeypatch):
+    monkeypatch.setitem(chat_app.heygen_sessions, conversation, {
+        'session_id': 'session-1', 'token': 'access', 'url': 'wss://stub', 'realtime_endpoint': 'wss://stub/rt'})
+    chat_app.store_message(conversation, chat_app.ChatMessage('bot', 'Hi'))
+
+    response = client.post('/api/start-chat', json={'visitor_id': conversation, 'resume': True})
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data['resumed'] is True
+    assert data['heygen']['session_id'] == 'session-1'
+    assert [message['message'] for message in data['messages']] == ['Hi']
+
+
+def test_resume_of_a_stopped_chat_does_not_start_a_new_one(client, wotnot):
+    response = client.post('/api/start-chat', json={'visitor_id': 'stopped-visitor', 'resume': True})
+    assert response.status_code == 404
+    assert response.get_json() == {'success': False, 'error': 'Chat not found'}
+    assert 'stopped-visitor' not in chat_app.conversation_threads
+    assert wotnot.sent == []
+
+
+def test_history_returns_messages_after_since(client, conversation):
+    for text in ('one', 'two', 'three'):
+        chat_app.store_message(conversation, chat_app.ChatMessage('bot', text))
+
+    data = client.get(f'/api/history/{conversation}?since=1').get_json()
+    assert [message['message'] for message in data['messages']] == ['two', 'three']
+    assert [message['seq'] for message in data['messages']] == [2, 3]
+    assert data['last_seq'] == 3
+    assert data['truncated'] is False
+    assert client.get(f'/api/history/{conversation}?since=3').get_json()['messages'] == []
+
+
+def test_history_reports_dropped_messages(client, conversation):
+    chat_app.conversation_threads[conversation] = {'thread_id': 1, 'messages': chat_app.MessageLog(2)}
+    for text in ('one', 'two', 'three'):
+        chat_app.store_message(conversation, chat_app.ChatMessage('bot', text))
+
+    data = client.get(f'/api/history/{conversation}').get_json()
+    assert [message['message'] for message in data['messages']] == ['two', 'three']
+    assert data['truncated'] is True
+
+
+def test_history_of_an_unknown_visitor(client):
+    assert client.get('/api/history/nobody').status_code == 404
+
+
+class StubCatalogHeyGen:
+    def list_streaming_avatars(self):
+        return {'data': [{'avatar_id': 'anna', 'pose_name': 'Anna', 'default_voice': 'anna-voice'}]}
+
+    def list_voices(self):
+        return {'data': {'voices': [{'voice_id': 'anna-voice', 'name': 'Anna'}]}}
+
+
+def test_avatars_are_served_with_an_etag(client, monkeypatch):
+    catalog = chat_app.AvatarCatalog(StubCatalogHeyGen(), default_avatar_id='default', default_voice_id='voice')
+    monkeypatch.setattr(chat_app, 'avatar_catalog', catalog)
+
+    response = client.get('/api/avatars')
+    assert response.status_code == 200
+    assert response.get_json()['avatars'][0]['avatar_id'] == 'anna'
+    etag = response.headers['ETag']
+    assert 'no-cache' in response.headers['Cache-Control']
+
+    revalidated = client.get('/api/avatars', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+
+
+def test_metrics_are_exposed_for_prometheus(client, conversation):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type == chat_app.CONTENT_TYPE
+    body = response.get_data(as_text=True)
+    assert '# TYPE aivatar_start_chat_seconds histogram' in body
+    assert 'aivatar_conversation_threads 1.0' in body.splitlines()
+
+
+def test_webhook_queues_events_and_acks_right_away(client, webhook_queue):
+    event_id = uuid.uuid4().hex
+    response = client.post('/webhook/wotnot', json=webhook(event_id))
+    assert response.status_code == 200
+    assert webhook_queue.events == [('conversation-1', event_id)]
+
+    assert client.post('/webhook/wotnot', json={**webhook(event_id), 'token': 'wrong'}).status_code == 401
+
+
+def test_webhook_asks_for_a_retry_when_the_queue_is_full(client, webhook_queue):
+    webhook_queue.accept = False
+    event_id = uuid.uuid4().hex
+    assert client.post('/webhook/wotnot', json=webhook(event_id)).status_code == 503
+
+    # The shed event was not marked as seen, so the retry is queued
+    webhook_queue.accept = True
+    assert client.post('/webhook/wotnot', json=webhook(event_id)).status_code == 200
+    assert webhook_queue.events == [('conversation-1', event_id)]
+
+
+def test_redelivered_webhook_events_are_acked_but_processed_once(client, webhook_queue):
+    first, second = uuid.uuid4().hex, uuid.uuid4().hex
+    assert client.post('/webhook/wotnot', json=webhook(first)).status_code == 200
+    assert client.post('/webhook/wotnot', json=webhook(first, second, second)).status_code == 200
+    assert webhook_queue.events == [('conversation-1', first), ('conversation-1', second)]
+
+
+def test_closing_page_defers_the_stop_until_the_chat_is_used(client, conversation, wotnot, monkeypatch):
+    monkeypatch.setattr(chat_app, 'STOP_GRACE_PERIOD', 20)
+    # sendBeacon posts text/plain
+    response = client.post('/api/stop-chat', data=f'{{"visitor_id": "{conversation}", "grace": true}}',
+                           content_type='text/plain')
+    assert response.get_json()['message'] == 'Chat session will stop unless resumed'
+    assert conversation in chat_app.session_reaper.deadlines
+    assert conversation in chat_app.conversation_threads
+
+    client.post('/api/send-message', json=send_payload(conversation))
+    assert conversation not in chat_app.session_reaper.deadlines
+
+
+def test_stop_without_grace_evicts_the_chat(client, conversation):
+    response = client.post('/api/stop-chat', json={'visitor_id': conversation})
+    assert response.get_json()['success'] is True
+    assert conversation not in chat_app.conversation_threads
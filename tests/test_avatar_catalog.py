@@ -0,0 +1,102 @@
+import json
+import time
+
+from avatar_catalog import AvatarCatalog
+
+
+class FakeHeyGen:
+    def __init__(self):
+        self.fail = False
+        self.calls = 0
+        self.avatars = [
+            {'avatar_id': 'anna', 'pose_name': 'Anna', 'default_voice': 'anna-voice'},
+            {'avatar_id': 'retired', 'status': 'INACTIVE'},
+        ]
+
+    def list_streaming_avatars(self):
+        self.calls += 1
+        return None if self.fail else {'data': self.avatars}
+
+    def list_voices(self):
+        return None if self.fail else {'data': {'voices': [{'voice_id': 'anna-voice', 'name': 'Anna'},
+                                                           {'voice_id': 'other-voice'}]}}
+
+
+def catalog(heygen, **kwargs):
+    return AvatarCatalog(heygen, default_avatar_id='default', default_voice_id='default-voice', **kwargs)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def test_first_get_loads_the_catalog():
+    heygen = FakeHeyGen()
+    avatars = catalog(heygen)
+    snapshot = avatars.get()
+
+    assert snapshot.avatar_ids == {'anna'}
+    assert snapshot.voice_ids == {'anna-voice', 'other-voice'}
+    body = json.loads(snapshot.body)
+    assert body['default_avatar_id'] == 'default'
+    assert body['avatars'][0]['name'] == 'Anna'
+    # Served from memory afterwards
+    assert avatars.get() is snapshot
+    assert heygen.calls == 1
+
+
+def test_validate_never_calls_heygen():
+    heygen = FakeHeyGen()
+    avatars = catalog(heygen)
+    assert avatars.validate('default', 'default-voice') is None
+    assert avatars.validate('anna', 'anna-voice') == "Unknown avatar: anna"
+    assert heygen.calls == 0
+
+    avatars.refresh()
+    assert avatars.validate('anna', 'anna-voice') is None
+    assert avatars.validate('anna', 'missing') == "Unknown voice: missing"
+    assert avatars.validate('retired', 'anna-voice') == "Unknown avatar: retired"
+
+
+def test_default_voice():
+    avatars = catalog(FakeHeyGen())
+    avatars.refresh()
+    assert avatars.default_voice('anna') == 'anna-voice'
+    # The default avatar keeps the configured voice the session pool is warmed with
+    assert avatars.default_voice('default') == 'default-voice'
+    assert avatars.default_voice('unknown') == 'default-voice'
+
+
+def test_failed_refresh_keeps_the_old_snapshot():
+    heygen = FakeHeyGen()
+    avatars = catalog(heygen)
+    snapshot = avatars.refresh()
+    heygen.fail = True
+    assert avatars.refresh() is snapshot
+    assert avatars.get() is snapshot
+    assert avatars.stats()['failures'] == 1
+
+
+def test_failed_first_load_is_retried_after_the_interval():
+    heygen = FakeHeyGen()
+    heygen.fail = True
+    avatars = catalog(heygen, retry_interval=60)
+    assert avatars.get().avatar_ids == frozenset()
+    assert avatars.get().avatar_ids == frozenset()
+    assert heygen.calls == 1
+
+
+def test_stale_snapshot_is_served_while_refreshing():
+    heygen = FakeHeyGen()
+    avatars = catalog(heygen, ttl=0)
+    stale = avatars.refresh()
+    heygen.avatars = [{'avatar_id': 'ben', 'default_voice': None}]
+
+    assert avatars.get() is stale
+    assert wait_for(lambda: avatars.get().avatar_ids == {'ben'})
+    assert avatars.get().etag != stale.etag
@@ -0,0 +1,98 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', clock.monotonic)
+    return clock
+
+
+def state(breaker):
+    return breaker.stats()['state']
+
+
+def fail(breaker, times=1, duration=0.1):
+    for _ in range(times):
+        breaker.allow()
+        breaker.record(duration, failed=True)
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker('wotnot', failure_threshold=3, reset_timeout=30)
+    fail(breaker, 2)
+    breaker.allow()
+    breaker.record(0.1, failed=False)
+    # A success resets the count
+    fail(breaker, 2)
+    assert breaker.state == circuit_breaker.CLOSED
+
+    fail(breaker)
+    assert breaker.state == circuit_breaker.OPEN
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    assert breaker.stats() == {'state': 2, 'consecutive_failures': 3, 'opened': 1, 'rejected': 1}
+
+
+def test_slow_calls_count_as_failures(clock):
+    breaker = CircuitBreaker('heygen', failure_threshold=2, slow_call_seconds=1.0)
+    fail(breaker, 2, duration=0.1)
+    assert breaker.state == circuit_breaker.OPEN
+
+    breaker = CircuitBreaker('heygen', failure_threshold=2, slow_call_seconds=1.0)
+    for _ in range(2):
+        breaker.allow()
+        breaker.record(5.0, failed=False)
+    assert breaker.state == circuit_breaker.OPEN
+
+
+def test_half_open_probe_closes_on_success(clock):
+    breaker = CircuitBreaker('wotnot', failure_threshold=1, reset_timeout=30)
+    fail(breaker)
+
+    clock.now += 30
+    assert not breaker.is_open()
+    breaker.allow()
+    assert state(breaker) == 1
+    # Only one probe at a time
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+    breaker.record(0.1, failed=False)
+    assert breaker.state == circuit_breaker.CLOSED
+    breaker.allow()
+
+
+def test_half_open_probe_reopens_on_failure(clock):
+    breaker = CircuitBreaker('wotnot', failure_threshold=1, reset_timeout=30)
+    fail(breaker)
+
+    clock.now += 30
+    breaker.allow()
+    breaker.record(0.1, failed=True)
+    assert breaker.state == circuit_breaker.OPEN
+    assert breaker.stats()['opened'] == 2
+
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    clock.now += 1
+    breaker.allow()
+
+
+def test_open_error_is_a_request_exception():
+    import requests
+    assert issubclass(CircuitOpenError, requests.exceptions.RequestException)
@@ -0,0 +1,82 @@
+import threading
+import time
+
+from event_queue import KeyedEventQueue
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def test_events_of_one_key_stay_in_order():
+    handled = []
+    lock = threading.Lock()
+
+    def handle(event):
+        key, index = event
+        time.sleep(0.001 * (index % 3))
+        with lock:
+            handled.append(event)
+
+    events = KeyedEventQueue(handle, workers=4, maxsize=1000)
+    events.start()
+    try:
+        for index in range(30):
+            for key in ('a', 'b', 'c'):
+                assert events.submit(key, (key, index))
+        assert wait_for(lambda: len(handled) == 90)
+    finally:
+        events.stop()
+
+    for key in ('a', 'b', 'c'):
+        assert [index for event_key, index in handled if event_key == key] == list(range(30))
+    assert events.stats()['processed'] == 90
+
+
+def test_full_queue_sheds_events():
+    release = threading.Event()
+    events = KeyedEventQueue(lambda event: release.wait(), workers=1, maxsize=2, put_timeout=0.01)
+    events.start()
+    try:
+        results = [events.submit('a', index) for index in range(5)]
+        # One event is being handled, two wait, the rest are dropped
+        assert results.count(False) >= 2
+        assert events.stats()['dropped'] == results.count(False)
+    finally:
+        release.set()
+        events.stop()
+
+
+def test_handler_errors_are_counted_and_the_worker_keeps_going():
+    handled = []
+
+    def handle(event):
+        if event == 'bad':
+            raise ValueError(event)
+        handled.append(event)
+
+    events = KeyedEventQueue(handle, workers=1)
+    events.start()
+    events.submit('a', 'bad')
+    events.submit('a', 'good')
+    events.stop()
+
+    assert handled == ['good']
+    assert events.stats()['failed'] == 1
+    assert events.stats()['processed'] == 1
+
+
+def test_stop_drains_queued_events():
+    handled = []
+    events = KeyedEventQueue(handled.append, workers=2)
+    events.start()
+    for index in range(20):
+        events.submit(index, index)
+    events.stop()
+    assert sorted(handled) == list(range(20))
+    assert events.depth() == 0
@@ -0,0 +1,97 @@
+import itertools
+import time
+
+from heygen_pool import HeyGenSessionPool, open_heygen_session
+
+
+class FakeHeyGen:
+    def __init__(self, webrtc_code=100):
+        self.webrtc_code = webrtc_code
+        self.ids = itertools.count(1)
+        self.started = []
+        self.stopped = []
+
+    def create_token(self):
+        return {'token': 'token'}
+
+    def start_streaming_session(self, avatar_id, voice_id):
+        session_id = f"s{next(self.ids)}"
+        self.started.append((session_id, avatar_id, voice_id))
+        return {'data': {'session_id': session_id, 'access_token': 'access', 'url': 'wss://livekit'}}
+
+    def start_webrtc(self, session_id):
+        return {'code': self.webrtc_code}
+
+    def stop_session(self, session_id):
+        self.stopped.append(session_id)
+
+
+def pool(heygen, **kwargs):
+    return HeyGenSessionPool(heygen, 'avatar', 'voice', **kwargs)
+
+
+def test_open_heygen_session():
+    session_info = open_heygen_session(FakeHeyGen(), 'avatar', 'voice')
+    assert session_info['session_id'] == 's1'
+    assert session_info['session_ready'] is True
+    assert session_info['url'] == 'wss://livekit'
+
+
+def test_refill_warms_up_to_the_target_size():
+    heygen = FakeHeyGen()
+    sessions = pool(heygen, target_size=2)
+    sessions._refill()
+    assert [session_id for session_id, _, _ in heygen.started] == ['s1', 's2']
+
+    assert sessions.acquire()['session_id'] == 's1'
+    assert sessions.acquire('avatar', 'voice')['session_id'] == 's2'
+    assert sessions.acquire() is None
+    assert sessions.stats()['hits'] == 2
+    assert sessions.stats()['misses'] == 1
+
+
+def test_other_avatar_is_a_miss():
+    heygen = FakeHeyGen()
+    sessions = pool(heygen, target_size=1)
+    sessions._refill()
+    assert sessions.acquire('other-avatar') is None
+    assert sessions.acquire(voice_id='other-voice') is None
+    assert sessions.stats()['misses'] == 2
+    assert sessions.stats()['mismatches'] == 2
+    assert sessions.stats()['size'] == 1
+
+
+def test_expired_sessions_are_not_handed_out():
+    heygen = FakeHeyGen()
+    sessions = pool(heygen, target_size=2, max_age=90)
+    sessions._refill()
+    sessions._sessions[0]['opened_at'] = time.time() - 100
+
+    assert sessions.acquire()['session_id'] == 's2'
+    # The expired one is left for the maintainer to stop off the request path
+    assert heygen.stopped == []
+    sessions._recycle_expired()
+    assert heygen.stopped == ['s1']
+    assert sessions.stats()['recycled'] == 1
+
+
+def test_sessions_without_webrtc_are_stopped():
+    heygen = FakeHeyGen(webrtc_code=500)
+    sessions = pool(heygen, target_size=2)
+    sessions._refill()
+    assert heygen.stopped == ['s1']
+    assert sessions.stats()['size'] == 0
+    assert sessions.stats()['failures'] == 1
+
+
+def test_stop_stops_pooled_sessions():
+    heygen = FakeHeyGen()
+    sessions = pool(heygen, target_size=2, refill_interval=60)
+    sessions.start()
+    deadline = time.monotonic() + 2
+    while sessions.stats()['size'] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    sessions.stop()
+    assert sorted(heygen.stopped) == ['s1', 's2']
+    assert sessions.stats()['size'] == 0
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from http_transport import AsyncHTTPTransport, AsyncResponse, HTTPTransport
+from wotnot_client import AsyncWotNotAPI, WotNotAPI
+
+
+class Upstream:
+    """Local HTTP server answering with queued statuses, 200 once they run out"""
+
+    def __init__(self):
+        self.statuses = []
+        self.requests = []
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                upstream.requests.append((self.command, self.path))
+                status = upstream.statuses.pop(0) if upstream.statuses else 200
+                body = b'{"ok": true}' if status == 200 else b'<html>error</html>'
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = do_PUT = _respond
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def upstream():
+    upstream = Upstream()
+    yield upstream
+    upstream.close()
+
+
+@pytest.fixture
+def transport():
+    transport = HTTPTransport(max_retries=2, backoff_factor=0)
+    yield transport
+    transport.close()
+
+
+def test_get_is_retried_on_retryable_statuses(upstream, transport):
+    upstream.statuses = [503, 502]
+    response = transport.get(f"{upstream.url}/v1/items")
+    assert response.status_code == 200
+    assert response.json() == {'ok': True}
+    assert len(upstream.requests) == 3
+
+
+def test_retries_are_bounded(upstream, transport):
+    upstream.statuses = [503, 503, 503, 503]
+    assert transport.get(upstream.url).status_code == 503
+    assert len(upstream.requests) == 3
+
+
+def test_post_is_sent_once(upstream, transport):
+    upstream.statuses = [503]
+    assert transport.post(upstream.url, json={'message': 'hi'}).status_code == 503
+    assert len(upstream.requests) == 1
+
+
+def test_post_marked_idempotent_is_retried(upstream, transport):
+    upstream.statuses = [429]
+    assert transport.post(upstream.url, json={}, idempotent=True).status_code == 200
+    assert len(upstream.requests) == 2
+
+
+def test_other_errors_are_not_retried(upstream, transport):
+    upstream.statuses = [500]
+    assert transport.get(upstream.url).status_code == 500
+    assert len(upstream.requests) == 1
+
+
+def test_connection_errors_are_raised_after_retries(transport):
+    with pytest.raises(requests.exceptions.ConnectionError):
+        transport.get('http://127.0.0.1:9/unreachable')
+
+
+def test_timeouts():
+    transport = HTTPTransport(connect_timeout=1, read_timeout=5)
+    assert transport._timeouts(None) == (1, 5)
+    assert transport._timeouts(10) == (1, 10)
+    assert transport._timeouts((2, 3)) == (2, 3)
+
+
+def test_async_response_json_errors_match_requests():
+    response = AsyncResponse(200, '<html>error</html>', 'http://upstream')
+    with pytest.raises(requests.exceptions.JSONDecodeError):
+        response.json()
+    assert AsyncResponse(200, '{"ok": true}', 'http://upstream').json() == {'ok': True}
+
+
+def test_async_response_raise_for_status():
+    with pytest.raises(requests.exceptions.HTTPError):
+        AsyncResponse(503, '', 'http://upstream', 'Service Unavailable').raise_for_status()
+    AsyncResponse(204, '', 'http://upstream').raise_for_status()
+
+
+def test_async_transport_retries_like_the_sync_one(upstream):
+    pytest.importorskip('aiohttp')
+    upstream.statuses = [503, 504]
+
+    async def calls():
+        async with AsyncHTTPTransport(max_retries=2, backoff_factor=0) as transport:
+            get = await transport.get(upstream.url)
+            post = await transport.post(upstream.url, json={})
+        return get.status_code, post.status_code
+
+    assert asyncio.run(calls()) == (200, 200)
+    assert len(upstream.requests) == 4
+
+
+def test_async_client_returns_none_for_a_body_that_is_not_json(upstream):
+    pytest.importorskip('aiohttp')
+    # Both clients treat an unparseable reply as a failed call
+    upstream.statuses = [201, 201]
+    assert WotNotAPI('key', 'bot', upstream.url).start_conversation('v1') is None
+
+    async def start():
+        client = AsyncWotNotAPI('key', 'bot', upstream.url)
+        try:
+            return await client.start_conversation('v1')
+        finally:
+            await client.close()
+
+    assert asyncio.run(start()) is None
@@ -0,0 +1,92 @@
+from message_log import ChatMessage, MessageLog
+
+
+def fill(log, count):
+    for index in range(count):
+        log.append(ChatMessage('bot', f"message {index + 1}"))
+
+
+def texts(messages):
+    return [message.text for message in messages]
+
+
+def test_keeps_messages_in_order():
+    log = MessageLog(capacity=3)
+    fill(log, 2)
+    assert len(log) == 2
+    assert texts(log) == ['message 1', 'message 2']
+
+
+def test_overwrites_the_oldest_when_full():
+    log = MessageLog(capacity=3)
+    fill(log, 7)
+    assert len(log) == 3
+    assert texts(log) == ['message 5', 'message 6', 'message 7']
+
+
+def test_to_list_builds_the_browser_shape():
+    log = MessageLog()
+    log.append(ChatMessage('bot', 'Pick one', timestamp=0, source='webhook', buttons=[('Yes', 'quick_reply')]))
+    data = log.to_list()[0]
+    assert data['type'] == 'bot'
+    assert data['message'] == 'Pick one'
+    assert data['source'] == 'webhook'
+    assert data['buttons'] == [{'title': 'Yes', 'type': 'quick_reply'}]
+    assert 'source' not in ChatMessage('user', 'hi').to_dict()
+
+
+def test_append_numbers_messages():
+    log = MessageLog(capacity=3)
+    fill(log, 2)
+    assert [message.seq for message in log] == [1, 2]
+    assert log.last_seq == 2
+    assert log.first_seq == 1
+    assert log.to_list()[0]['seq'] == 1
+
+
+def test_since_returns_newer_messages():
+    log = MessageLog(capacity=5)
+    fill(log, 4)
+
+    assert texts(log.since(0)[0]) == ['message 1', 'message 2', 'message 3', 'message 4']
+    messages, truncated = log.since(2)
+    assert texts(messages) == ['message 3', 'message 4']
+    assert truncated is False
+    assert log.since(4) == ([], False)
+    assert log.since(10) == ([], False)
+
+
+def test_since_on_empty_log():
+    log = MessageLog()
+    assert log.since(0) == ([], False)
+    assert log.first_seq == 1
+
+
+def test_since_after_wrapping():
+    log = MessageLog(capacity=3)
+    fill(log, 7)
+
+    assert log.first_seq == 5
+    assert texts(log.since(5)[0]) == ['message 6', 'message 7']
+    # Everything after 4 is still held, nothing was lost
+    messages, truncated = log.since(4)
+    assert texts(messages) == ['message 5', 'message 6', 'message 7']
+    assert truncated is False
+
+
+def test_since_reports_truncation():
+    log = MessageLog(capacity=3)
+    fill(log, 7)
+
+    messages, truncated = log.since(2)
+    assert truncated is True
+    assert texts(messages) == ['message 5', 'message 6', 'message 7']
+
+
+def test_zero_capacity_keeps_nothing():
+    log = MessageLog(capacity=0)
+    fill(log, 3)
+    assert len(log) == 0
+    assert log.last_seq == 3
+    assert log.to_list() == []
+    assert log.since(0) == ([], True)
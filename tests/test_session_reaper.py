@@ -0,0 +1,78 @@
+import time
+
+from session_reaper import SessionReaper
+
+
+class Evictions:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, visitor_ids, heygen_only):
+        self.calls.append((sorted(visitor_ids), heygen_only))
+        return {'heygen_sessions': len(visitor_ids), 'conversations': 0 if heygen_only else len(visitor_ids)}
+
+
+def test_sweep_applies_both_ttls():
+    evict = Evictions()
+    now = time.time()
+    activity = {'active': now, 'idle': now - 400, 'gone': now - 2000}
+    reaper = SessionReaper(activity, evict, conversation_ttl=1800, heygen_ttl=300)
+
+    assert reaper.sweep() == {'heygen_sessions': 2, 'conversations': 1}
+    assert evict.calls == [(['idle'], True), (['gone'], False)]
+    stats = reaper.stats()
+    assert stats['sweeps'] == 1
+    assert stats['evicted_conversations'] == 1
+    assert stats['evicted_heygen_sessions'] == 2
+
+
+def test_touch_keeps_a_visitor_alive():
+    evict = Evictions()
+    activity = {'v1': time.time() - 2000}
+    reaper = SessionReaper(activity, evict, conversation_ttl=1800, heygen_ttl=300)
+    reaper.touch('v1')
+
+    assert reaper.sweep() == {'heygen_sessions': 0, 'conversations': 0}
+    assert evict.calls == []
+
+
+def test_gauges_are_merged_into_stats():
+    reaper = SessionReaper({}, Evictions(), gauges=lambda: {'conversations': 3})
+    assert reaper.stats()['conversations'] == 3
+
+
+def test_chat_is_stopped_once_its_grace_period_passes():
+    evict = Evictions()
+    reaper = SessionReaper({}, evict)
+    reaper.stop_at('closed', time.time() - 1)
+    reaper.stop_at('reloading', time.time() + 60)
+
+    assert reaper.sweep_deadlines() == {'heygen_sessions': 1, 'conversations': 1}
+    assert evict.calls == [(['closed'], False)]
+    assert reaper.sweep_deadlines() == {'heygen_sessions': 0, 'conversations': 0}
+    assert reaper.stats()['deadline_stops'] == 1
+    assert reaper.stats()['pending_stops'] == 1
+
+
+def test_cancel_stop_keeps_the_chat():
+    evict = Evictions()
+    reaper = SessionReaper({}, evict)
+    reaper.stop_at('v1', time.time() - 1)
+
+    assert reaper.cancel_stop('v1') is True
+    assert reaper.cancel_stop('v1') is False
+    reaper.sweep_deadlines()
+    assert evict.calls == []
+
+
+def test_workers_sharing_deadlines_stop_a_chat_once(store):
+    deadlines = store.namespace('pending_stops')
+    first_evict, second_evict = Evictions(), Evictions()
+    first = SessionReaper({}, first_evict, deadlines=deadlines)
+    second = SessionReaper({}, second_evict, deadlines=deadlines)
+    first.stop_at('v1', time.time() - 1)
+
+    second.sweep_deadlines()
+    first.sweep_deadlines()
+    assert second_evict.calls == [(['v1'], False)]
+    assert first_evict.calls == []
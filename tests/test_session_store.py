@@ -0,0 +1,183 @@
+import threading
+
+import pytest
+
+from session_store import InMemorySessionStore, RedisSessionStore, SQLiteSessionStore, create_session_store
+
+
+def test_put_get_delete(store):
+    store.put('conversations', 'v1', {'thread_id': 1})
+    store.put('conversations', 'v2', {'thread_id': 2})
+    store.put('activity', 'v1', 10.0)
+
+    assert store.get('conversations', 'v1') == {'thread_id': 1}
+    assert store.get('conversations', 'missing', 'default') == 'default'
+    assert sorted(store.keys('conversations')) == ['v1', 'v2']
+    assert store.count('conversations') == 2
+
+    assert store.delete('conversations', 'v1') is True
+    assert store.delete('conversations', 'v1') is False
+    assert store.keys('conversations') == ['v2']
+    assert store.count('activity') == 1
+
+
+def test_exists(store):
+    store.put('conversations', 'v1', {'thread_id': 1})
+    store.put('conversations', 'none', None)
+
+    assert store.exists('conversations', 'v1') is True
+    assert store.exists('conversations', 'none') is True
+    assert store.exists('conversations', 'v2') is False
+    assert store.exists('activity', 'v1') is False
+    store.delete('conversations', 'v1')
+    assert store.exists('conversations', 'v1') is False
+
+
+def test_contains_does_not_load_the_value(store, monkeypatch):
+    conversations = store.namespace('conversations')
+    conversations['v1'] = {'thread_id': 1}
+    monkeypatch.setattr(store, 'get', lambda *args: pytest.fail('__contains__ loaded the value'))
+
+    assert 'v1' in conversations
+    assert 'v2' not in conversations
+
+
+def test_modify_in_place_and_replace(store):
+    store.put('conversations', 'v1', {'messages': [1]})
+
+    saved = store.modify('conversations', 'v1', lambda value: value['messages'].append(2))
+    assert saved == {'messages': [1, 2]}
+    assert store.get('conversations', 'v1') == {'messages': [1, 2]}
+
+    assert store.modify('conversations', 'v1', lambda value: {'messages': []}) == {'messages': []}
+    assert store.get('conversations', 'v1') == {'messages': []}
+
+
+def test_modify_missing_key(store):
+    calls = []
+    assert store.modify('conversations', 'missing', calls.append) is None
+    assert calls == []
+    assert store.count('conversations') == 0
+
+
+def test_modify_is_atomic(store):
+    store.put('counters', 'shared', {'n': 0})
+
+    def increment():
+        for _ in range(25):
+            store.modify('counters', 'shared', lambda value: value.__setitem__('n', value['n'] + 1))
+
+    threads = [threading.Thread(target=increment) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert store.get('counters', 'shared') == {'n': 200}
+
+
+def test_add_only_stores_absent_keys(store):
+    assert store.add('admission', 'state', {'holders': 1}) is True
+    assert store.add('admission', 'state', {'holders': 2}) is False
+    assert store.get('admission', 'state') == {'holders': 1}
+    assert store.keys('admission') == ['state']
+
+
+def test_add_if_absent(store):
+    assert store.add_if_absent('seen', 'event-1', 60) is True
+    assert store.add_if_absent('seen', 'event-1', 60) is False
+    assert store.add_if_absent('seen', 'event-2', 60) is True
+
+    store.remove_expiring('seen', 'event-1')
+    assert store.add_if_absent('seen', 'event-1', 60) is True
+    # Expiring keys are kept apart from the namespaced values
+    assert store.count('seen') == 0
+
+
+def test_add_if_absent_expires():
+    store = InMemorySessionStore()
+    assert store.add_if_absent('seen', 'event', 0) is True
+    assert store.add_if_absent('seen', 'event', 60) is True
+    assert store.add_if_absent('seen', 'event', 60) is False
+
+
+def test_in_memory_expiring_keys_are_capped():
+    store = InMemorySessionStore(max_expiring_keys=2)
+    store.add_if_absent('seen', 'a', 60)
+    store.add_if_absent('seen', 'b', 60)
+    assert store.add_if_absent('seen', 'a', 60) is False
+
+    store.add_if_absent('seen', 'c', 60)
+    # The oldest key was dropped to make room
+    assert store.add_if_absent('seen', 'a', 60) is True
+
+
+def test_namespace_view(store):
+    conversations = store.namespace('conversations')
+    conversations['v1'] = {'thread_id': 1}
+
+    assert 'v1' in conversations
+    assert conversations['v1'] == {'thread_id': 1}
+    assert len(conversations) == 1
+    assert list(conversations) == ['v1']
+    assert conversations.modify('v1', lambda value: value.update(thread_id=2)) == {'thread_id': 2}
+
+    del conversations['v1']
+    assert conversations.discard('v1') is False
+    with pytest.raises(KeyError):
+        conversations['v1']
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'sessions.db')
+    SQLiteSessionStore(path).put('conversations', 'v1', {'thread_id': 1})
+    assert SQLiteSessionStore(path).get('conversations', 'v1') == {'thread_id': 1}
+
+
+def test_redis_modify_only_conflicts_on_its_own_key():
+    fakeredis = pytest.importorskip('fakeredis')
+    store = RedisSessionStore(client=fakeredis.FakeRedis(), max_retries=0)
+    store.put('conversations', 'v1', {'n': 0})
+    store.put('conversations', 'v2', {'n': 0})
+
+    # A write to another visitor between WATCH and EXEC does not abort the update
+    def touch_other(value):
+        store.put('conversations', 'v2', {'n': 1})
+        value['n'] += 1
+
+    assert store.modify('conversations', 'v1', touch_other) == {'n': 1}
+
+
+def test_redis_modify_gives_up_after_max_retries():
+    fakeredis = pytest.importorskip('fakeredis')
+    import redis
+    store = RedisSessionStore(client=fakeredis.FakeRedis(), max_retries=2)
+    store.put('conversations', 'v1', {'n': 0})
+    calls = []
+
+    def always_conflicting(value):
+        calls.append(value)
+        store.put('conversations', 'v1', {'n': len(calls)})
+
+    with pytest.raises(redis.WatchError):
+        store.modify('conversations', 'v1', always_conflicting)
+    assert len(calls) == 3
+
+
+@pytest.mark.parametrize('url, backend', [
+    ('memory://', InMemorySessionStore),
+    ('', InMemorySessionStore),
+])
+def test_create_session_store(url, backend):
+    assert isinstance(create_session_store(url), backend)
+
+
+def test_create_session_store_sqlite(tmp_path):
+    store = create_session_store(f"sqlite:///{tmp_path / 'sessions.db'}")
+    assert isinstance(store, SQLiteSessionStore)
+    assert store.path == str(tmp_path / 'sessions.db')
+
+
+def test_create_session_store_rejects_unknown_scheme():
+    with pytest.raises(ValueError):
+        create_session_store('mongodb://localhost')
@@ -0,0 +1,144 @@
+import threading
+import time
+
+import pytest
+
+from speech_scheduler import SpeechScheduler, chunk_speech, join_utterances
+
+
+class FakeHeyGen:
+    def __init__(self, duration_ms=0):
+        self.duration_ms = duration_ms
+        self.tasks = []
+        self.sent = threading.Event()
+
+    def send_text_task(self, session_id, text, task_mode="sync"):
+        self.tasks.append((session_id, text, task_mode))
+        self.sent.set()
+        return {'code': 100, 'data': {'duration_ms': self.duration_ms}}
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+@pytest.fixture
+def heygen():
+    return FakeHeyGen()
+
+
+@pytest.fixture
+def scheduler(heygen):
+    scheduler = SpeechScheduler(heygen, coalesce_window=0.05)
+    scheduler.start()
+    yield scheduler
+    scheduler.stop()
+
+
+def test_burst_is_spoken_as_one_task(scheduler, heygen):
+    scheduler.submit('v1', 's1', 'Hello')
+    scheduler.submit('v1', 's1', 'How can I help?')
+    scheduler.submit('v1', 's1', 'Pick one')
+
+    assert wait_for(lambda: heygen.tasks)
+    time.sleep(0.1)
+    assert heygen.tasks == [('s1', 'Hello. How can I help? Pick one.', 'async')]
+    assert scheduler.stats()['messages_coalesced'] == 2
+    assert scheduler.stats()['tasks_sent'] == 1
+
+
+def test_visitors_are_spoken_separately(scheduler, heygen):
+    scheduler.submit('v1', 's1', 'One')
+    scheduler.submit('v2', 's2', 'Two')
+
+    assert wait_for(lambda: len(heygen.tasks) == 2)
+    assert sorted(heygen.tasks) == [('s1', 'One.', 'async'), ('s2', 'Two.', 'async')]
+
+
+def test_text_queued_while_speaking_waits_for_the_avatar():
+    heygen = FakeHeyGen(duration_ms=200)
+    scheduler = SpeechScheduler(heygen, coalesce_window=0.01)
+    scheduler.start()
+    try:
+        scheduler.submit('v1', 's1', 'First')
+        assert wait_for(lambda: heygen.tasks)
+        busy_until = scheduler.busy_until('v1')
+        scheduler.submit('v1', 's1', 'Second')
+        scheduler.submit('v1', 's1', 'Third')
+
+        assert wait_for(lambda: len(heygen.tasks) == 2)
+        assert time.time() >= busy_until
+        assert heygen.tasks[1][1] == 'Second. Third.'
+    finally:
+        scheduler.stop()
+
+
+def test_cancel_drops_queued_text(scheduler, heygen):
+    scheduler.submit('v1', 's1', 'Never spoken', delay=0.1)
+    scheduler.cancel('v1')
+
+    time.sleep(0.25)
+    assert heygen.tasks == []
+    assert scheduler.stats()['visitors'] == 0
+
+
+def test_empty_text_is_ignored(scheduler, heygen):
+    scheduler.submit('v1', 's1', '')
+    time.sleep(0.1)
+    assert heygen.tasks == []
+
+
+def test_long_utterances_are_chunked(heygen):
+    scheduler = SpeechScheduler(heygen, coalesce_window=0.01, chunk_min_chars=10, chunk_max_chars=40)
+    scheduler.start()
+    try:
+        scheduler.submit('v1', 's1', 'This is the first sentence. And this one is the second sentence.')
+        assert wait_for(lambda: len(heygen.tasks) == 2)
+        assert [text for _, text, _ in heygen.tasks] == ['This is the first sentence.',
+                                                         'And this one is the second sentence.']
+        assert scheduler.stats()['utterances_chunked'] == 1
+    finally:
+        scheduler.stop()
+
+
+def test_join_utterances():
+    assert join_utterances(['Hi', 'Sure!', ' ok ']) == 'Hi. Sure! ok.'
+
+
+def test_chunk_speech_merges_short_sentences():
+    assert chunk_speech('Yes. Of course. That works for me.', min_chars=20, max_chars=60) == [
+        'Yes. Of course. That works for me.']
+
+
+def test_chunk_speech_splits_long_sentences_at_clauses():
+    chunks = chunk_speech('one two three, four five six, seven eight nine', min_chars=0, max_chars=16)
+    assert chunks == ['one two three,', 'four five six,', 'seven eight nine']
+    assert all(len(chunk) <= 16 for chunk in chunks)
+
+
+def test_whitespace_only_text_does_not_stall_the_visitor(scheduler, heygen):
+    scheduler.submit('v1', 's1', '   ')
+    time.sleep(0.1)
+    assert heygen.tasks == []
+
+    scheduler.submit('v1', 's1', 'Still here')
+    assert wait_for(lambda: heygen.tasks)
+    assert heygen.tasks == [('s1', 'Still here.', 'async')]
+
+
+def test_whitespace_only_text_with_chunking(heygen):
+    scheduler = SpeechScheduler(heygen, coalesce_window=0.01, chunk_min_chars=10, chunk_max_chars=40)
+    scheduler.start()
+    try:
+        scheduler.submit('v1', 's1', ' \n ')
+        time.sleep(0.05)
+        scheduler.submit('v1', 's1', 'Still here')
+        assert wait_for(lambda: heygen.tasks)
+        assert heygen.tasks == [('s1', 'Still here.', 'async')]
+    finally:
+        scheduler.stop()
@@ -0,0 +1,68 @@
+import pytest
+
+from text_normalizer import TextNormalizer
+
+
+@pytest.fixture
+def normalizer():
+    return TextNormalizer()
+
+
+def test_block_tags_become_lines(normalizer):
+    text = '<p>Here is what I can do:</p><ul><li>Answer <i>pricing</i> questions</li><li>Book a demo 📅</li></ul>'
+    display, speech = normalizer.normalize(text)
+    assert display == 'Here is what I can do:\n• Answer pricing questions\n• Book a demo 📅'
+    assert speech == 'Here is what I can do: Answer pricing questions. Book a demo.'
+
+
+def test_scripts_comments_and_entities(normalizer):
+    display, speech = normalizer.normalize('<script>alert(1)</script><!-- x -->Fish &amp; chips&nbsp;<BR/>&bogus; ok')
+    assert display == 'Fish & chips\n&bogus; ok'
+    assert speech == 'Fish & chips. &bogus; ok.'
+
+
+def test_links_and_urls(normalizer):
+    text = 'Check **our docs** at https://example.com/docs/start or [the FAQ](https://example.com/faq).'
+    assert normalizer.speech(text) == 'Check our docs at the link or the FAQ.'
+    assert normalizer.speech('See www.example.com.') == 'See the link.'
+    assert normalizer.speech('(https://example.com/a)') == '(the link).'
+
+
+def test_emphasis_must_pair_around_words(normalizer):
+    assert normalizer.speech('2*3*4 is 24') == '2*3*4 is 24.'
+    assert normalizer.speech('5 * 6 = 30') == '5 * 6 = 30.'
+    assert normalizer.speech('Use snake_case_names') == 'Use snake_case_names.'
+    assert normalizer.speech('**bold _and_ italic** and ~~gone~~') == 'bold and italic and gone.'
+    assert normalizer.speech('Run `make test` *now*') == 'Run make test now.'
+
+
+def test_list_markers_but_not_years(normalizer):
+    text = '1. First\n42. Second\n- Third\n2023. was great\n1) stays'
+    assert normalizer.speech(text) == 'First. Second. Third. 2023. was great. 1) stays.'
+    assert normalizer.speech('# Heading\n> quoted') == 'Heading. quoted.'
+
+
+def test_emoji_only_lines_are_dropped_from_speech(normalizer):
+    display, speech = normalizer.normalize('Hi there &#128075;\n🎉🎉')
+    assert display == 'Hi there 👋\n🎉🎉'
+    assert speech == 'Hi there.'
+
+
+def test_existing_punctuation_is_kept(normalizer):
+    assert normalizer.speech('Anything else?\nThanks!\nPick one:') == 'Anything else? Thanks! Pick one:'
+    assert normalizer.speech('Hello 👋 , friend') == 'Hello, friend.'
+
+
+def test_empty_text(normalizer):
+    assert normalizer.normalize('') == ('', '')
+    assert normalizer.normalize(None) == ('', '')
+    assert normalizer.normalize('<br/>') == ('', '')
+
+
+def test_results_are_cached():
+    normalizer = TextNormalizer(cache_size=2)
+    normalizer.normalize('Hi')
+    normalizer.normalize('Hi')
+    normalizer.normalize('Bye')
+    normalizer.normalize('Later')
+    assert normalizer.stats() == {'hits': 1, 'misses': 3, 'size': 2, 'max_size': 2}
@@ -0,0 +1,87 @@
+import base64
+import json
+import threading
+import time
+
+from token_manager import TokenManager, token_expiry
+
+
+def jwt(exp):
+    claims = base64.urlsafe_b64encode(json.dumps({'exp': exp}).encode()).rstrip(b'=').decode()
+    return f"header.{claims}.signature"
+
+
+class FakeHeyGen:
+    def __init__(self, tokens, delay=0.0):
+        self.tokens = list(tokens)
+        self.delay = delay
+        self.calls = 0
+
+    def create_token(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        token = self.tokens.pop(0) if self.tokens else None
+        return {'token': token} if token else None
+
+
+def test_token_expiry():
+    assert token_expiry(jwt(1234)) == 1234.0
+    assert token_expiry('opaque-token') is None
+    assert token_expiry('a.not-base64!.c') is None
+
+
+def test_token_is_cached():
+    heygen = FakeHeyGen(['t1', 't2'])
+    manager = TokenManager(heygen, fallback_ttl=600, refresh_margin=60)
+    assert manager.get() == 't1'
+    assert manager.get() == 't1'
+    assert heygen.calls == 1
+    assert manager.stats()['hits'] == 1
+
+
+def test_concurrent_callers_share_one_refresh():
+    heygen = FakeHeyGen(['t1', 't2'], delay=0.1)
+    manager = TokenManager(heygen)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.get())) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ['t1'] * 10
+    assert heygen.calls == 1
+    assert manager.stats()['shared'] == 9
+
+
+def test_token_is_refreshed_within_the_margin():
+    heygen = FakeHeyGen([jwt(time.time() + 30), 't2'])
+    manager = TokenManager(heygen, refresh_margin=60)
+    first = manager.get()
+    # Expires within refresh_margin, so it is never handed out again
+    assert manager.get() == 't2'
+    assert first != 't2'
+    assert heygen.calls == 2
+
+
+def test_failed_refresh_is_not_retried_right_away():
+    heygen = FakeHeyGen([])
+    manager = TokenManager(heygen, retry_interval=60)
+    assert manager.get() is None
+    assert manager.get() is None
+    assert heygen.calls == 1
+    assert manager.stats()['failures'] == 1
+
+
+def test_refresh_ahead_thread_fetches_the_first_token():
+    heygen = FakeHeyGen(['t1'])
+    manager = TokenManager(heygen, refresh_ahead=60)
+    manager.start()
+    try:
+        deadline = time.monotonic() + 2
+        while manager.stats()['refreshes'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert manager.get() == 't1'
+        assert heygen.calls == 1
+    finally:
+        manager.stop()
@@ -0,0 +1,47 @@
+from webhook_dedup import WebhookDeduplicator, webhook_event_key
+
+
+def test_first_seen_once(store):
+    dedup = WebhookDeduplicator(store, ttl=60)
+    assert dedup.first_seen('id:1') is True
+    assert dedup.first_seen('id:1') is False
+    assert dedup.first_seen('id:2') is True
+    assert dedup.stats() == {'checked': 3, 'duplicates': 1, 'hit_rate': 1 / 3}
+
+
+def test_forget_allows_reprocessing(store):
+    dedup = WebhookDeduplicator(store, ttl=60)
+    dedup.first_seen('id:1')
+    dedup.forget('id:1')
+    assert dedup.first_seen('id:1') is True
+
+
+def test_namespaces_are_separate(store):
+    webhooks = WebhookDeduplicator(store, ttl=60)
+    messages = WebhookDeduplicator(store, ttl=60, namespace='visitor_messages_seen')
+    assert webhooks.first_seen('v1:m1') is True
+    assert messages.first_seen('v1:m1') is True
+
+
+def test_workers_sharing_a_store_share_the_seen_set(store):
+    assert WebhookDeduplicator(store, ttl=60).first_seen('id:1') is True
+    assert WebhookDeduplicator(store, ttl=60).first_seen('id:1') is False
+
+
+def test_no_checks_means_zero_hit_rate(store):
+    assert WebhookDeduplicator(store).stats()['hit_rate'] == 0.0
+
+
+def test_event_key_prefers_ids():
+    assert webhook_event_key({'id': 'evt-1', 'event': {'id': 'other'}}) == 'id:evt-1'
+    assert webhook_event_key({'event': {'id': 'evt-2'}}) == 'id:evt-2'
+    assert webhook_event_key({'event': {'payload': {'message': {'id': 'msg-3'}}}}) == 'id:msg-3'
+
+
+def test_event_key_hashes_events_without_ids():
+    event = {'event': {'type': 'message', 'payload': {'text': 'hi'}}}
+    reordered = {'event': {'payload': {'text': 'hi'}, 'type': 'message'}}
+    key = webhook_event_key(event)
+    assert key.startswith('sha1:')
+    assert webhook_event_key(reordered) == key
+    assert webhook_event_key({'event': {'type': 'message', 'payload': {'text': 'bye'}}}) != key
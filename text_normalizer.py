@@ -0,0 +1,121 @@
+import html
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+NormalizedText = namedtuple('NormalizedText', ['display', 'speech'])
+
+# Compiled once at import. Every alternative starts with a literal so the
+# scan can jump straight to candidate characters, and the speech passes only
+# run on lines that contain their trigger character.
+_EMOJI = r'\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D\u20E3'
+
+_DISPLAY = re.compile('|'.join([
+    r'<(?:(?P<drop>(?:script|style)\b.*?</(?:script|style)\s*>|!--.*?-->)',
+    r'(?P<item>li\b[^>]*>)',
+    r'(?P<block>(?:br\s*/?|/?(?:p|div|ul|ol|li|h[1-6]|tr|table|blockquote)\b[^>]*)>)',
+    r'(?P<tag>/?[a-zA-Z][^>]*>))',
+    r'&(?P<entity>#[0-9]+|#[xX][0-9a-fA-F]+|[a-zA-Z][a-zA-Z0-9]*);',
+]), re.IGNORECASE | re.DOTALL)
+
+_LIST_PREFIX = re.compile(r'(?:#{1,6}|>|[-*+•]|\d{1,2}\.)[ \t]+')
+_LINK = re.compile(r'\[([^\]]+)\]\([^)]*\)')
+# Greedy, backing off trailing punctuation so "see example.com." keeps its period
+_URL = re.compile(r'(?:https?://|www\.)[^\s<>()]*[^\s<>().,!?;:]')
+# Markers only count as emphasis when they pair around words, so "2*3*4" and
+# snake_case survive
+_EMPHASIS = re.compile(r'(?<!\w)(\*\*|__|~~|\*|_)(?=\S)(.+?)(?<=\S)\1(?!\w)')
+_EMOJI_RUN = re.compile('[' + _EMOJI + ']+')
+
+_SPACE_BEFORE_PUNCTUATION = re.compile(r' +([.,!?;:])')
+_SENTENCE_END = '.!?:;,'
+
+
+def _display_token(match):
+    kind = match.lastgroup
+    if kind == 'item':
+        return '\n• '
+    if kind == 'block':
+        return '\n'
+    if kind == 'entity':
+        return html.unescape(match.group())
+    return ''
+
+
+def _speech_line(line):
+    prefix = _LIST_PREFIX.match(line)
+    if prefix:
+        line = line[prefix.end():]
+    if '[' in line:
+        line = _LINK.sub(r'\1', line)
+    if '://' in line or 'www.' in line:
+        line = _URL.sub('the link', line)
+    count = 1
+    while count and ('*' in line or '_' in line or '~' in line):
+        # Nested emphasis ("**bold _and_ italic**") unwraps one level per pass
+        line, count = _EMPHASIS.subn(r'\2', line)
+    if '`' in line:
+        line = line.replace('`', '')
+    if not line.isascii():
+        line = _EMOJI_RUN.sub('', line)
+    return ' '.join(line.split())
+
+
+def _clean_lines(text):
+    # str.split() collapses every kind of whitespace, non-breaking spaces included
+    lines = (' '.join(line.split()) for line in text.split('\n'))
+    return [line for line in lines if line]
+
+
+class TextNormalizer:
+    """
+    Turns bot HTML into display text and speech text.
+
+    Display text has tags stripped (block tags become line breaks) and
+    entities decoded. Speech text is the display text with URLs read as
+    "the link", without markdown markup, list bullets, `1.` to `99.` item
+    numbers and emojis, and with each line ended as a sentence so the avatar
+    pauses between them. Years and other longer numbers are kept.
+    Results are memoized in an LRU of `cache_size` entries, since greetings
+    and button titles repeat.
+    """
+
+    def __init__(self, cache_size=1024):
+        self._normalize_cached = lru_cache(maxsize=cache_size)(self._normalize)
+
+    def normalize(self, text):
+        """Return NormalizedText(display, speech) for bot HTML"""
+        if not text:
+            return NormalizedText('', '')
+        return self._normalize_cached(text)
+
+    def display(self, text):
+        return self.normalize(text).display
+
+    def speech(self, text):
+        return self.normalize(text).speech
+
+    def stats(self):
+        """Return cache counters"""
+        info = self._normalize_cached.cache_info()
+        return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'max_size': info.maxsize}
+
+    @staticmethod
+    def _normalize(text):
+        if '<' in text or '&' in text:
+            text = _DISPLAY.sub(_display_token, text)
+        lines = _clean_lines(text)
+        display = '\n'.join(lines)
+
+        sentences = []
+        for line in lines:
+            line = _speech_line(line)
+            if not line:
+                continue
+            if line[-1] not in _SENTENCE_END:
+                line += '.'
+            sentences.append(line)
+        speech = ' '.join(sentences)
+        if ' ' in speech:
+            speech = _SPACE_BEFORE_PUNCTUATION.sub(r'\1', speech)
+        return NormalizedText(display, speech)
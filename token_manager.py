@@ -0,0 +1,138 @@
+import base64
+import json
+import threading
+import time
+
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+
+def token_expiry(token):
+    """Return the exp claim of a JWT as epoch seconds, or None if the token isn't one"""
+    parts = token.split('.')
+    if len(parts) != 3:
+        return None
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(parts[1] + '=' * (-len(parts[1]) % 4)))
+        return float(claims['exp'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class TokenManager:
+    """
+    Caches the HeyGen streaming token until shortly before it expires.
+
+    The expiry comes from the token's exp claim when it is a JWT, otherwise
+    it is assumed to be `fallback_ttl` seconds after creation. A token is
+    handed out until `refresh_margin` seconds before it expires. Callers that
+    find no usable token share one create_token call; after a failed one,
+    get() returns None for `retry_interval` seconds instead of calling again.
+    With `refresh_ahead` seconds set, a background thread replaces the token
+    that long before it stops being handed out, so get() doesn't wait.
+    """
+
+    def __init__(self, heygen_client, fallback_ttl=600, refresh_margin=60, refresh_ahead=60, retry_interval=5):
+        self.heygen_client = heygen_client
+        self.fallback_ttl = fallback_ttl
+        self.refresh_margin = refresh_margin
+        self.refresh_ahead = refresh_ahead
+        self.retry_interval = retry_interval
+
+        self.hits = 0
+        self.shared = 0
+        self.refreshes = 0
+        self.failures = 0
+
+        self._token = None
+        self._expires_at = 0.0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the refresh-ahead thread, which also fetches the first token"""
+        if self._thread is None and self.refresh_ahead > 0:
+            self._thread = threading.Thread(target=self._run, name='heygen-token-refresh', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def get(self):
+        """Return a usable token, or None if one could not be created"""
+        token = self._usable_token()
+        if token:
+            with self._lock:
+                self.hits += 1
+            return token
+        with self._refresh_lock:
+            # Whoever held the lock before may just have refreshed it
+            token = self._usable_token()
+            if token:
+                with self._lock:
+                    self.shared += 1
+                return token
+            if time.time() < self._retry_at:
+                return None
+            return self._refresh()
+
+    def stats(self):
+        """Return token counters"""
+        with self._lock:
+            return {
+                'expires_in': max(0.0, self._expires_at - time.time()) if self._token else 0.0,
+                'hits': self.hits,
+                'shared': self.shared,
+                'refreshes': self.refreshes,
+                'failures': self.failures
+            }
+
+    def _usable_token(self):
+        with self._lock:
+            if self._token and time.time() < self._expires_at - self.refresh_margin:
+                return self._token
+        return None
+
+    def _refresh(self):
+        # Called with _refresh_lock held
+        token_data = self.heygen_client.create_token()
+        token = token_data.get('token') if token_data else None
+        now = time.time()
+        if not token:
+            self._retry_at = now + self.retry_interval
+            with self._lock:
+                self.failures += 1
+            log.warning("heygen token refresh failed")
+            return None
+        expires_at = token_expiry(token) or now + self.fallback_ttl
+        with self._lock:
+            self._token = token
+            self._expires_at = expires_at
+            self.refreshes += 1
+        log.debug("heygen token refreshed", expires_in=round(expires_at - now))
+        return token
+
+    def _refresh_due(self):
+        with self._lock:
+            due = self._expires_at - self.refresh_margin - self.refresh_ahead
+        return max(due, self._retry_at)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            delay = self._refresh_due() - time.time()
+            if delay > 0:
+                self._stopped.wait(delay)
+                continue
+            try:
+                with self._refresh_lock:
+                    if self._refresh_due() <= time.time():
+                        self._refresh()
+            except Exception:
+                self._retry_at = time.time() + self.retry_interval
+                log.exception("error refreshing heygen token")
+            # Don't spin when tokens live shorter than refresh_margin + refresh_ahead
+            self._stopped.wait(self.retry_interval)
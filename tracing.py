@@ -0,0 +1,135 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class Turn:
+    """One user message and everything that happened until the bot answered it"""
+
+    __slots__ = ('turn_id', 'visitor_id', 'thread_id', 'started_at', 'started', 'cursor', 'replied', 'spans')
+
+    def __init__(self, turn_id, visitor_id, thread_id):
+        self.turn_id = turn_id
+        self.visitor_id = visitor_id
+        self.thread_id = thread_id
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.cursor = self.started
+        self.replied = None
+        # (name, start, end) in perf_counter seconds
+        self.spans = []
+
+    def duration(self, now=None):
+        """Seconds until the first bot reply was emitted, or so far if there is none yet"""
+        end = self.replied if self.replied is not None else (now or time.perf_counter())
+        return end - self.started
+
+    def to_dict(self):
+        spans = sorted(self.spans, key=lambda span: span[1])
+        breakdown = {}
+        for name, start, end in spans:
+            # Spans are named "<owner>.<hop>", e.g. wotnot.bot_reply or server.socket_emit
+            owner = name.split('.', 1)[0]
+            breakdown[owner] = breakdown.get(owner, 0.0) + (end - start) * 1000
+        return {
+            'turn_id': self.turn_id,
+            'visitor_id': self.visitor_id,
+            'thread_id': self.thread_id,
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat(),
+            'replied': self.replied is not None,
+            'total_ms': round(self.duration() * 1000, 2),
+            'breakdown_ms': {owner: round(ms, 2) for owner, ms in breakdown.items()},
+            'spans': [
+                {'name': name, 'start_ms': round((start - self.started) * 1000, 2),
+                 'duration_ms': round((end - start) * 1000, 2)}
+                for name, start, end in spans
+            ]
+        }
+
+
+class TurnTracer:
+    """
+    In-process tracer correlating the hops of one chat turn by visitor.
+
+    start_turn() opens a turn when the visitor sends a message; later spans
+    for that visitor (the WotNot call, the bot's reply webhook, the HeyGen
+    task, the Socket.IO emit) attach to it until the next message starts a
+    new turn. A turn is complete once the first bot reply is emitted, and
+    the last `history` completed turns are kept for slowest().
+
+    Times are perf_counter() values. Webhooks that land on another worker
+    process are not correlated.
+    """
+
+    def __init__(self, history=500):
+        self._open = {}
+        self._completed = deque(maxlen=history)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start_turn(self, visitor_id, thread_id):
+        """Open a new turn for the visitor, replacing the previous one"""
+        turn = Turn(next(self._ids), visitor_id, thread_id)
+        with self._lock:
+            self._open[visitor_id] = turn
+        return turn
+
+    @contextmanager
+    def span(self, visitor_id, name):
+        """Time a block as the next hop of the visitor's turn"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                turn = self._open.get(visitor_id)
+                if turn is not None:
+                    turn.spans.append((name, start, end))
+                    turn.cursor = max(turn.cursor, end)
+
+    def record_wait(self, visitor_id, name, end):
+        """Record the time between the end of the previous hop and `end`"""
+        with self._lock:
+            turn = self._open.get(visitor_id)
+            if turn is not None and end > turn.cursor:
+                turn.spans.append((name, turn.cursor, end))
+                turn.cursor = end
+
+    def record(self, visitor_id, name, start, end):
+        """Record a span that runs beside the main path, such as a HeyGen task"""
+        with self._lock:
+            turn = self._open.get(visitor_id)
+            if turn is not None and start >= turn.started:
+                turn.spans.append((name, start, end))
+
+    def finish_turn(self, visitor_id):
+        """Mark the first bot reply of the visitor's turn as delivered"""
+        with self._lock:
+            turn = self._open.get(visitor_id)
+            if turn is not None and turn.replied is None:
+                turn.replied = time.perf_counter()
+                self._completed.append(turn)
+
+    def forget(self, visitor_id):
+        """Drop the visitor's open turn, keeping it in history if it completed"""
+        with self._lock:
+            self._open.pop(visitor_id, None)
+
+    def slowest(self, limit=20):
+        """Slowest recent turns, including ones still waiting for a reply"""
+        now = time.perf_counter()
+        with self._lock:
+            turns = list(self._completed)
+            turns.extend(turn for turn in self._open.values() if turn.replied is None)
+            slowest = heapq.nlargest(limit, turns, key=lambda turn: turn.duration(now))
+            return [turn.to_dict() for turn in slowest]
+
+    def stats(self):
+        """Return tracer gauges"""
+        with self._lock:
+            return {'open_turns': len(self._open), 'completed_turns': len(self._completed)}
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import threading
+
+
+def webhook_event_key(event_data):
+    """
+    Return the dedup key of a WotNot webhook event.
+
+    Uses the event id, or the message id, when WotNot sends one; otherwise a
+    hash of the whole event, which is the same for a redelivered event.
+    """
+    event = event_data.get('event') or {}
+    message = (event.get('payload') or {}).get('message') or {}
+    for value in (event_data.get('id'), event.get('id'), message.get('id')):
+        if value:
+            return f"id:{value}"
+    canonical = json.dumps(event_data, sort_keys=True, separators=(',', ':'), default=str)
+    return "sha1:" + hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+class WebhookDeduplicator:
+    """
+    Seen-set of webhook event keys, so WotNot retries are processed once.
+
+    Keys are kept for `ttl` seconds in the session store's expiring keys, so
+    the set is shared by every worker when the store is; the in-memory store
+    also caps how many keys it keeps.
+    """
+
+    def __init__(self, store, ttl=600, namespace='webhook_events_seen'):
+        self.store = store
+        self.ttl = ttl
+        self.namespace = namespace
+        self.checked = 0
+        self.duplicates = 0
+        self._lock = threading.Lock()
+
+    def first_seen(self, key):
+        """Mark a key as seen, returning False if it already was"""
+        new = self.store.add_if_absent(self.namespace, key, self.ttl)
+        with self._lock:
+            self.checked += 1
+            if not new:
+                self.duplicates += 1
+        return new
+
+    def forget(self, key):
+        """Unmark a key, for events that were accepted but not processed"""
+        self.store.remove_expiring(self.namespace, key)
+
+    def stats(self):
+        """Return dedup counters and the hit rate"""
+        with self._lock:
+            checked, duplicates = self.checked, self.duplicates
+        return {
+            'checked': checked,
+            'duplicates': duplicates,
+            'hit_rate': duplicates / checked if checked else 0.0
+        }
@@ -1,9 +1,29 @@
+import logging
+import time
+
 import requests
 import re
 
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from http_transport import AsyncHTTPTransport, default_transport
+from metrics import UPSTREAM_ERRORS, UPSTREAM_LATENCY, error_type
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+_NOT_ALPHANUMERIC = re.compile(r'[^a-zA-Z0-9]')
+
+
+def _is_upstream_failure(response):
+    """Responses that count against the circuit breaker; other 4xx are our fault, not WotNot's"""
+    return response.status_code >= 500 or response.status_code == 429
+
+
 class WotNotAPI:
-    def __init__(self, api_key, bot_key, base_url):
+    def __init__(self, api_key, bot_key, base_url, transport=None, breaker=None):
         self.api_key = api_key
+        self.transport = transport or default_transport()
+        self.breaker = breaker or CircuitBreaker('wotnot')
         self.bot_key = self.clean_publish_key(bot_key)
         self.base_url = base_url
         self.headers = {
@@ -13,14 +33,11 @@ class WotNotAPI:
     
     def clean_publish_key(self, key):
         """Clean publish key by removing special characters, emojis, and whitespace"""
-        key = key.strip()
-        key = re.sub(r'[^a-zA-Z0-9]', '', key)
-        return key
+        # Whitespace is not alphanumeric either, so one substitution covers the strip too
+        return _NOT_ALPHANUMERIC.sub('', key)
     
     def start_conversation(self, visitor_id, initial_message="Hello"):
         """Start a new conversation with WotNot"""
-        url = f"{self.base_url}/conversations"  
-        
         clean_visitor_id = self.clean_publish_key(visitor_id)
         
         payload = {
@@ -44,23 +61,10 @@ class WotNotAPI:
                 "type": "VISITOR"
             }
         }
-        
-        try:
-            response = requests.post(url, headers=self.headers, json=payload)
-            print(f"Response status: {response.status_code}")
-            print(f"Response content: {response.text}")
-            
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"Error starting conversation: {e}")
-            print(f"Response content: {response.text if 'response' in locals() else 'No response'}")
-            return None
+        return self._send('start_conversation', "/conversations", payload, "/conversations")
     
     def send_visitor_message(self, thread_id, message, visitor_id):
         """Send visitor message to WotNot"""
-        url = f"{self.base_url}/conversation/{thread_id}/messages"
-        
         payload = {
             "message": {
                 "data": {
@@ -72,15 +76,73 @@ class WotNotAPI:
                 "type": "VISITOR"
             }
         }
-        
+        return self._send('send_visitor_message', f"/conversation/{thread_id}/messages", payload,
+                          "/conversation/{id}/messages")
+
+    def _send(self, operation, path, payload, endpoint):
+        """POST to WotNot, returning the decoded JSON or None on failure"""
+        try:
+            self.breaker.allow()
+        except CircuitOpenError as e:
+            return self._handle_error(endpoint, operation, e, None)
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = self.transport.post(f"{self.base_url}{path}", headers=self.headers, json=payload)
+            failed = _is_upstream_failure(response)
+            return self._handle_response(operation, response)
+        except requests.exceptions.RequestException as e:
+            return self._handle_error(endpoint, operation, e, locals().get('response'))
+        finally:
+            elapsed = time.perf_counter() - started
+            UPSTREAM_LATENCY.labels('wotnot', endpoint).observe(elapsed)
+            self.breaker.record(elapsed, failed)
+
+    def _handle_response(self, operation, response):
+        log.info("upstream call", upstream="wotnot", operation=operation, status=response.status_code)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("upstream response", upstream="wotnot", operation=operation, body=response.text)
+        response.raise_for_status()
+        return response.json()
+
+    def _handle_error(self, endpoint, operation, error, response):
+        UPSTREAM_ERRORS.labels('wotnot', endpoint, error_type(error)).inc()
+        if isinstance(error, CircuitOpenError):
+            # The breaker already logged when it opened
+            return None
+        log.warning("upstream error", upstream="wotnot", operation=operation, error=str(error),
+                    body=response.text if response is not None else None)
+        return None
+
+
+class AsyncWotNotAPI(WotNotAPI):
+    """
+    asyncio variant of WotNotAPI.
+
+    Same methods and return shapes, but every method is a coroutine and the
+    calls go through a non-blocking AsyncHTTPTransport.
+    """
+
+    def __init__(self, api_key, bot_key, base_url, transport=None, breaker=None):
+        super().__init__(api_key, bot_key, base_url, transport=transport or AsyncHTTPTransport(), breaker=breaker)
+
+    async def close(self):
+        await self.transport.close()
+
+    async def _send(self, operation, path, payload, endpoint):
+        try:
+            self.breaker.allow()
+        except CircuitOpenError as e:
+            return self._handle_error(endpoint, operation, e, None)
+        started = time.perf_counter()
+        failed = True
         try:
-            response = requests.post(url, headers=self.headers, json=payload)
-            print(f"Message response status: {response.status_code}")
-            print(f"Message response content: {response.text}")
-            
-            response.raise_for_status()
-            return response.json()
+            response = await self.transport.post(f"{self.base_url}{path}", headers=self.headers, json=payload)
+            failed = _is_upstream_failure(response)
+            return self._handle_response(operation, response)
         except requests.exceptions.RequestException as e:
-            print(f"Error sending message: {e}")
-            print(f"Response content: {response.text if 'response' in locals() else 'No response'}")
-            return None
\ No newline at end of file
+            return self._handle_error(endpoint, operation, e, locals().get('response'))
+        finally:
+            elapsed = time.perf_counter() - started
+            UPSTREAM_LATENCY.labels('wotnot', endpoint).observe(elapsed)
+            self.breaker.record(elapsed, failed)